@@ -1,8 +1,22 @@
 from tools import *
 from typing import TypedDict, List, Optional, Dict, Any
 import re
+import sqlite3
 from langgraph.graph import StateGraph, END
 from langgraph.checkpoint.memory import MemorySaver
+from api_cache import VersionedCache
+from config import config
+from db import table_versions
+from geo import locate, nearest_stops, stops_within
+from consequences import SEARCH_KINDS, StaleImpactError, blast_radius, dependents, describe, resolve
+from instrumentation import instrument_node
+from listing import count_rows, iter_rows
+from optimizer import StalePlanError, apply_plan, build_plan, get_plan
+from intent import (
+    classify_intent, detect_action_intent, extract_quoted_string, extract_license_plate,
+    extract_driver_name, extract_trip_identifier, extract_path_name, extract_stops_list,
+    extract_route_name, get_sample_vehicle_config,
+)
 
 class AgentState(TypedDict):
     messages: List[Dict[str, str]]
@@ -14,289 +28,48 @@ class AgentState(TypedDict):
     confirmation_message: Optional[str]
     awaiting_confirmation: bool
     confirmation_override: bool
+    stream: bool
+    stream_action: Optional[str]
 
-def extract_quoted_string(text: str, after_keywords: List[str] = None) -> Optional[str]:
-    patterns = [
-        r"['\"]([^'\"]+)['\"]",
-        r"\[([^\]]+)\]"
-    ]
-    for pattern in patterns:
-        match = re.search(pattern, text)
-        if match:
-            return match.group(1).strip()
-    
-    if after_keywords:
-        for keyword in after_keywords:
-            pattern = rf"{keyword}\s+['\"]?(\w[\w\s\-\.]*?)['\"]?(?:\s+(?:from|to|at|in|for|with|and|or)|$)"
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                value = match.group(1).strip()
-                if value and len(value) > 1:
-                    return value
-    
-    words = text.split()
-    for i, word in enumerate(words):
-        if word.lower() in [k.lower() for k in (after_keywords or [])]:
-            if i + 1 < len(words):
-                potential_value = ' '.join(words[i+1:i+4]).strip()
-                if potential_value and len(potential_value) > 1:
-                    return potential_value.rstrip('.,;')
-    return None
+_CONFIRM_PATTERN = re.compile(r'\b(yes|yep|yeah|sure|confirm|proceed|okay|ok|go ahead)\b')
+_CANCEL_PATTERN = re.compile(r'\b(no|nope|cancel|stop|abort|nevermind|never mind)\b')
 
-def extract_license_plate(text: str) -> Optional[str]:
-    patterns = [
-        r"['\"]([A-Z]{2}-\d{2}-[A-Z]{0,2}-?\d{4})['\"]",
-        r"([A-Z]{2}-\d{2}-[A-Z]{0,2}-?\d{4})",
-        r"vehicle\s+['\"]?([^'\"]+?)['\"]?(?:\s+(?:and|or|to|with|driver)|$)",
-        r"['\"]([^'\"]+)['\"]",
-    ]
-    for pattern in patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            plate = match.group(1).strip().upper()
-            if plate and len(plate) > 3:
-                return plate
-    
-    all_vehicles = get_all_vehicles()
-    for vehicle in all_vehicles:
-        try:
-            plate = vehicle['license_plate']
-            if plate and plate.upper() in text.upper():
-                return plate.upper()
-        except (KeyError, TypeError):
-            pass
-    
-    return None
+def _path_reply(row):
+    stop_names = " → ".join([stop['name'] for stop in row['stops']]) if row['stops'] else "No stops"
+    return f"{row['name']} ({stop_names})"
 
-def extract_driver_name(text: str) -> Optional[str]:
-    patterns = [
-        r"driver\s+['\"]?([^'\"]+?)['\"]?(?:\s+(?:to|from|for|with|and)|$)",
-        r"['\"]([^'\"]+)['\"]",
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            name = match.group(1).strip()
-            if name and len(name) > 1:
-                return name
-    
-    extracted = extract_quoted_string(text, ["named", "driver"])
-    if extracted:
-        return extracted
-    
-    all_drivers = get_all_drivers()
-    for driver in all_drivers:
-        try:
-            driver_name = driver['name']
-            if driver_name.lower() in text.lower() or text.lower() in driver_name.lower():
-                return driver_name
-        except (KeyError, TypeError):
-            pass
-    
-    return None
+# action -> (listing, title, separator, row formatter, empty reply). Replies are
+# produced chunk by chunk so /chat/stream can send rows as they are read;
+# /chat joins the chunks.
+LISTING_REPLIES = {
+    'list_all_vehicles': ('vehicles', 'All vehicles', ', ', lambda row: f"{row['license_plate']} ({row['model']})", "No vehicles found."),
+    'list_all_drivers': ('drivers', 'All drivers', ', ', lambda row: f"{row['name']} ({row['license_number']})", "No drivers found."),
+    'list_all_trips': ('trips', 'All trips', '; ', lambda row: f"Trip {row['id']}: {row['route_name']} on {row['date']} ({row['live_status']}, {row['booking_status_percentage']*100:.0f}% booked)", "No trips scheduled."),
+    'list_all_stops': ('stops', 'All stops', ', ', lambda row: row['name'], "No stops defined."),
+    'list_all_routes': ('routes', 'All routes', '; ', lambda row: f"{row['route_display_name']} ({row['path_name']}, {row['shift_time']})", "No routes found."),
+    'list_all_paths': ('paths', 'All paths', '; ', _path_reply, "No paths available."),
+    'list_all_deployments': ('deployments', 'Active deployments', '; ', lambda row: f"{row['trip_display_name']} → {row['license_plate']} ({row['driver_name']})", "No active deployments."),
+}
 
-def extract_trip_identifier(text: str) -> Optional[str]:
-    patterns = [
-        r"trip\s+['\"]?([^'\"\s]+(?:\s+[^'\"\s]+)*)['\"]?",
-        r"['\"]([^'\"]+)['\"]",
-        r"from\s+['\"]?([^'\"]+?)['\"]?(?:\s+(?:trip|route)|$)",
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            return match.group(1).strip()
-    
-    all_trips = get_all_trips()
-    for trip in all_trips:
-        try:
-            display_name = trip['display_name']
-            if display_name.lower() in text.lower():
-                return display_name
-        except (KeyError, TypeError):
-            pass
-    
-    return None
-
-def extract_path_name(text: str) -> Optional[str]:
-    patterns = [
-        r"['\"]([^'\"]+)['\"]",
-        r"path\s+['\"]?([^'\"\s]+(?:\s+[^'\"\s]+)*)['\"]?(?:\s+(?:to|has|contains|with)|$)",
-        r"(?:for|using|on|in)\s+(?:the\s+)?path\s+['\"]?([^'\"]+?)['\"]?(?:\s+|$)",
-    ]
-    for pattern in patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            result = match.group(1).strip()
-            if result:
-                return result
-    
-    all_paths = get_all_paths()
-    for path in all_paths:
-        try:
-            path_name = path['name']
-            if path_name.lower() in text.lower():
-                return path_name
-        except (KeyError, TypeError):
-            pass
-    
-    return None
-
-def extract_stops_list(text: str) -> Optional[List[str]]:
-    match = re.search(r"(?:using|with)\s+(?:stops?|the following)(?:\s+[:=])?\s*['\"]?([^'\"]+)['\"]?", text, re.IGNORECASE)
-    if match:
-        stops_str = match.group(1)
-        return [s.strip() for s in re.split(r'[,;]|,\s+and\s+', stops_str) if s.strip()]
-    
-    match = re.search(r"\[([^\]]+)\]", text)
-    if match:
-        stops_str = match.group(1)
-        return [s.strip() for s in re.split(r'[,;]', stops_str) if s.strip()]
-    
-    return None
-
-def extract_route_name(text: str) -> Optional[str]:
-    patterns = [
-        r"route\s+['\"]?([^'\"]+?(?:\s+-\s+\d{1,2}:\d{2})?)['\"]?(?:\s+|$)",
-        r"['\"]([^'\"]+)['\"]",
-    ]
-    for pattern in patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            route_name = match.group(1).strip()
-            if route_name:
-                return route_name
-    
-    all_routes = get_all_routes()
-    for route in all_routes:
-        try:
-            route_display_name = route['route_display_name']
-            if route_display_name.lower() in text.lower():
-                return route_display_name
-        except (KeyError, TypeError):
-            pass
-    
-    return None
+def iter_listing_reply(action, batch_size=200):
+    name, title, separator, formatter, empty = LISTING_REPLIES[action]
+    total = count_rows(name)
+    if not total:
+        yield empty
+        return
+    yield f"{title} ({total}): "
+    first = True
+    for batch in iter_rows(name, batch_size=batch_size):
+        text = separator.join(formatter(row) for row in batch)
+        yield text if first else separator + text
+        first = False
 
 def get_first_path_id() -> int:
     paths = get_all_paths()
     return paths[0]['id'] if paths else 1
 
-def get_sample_vehicle_config() -> Dict[str, Any]:
-    vehicles = get_all_vehicles()
-    if vehicles:
-        try:
-            capacity = int(vehicles[0]['capacity']) if 'capacity' in vehicles[0] else 50
-        except (KeyError, TypeError, ValueError):
-            capacity = 50
-        try:
-            model = vehicles[0]['model']
-        except (KeyError, TypeError):
-            model = 'Standard Bus'
-        return {
-            'capacity': capacity,
-            'model': model
-        }
-    return {'capacity': 50, 'model': 'Standard Bus'}
-
-def detect_action_intent(text: str) -> tuple:
-    action = None
-    params = {}
-    
-    text_lower = text.lower()
-    
-    action_verbs = r'\b(show|list|display|get|check|find|remove|delete|unassign|assign|allocate|add|create|update)\b'
-    action_match = re.search(action_verbs, text_lower)
-    action_verb = action_match.group(1) if action_match else 'show'
-    
-    entity_patterns = [
-        (r'vehicle[s]?', 'vehicles'),
-        (r'driver[s]?', 'drivers'),
-        (r'trip[s]?', 'trips'),
-        (r'route[s]?', 'routes'),
-        (r'path[s]?', 'paths'),
-        (r'stop[s]?', 'stops'),
-        (r'deployment[s]?|assignment[s]?', 'deployments'),
-    ]
-    
-    detected_entity = None
-    for pattern, entity_type in entity_patterns:
-        if re.search(pattern, text_lower):
-            detected_entity = entity_type
-            break
-    
-    if action_verb in ['remove', 'delete', 'unassign']:
-        if 'vehicle' in text_lower:
-            trip_name = extract_trip_identifier(text)
-            if trip_name:
-                return ('remove_vehicle_from_trip_by_name', {'trip_name': trip_name})
-    
-    if action_verb in ['assign', 'allocate']:
-        if ('vehicle' in text_lower or 'driver' in text_lower) and 'trip' in text_lower:
-            vehicle = extract_license_plate(text)
-            driver = extract_driver_name(text)
-            trip = extract_trip_identifier(text)
-            if vehicle or driver or trip:
-                return ('assign_vehicle_driver', {'vehicle': vehicle, 'driver': driver, 'trip': trip})
-    
-    if action_verb in ['create', 'add']:
-        if 'stop' in text_lower:
-            stop_name = extract_quoted_string(text, ["called", "named", "stop"])
-            return ('create_stop', {"name": stop_name or "New Stop", "lat": 0.0, "lng": 0.0})
-        elif 'path' in text_lower:
-            path_name = extract_quoted_string(text, ["called", "named", "path"])
-            return ('create_path', {"name": path_name or "New Path"})
-        elif 'vehicle' in text_lower:
-            license_plate = extract_license_plate(text)
-            vehicle_config = get_sample_vehicle_config()
-            return ('create_vehicle', {"license_plate": license_plate or "XX-XX-XXXX", "capacity": vehicle_config['capacity'], "model": vehicle_config['model']})
-        elif 'driver' in text_lower:
-            driver_name = extract_driver_name(text)
-            return ('create_driver', {"name": driver_name or "New Driver", "license": "DL0000000", "phone": "9000000000"})
-    
-    if 'unassigned' in text_lower or 'available' in text_lower or 'free' in text_lower:
-        if 'vehicle' in text_lower:
-            return ('get_unassigned_vehicles', {})
-        elif 'driver' in text_lower:
-            return ('get_unassigned_drivers', {})
-    
-    if action_verb in ['list', 'show', 'display', 'get']:
-        if detected_entity == 'vehicles':
-            return ('list_all_vehicles', {})
-        elif detected_entity == 'drivers':
-            return ('list_all_drivers', {})
-        elif detected_entity == 'trips':
-            return ('list_all_trips', {})
-        elif detected_entity == 'stops':
-            return ('list_all_stops', {})
-        elif detected_entity == 'routes':
-            if 'path' in text_lower:
-                path_name = extract_path_name(text)
-                if path_name:
-                    return ('list_routes_using_path', {'path_name': path_name})
-            return ('list_all_routes', {})
-        elif detected_entity == 'paths':
-            return ('list_all_paths', {})
-        elif detected_entity == 'deployments':
-            return ('list_all_deployments', {})
-        
-        if 'stop' in text_lower and ('route' in text_lower or 'path' in text_lower):
-            if 'route' in text_lower:
-                route_name = extract_route_name(text)
-                if route_name:
-                    return ('list_stops_for_route', {'route_name': route_name})
-            if 'path' in text_lower:
-                path_name = extract_path_name(text)
-                if path_name:
-                    return ('list_stops_for_path', {'path_name': path_name})
-        
-        if 'status' in text_lower and 'trip' in text_lower:
-            trip_name = extract_quoted_string(text)
-            if trip_name:
-                return ('get_trip_status_by_name', {'trip_name': trip_name})
-    
-    return (None, {})
+_TRIP_ACTIONS = ('remove_vehicle_from_trip_by_name', 'get_trip_status_by_name')
+_DEICTIC_TRIPS = ('', 'this', 'that', 'it', 'this one', 'the')
 
 def start_node(state: AgentState) -> AgentState:
     messages = state['messages']
@@ -310,12 +83,12 @@ def start_node(state: AgentState) -> AgentState:
     text = last_message.get('content', '').lower()
     
     if state.get('awaiting_confirmation'):
-        if re.search(r'\b(yes|yep|yeah|sure|confirm|proceed|okay|ok|go ahead)\b', text):
+        if _CONFIRM_PATTERN.search(text):
             state['awaiting_confirmation'] = False
             state['confirmation_override'] = True
             state['needs_confirmation'] = False
             return state
-        if re.search(r'\b(no|nope|cancel|stop|abort|nevermind|never mind)\b', text) or "don't" in text or "do not" in text:
+        if _CANCEL_PATTERN.search(text) or "don't" in text or "do not" in text:
             state['awaiting_confirmation'] = False
             state['confirmation_override'] = False
             state['pending_action'] = None
@@ -334,8 +107,22 @@ def start_node(state: AgentState) -> AgentState:
     state['confirmation_override'] = False
     
     if pending_action:
+        action_params = action_params or {}
+        # "remove the vehicle from this trip" with a dashboard screenshot
+        # attached. Unless the image names a trip exactly, ask rather than act.
+        if (pending_action in _TRIP_ACTIONS
+                and str(action_params.get('trip_name', '')).lower() in _DEICTIC_TRIPS):
+            trip = None
+            if state.get('image_data'):
+                trip = get_trip_info(process_image_for_trip(state['image_data']))
+            if not trip:
+                state['pending_action'] = None
+                state['action_params'] = None
+                state['messages'] = messages + [{"role": "assistant", "content": "Which trip do you mean? Please tell me its name, as shown on the dashboard."}]
+                return state
+            action_params = dict(action_params, trip_name=trip['display_name'], date=trip['date'])
         state['pending_action'] = pending_action
-        state['action_params'] = action_params or {}
+        state['action_params'] = action_params
         return state
     
     state['pending_action'] = None
@@ -343,6 +130,14 @@ def start_node(state: AgentState) -> AgentState:
     state['messages'] = messages + [{"role": "assistant", "content": "I can help with: listing vehicles/drivers/routes/paths/stops/trips, showing stops for a route/path, checking trip status, assigning vehicles/drivers, removing assignments, or creating new items. What would you like to do?"}]
     return state
 
+# action -> (consequences entity, param holding its name)
+DELETE_ACTIONS = {
+    'delete_stop': ('stop', 'name'),
+    'delete_path': ('path', 'name'),
+    'delete_vehicle': ('vehicle', 'license_plate'),
+    'delete_driver': ('driver', 'name'),
+}
+
 def check_consequences(state: AgentState) -> AgentState:
     pending_action = state.get('pending_action')
     if not pending_action:
@@ -360,12 +155,37 @@ def check_consequences(state: AgentState) -> AgentState:
     if pending_action == "remove_vehicle_from_trip_by_name":
         trip_name = action_params.get('trip_name')
         if trip_name:
-            trip_id = find_trip_by_display_name(trip_name)
+            trip_id = find_trip_by_display_name(trip_name, action_params.get('date'))
             if trip_id:
-                booked = check_trip_booked_percentage(trip_id)
-                if booked > 0.0:
+                impact = blast_radius('trip', trip_id, trip_name)
+                if impact['booked_trips']:
                     needs_confirmation = True
-                    confirmation_message = f"Trip '{trip_name}' is {booked*100:.0f}% booked. Removing vehicle will cancel bookings. Proceed?"
+                    confirmation_message = f"Trip '{trip_name}' is {impact['max_booking']*100:.0f}% booked. Removing vehicle will cancel bookings. Proceed?"
+    
+    elif pending_action in DELETE_ACTIONS:
+        entity, key = DELETE_ACTIONS[pending_action]
+        match = resolve(entity, action_params.get(key))
+        if match:
+            # Execute deletes exactly the row that was analysed, and only if
+            # it still has the name and dependents shown here.
+            state['action_params'] = dict(action_params, id=match['id'], dependents=dependents(entity, match['id']),
+                                          **{key: match['name']})
+            # A path still used by routes is refused outright in execute_action.
+            if not (entity == 'path' and dependents('path', match['id'])):
+                needs_confirmation = True
+                confirmation_message = f"{describe(blast_radius(entity, match['id'], match['name']))} Delete it?"
+    
+    elif pending_action == "optimize_assignments":
+        plan = build_plan(action_params.get('date'))
+        state['action_params'] = dict(action_params, plan_id=plan['plan_id'])
+        if plan['assignments']:
+            preview = "; ".join(f"{item['trip']} -> {item['license_plate']} / {item['driver']}" for item in plan['assignments'][:5])
+            more = f" and {len(plan['assignments']) - 5} more" if len(plan['assignments']) > 5 else ""
+            needs_confirmation = True
+            confirmation_message = (
+                f"Optimizer plan fills {len(plan['assignments'])} trips ({len(plan['unassigned'])} left unfilled, "
+                f"cost {plan['total_cost']}): {preview}{more}. Apply it?"
+            )
     
     state['needs_confirmation'] = needs_confirmation
     state['confirmation_message'] = confirmation_message
@@ -380,6 +200,59 @@ def get_confirmation(state: AgentState) -> AgentState:
     state['awaiting_confirmation'] = True
     return state
 
+GEO_REPLY_LIMIT = 20
+
+def _format_distance(metres):
+    return f"{metres / 1000:.1f} km" if metres >= 1000 else f"{metres:.0f} m"
+
+def _geo_reply(action, params):
+    target = (params['lat'], params['lng']) if 'lat' in params else params.get('stop')
+    located = locate(target) if target else None
+    if not located:
+        return f"Stop '{target}' not found or has no coordinates."
+    lat, lng, stop = located
+    label = f"'{stop['name']}'" if stop else f"({lat:.5f}, {lng:.5f})"
+    exclude_id = stop['id'] if stop else None
+    if action == "stops_within_radius":
+        radius = _format_distance(params['radius_m'])
+        stops = stops_within(lat, lng, params['radius_m'], exclude_id=exclude_id)
+        if not stops:
+            return f"No stops within {radius} of {label}."
+        title = f"{len(stops)} stops within {radius} of {label}"
+    else:
+        stops = nearest_stops(lat, lng, params.get('k', 1), exclude_id=exclude_id)
+        if not stops:
+            return f"No stops with coordinates near {label}."
+        title = f"Nearest stop{'s' if len(stops) > 1 else ''} to {label}"
+    listed = ", ".join(f"{item['name']} ({_format_distance(item['distance_m'])})" for item in stops[:GEO_REPLY_LIMIT])
+    more = f" and {len(stops) - GEO_REPLY_LIMIT} more" if len(stops) > GEO_REPLY_LIMIT else ""
+    return f"{title}: {listed}{more}"
+
+# Read-only action -> tables its reply is built from. Replies are memoized by
+# (action, params) until one of those tables is written.
+READ_ONLY_ACTIONS = {
+    'get_unassigned_vehicles': ('vehicles', 'deployments'),
+    'get_unassigned_drivers': ('drivers', 'deployments'),
+    'list_all_vehicles': ('vehicles',),
+    'list_all_drivers': ('drivers',),
+    'list_all_trips': ('daily_trips', 'routes', 'paths'),
+    'list_all_stops': ('stops',),
+    'list_all_routes': ('routes', 'paths'),
+    'list_all_paths': ('paths', 'path_stops', 'stops'),
+    'list_all_deployments': ('deployments', 'daily_trips', 'vehicles', 'drivers'),
+    'list_stops_for_route': ('routes', 'paths', 'path_stops', 'stops'),
+    'list_stops_for_path': ('paths', 'path_stops', 'stops'),
+    'list_routes_using_path': ('routes', 'paths'),
+    'get_trip_status_by_name': ('daily_trips', 'routes', 'deployments', 'vehicles', 'drivers'),
+    'stops_within_radius': ('stops',),
+    'nearest_stops': ('stops',),
+}
+
+action_cache = VersionedCache(config.ACTION_CACHE_SIZE)
+
+def _action_cache_key(action, params):
+    return (action, tuple(sorted((key, ' '.join(str(value).split())) for key, value in params.items())))
+
 def execute_action(state: AgentState) -> AgentState:
     action = state.get('pending_action')
     params = state.get('action_params') or {}
@@ -392,9 +265,18 @@ def execute_action(state: AgentState) -> AgentState:
         return state
     
     response = ""
+    cache_key = cached = None
+    # Streamed listings are sent row by row and never held whole.
+    if action in READ_ONLY_ACTIONS and config.ACTION_CACHE_SIZE > 0 and not (state.get('stream') and action in LISTING_REPLIES):
+        cache_key = _action_cache_key(action, params)
+        versions = table_versions.get(*READ_ONLY_ACTIONS[action])
+        cached = action_cache.lookup(cache_key, versions)
     
     try:
-        if action == "get_unassigned_vehicles":
+        if cached is not None:
+            response = cached
+        
+        elif action == "get_unassigned_vehicles":
             result = get_unassigned_vehicles()
             count = len(result)
             plates = [row["license_plate"] for row in result]
@@ -422,6 +304,22 @@ def execute_action(state: AgentState) -> AgentState:
             driver_id = create_driver(params['name'], params['license'], params['phone'])
             response = f"Created driver '{params['name']}' with ID {driver_id}"
         
+        elif action in DELETE_ACTIONS:
+            entity, key = DELETE_ACTIONS[action]
+            name = params.get(key)
+            if not params.get('id'):
+                response = unresolved_message(entity.capitalize(), SEARCH_KINDS[entity], name)
+            elif action == "delete_path" and dependents('path', params['id']):
+                response = f"{describe(blast_radius('path', params['id'], name))} Move or remove those routes first."
+            else:
+                delete = {'delete_stop': delete_stop, 'delete_path': delete_path,
+                          'delete_vehicle': delete_vehicle, 'delete_driver': delete_driver}[action]
+                try:
+                    deleted = delete(params['id'], expected=(name, params.get('dependents', 0)))
+                    response = f"Deleted {entity} '{name}'." if deleted else f"{entity.capitalize()} '{name}' not found."
+                except StaleImpactError as e:
+                    response = str(e)
+        
         elif action == "assign_vehicle_driver":
             vehicle_plate = params.get('vehicle')
             driver_name = params.get('driver')
@@ -430,88 +328,72 @@ def execute_action(state: AgentState) -> AgentState:
             if not (vehicle_plate or driver_name or trip_name):
                 response = "Please specify a vehicle, driver, and trip to assign."
             else:
-                trip_id = find_trip_by_display_name(trip_name) if trip_name else None
+                trip_id = find_trip_by_display_name(trip_name, params.get('date')) if trip_name else None
                 vehicle_id = find_vehicle_by_plate(vehicle_plate) if vehicle_plate else None
                 driver_id = find_driver_by_name(driver_name) if driver_name else None
                 
                 if not trip_id:
-                    response = f"Trip '{trip_name}' not found. Please check the trip name."
+                    response = unresolved_message('Trip', 'trips', trip_name, params.get('date'))
                 elif not vehicle_id:
-                    response = f"Vehicle '{vehicle_plate}' not found. Please check the vehicle plate."
+                    response = unresolved_message('Vehicle', 'vehicles', vehicle_plate)
                 elif not driver_id:
-                    response = f"Driver '{driver_name}' not found. Please check the driver name."
+                    response = unresolved_message('Driver', 'drivers', driver_name)
                 else:
                     try:
-                        conn = get_db_connection()
-                        cursor = conn.cursor()
-                        cursor.execute('DELETE FROM deployments WHERE trip_id = ?', (trip_id,))
-                        deployment_id = assign_vehicle_driver(trip_id, vehicle_id, driver_id)
-                        conn.commit()
-                        conn.close()
-                        response = f"Assigned vehicle {vehicle_plate} and driver {driver_name} to trip '{trip_name}' (Deployment ID: {deployment_id})"
+                        result = bulk_assign_deployments([(trip_id, vehicle_id, driver_id)], atomic=True)
+                        if result['conflicts']:
+                            response = f"Could not assign trip '{trip_name}': {', '.join(result['conflicts'][0]['reasons'])}"
+                        else:
+                            replaced = " (replaced the previous assignment)" if result['updated'] else ""
+                            response = f"Assigned vehicle {vehicle_plate} and driver {driver_name} to trip '{trip_name}'{replaced}"
                     except Exception as e:
                         response = f"Error assigning vehicle and driver: {str(e)}"
         
-        elif action == "list_all_vehicles":
-            vehicles = get_all_vehicles()
-            if vehicles:
-                formatted = ", ".join([f"{row['license_plate']} ({row['model']})" for row in vehicles])
-                response = f"All vehicles ({len(vehicles)}): {formatted}"
-            else:
-                response = "No vehicles found."
-        
-        elif action == "list_all_drivers":
-            drivers = get_all_drivers()
-            if drivers:
-                formatted = ", ".join([f"{row['name']} ({row['license_number']})" for row in drivers])
-                response = f"All drivers ({len(drivers)}): {formatted}"
-            else:
-                response = "No drivers found."
-        
-        elif action == "list_all_trips":
-            trips = get_trips_with_routes()
-            if trips:
-                formatted = "; ".join([f"Trip {row['id']}: {row['route_name']} on {row['date']} ({row['live_status']}, {row['booking_status_percentage']*100:.0f}% booked)" for row in trips])
-                response = f"All trips ({len(trips)}): {formatted}"
-            else:
-                response = "No trips scheduled."
-        
-        elif action == "list_all_stops":
-            stops = get_all_stops()
-            if stops:
-                formatted = ", ".join([row['name'] for row in stops])
-                response = f"All stops ({len(stops)}): {formatted}"
+        elif action == "optimize_assignments":
+            plan = get_plan(params['plan_id']) if params.get('plan_id') else None
+            if not plan or not plan['assignments']:
+                unfilled = len(plan['unassigned']) if plan else 0
+                response = f"No unassigned trips can be filled right now ({unfilled} trips have no free vehicle and driver)."
             else:
-                response = "No stops defined."
+                try:
+                    result = apply_plan(plan['plan_id'])
+                    response = f"Applied optimizer plan: assigned {result['created'] + result['updated']} trips, {result['unassigned']} left unfilled."
+                    if result['conflicts']:
+                        response = f"Optimizer plan not applied: {len(result['conflicts'])} rows conflicted. Please ask again for a fresh plan."
+                except StalePlanError as e:
+                    response = str(e)
         
-        elif action == "list_all_routes":
-            routes = get_routes_with_paths()
-            if routes:
-                formatted = "; ".join([f"{row['route_display_name']} ({row['path_name']}, {row['shift_time']})" for row in routes])
-                response = f"All routes ({len(routes)}): {formatted}"
-            else:
-                response = "No routes found."
+        elif action == "bulk_assign_vehicle_driver":
+            assignments = params.get('assignments') or []
+            rows = []
+            unresolved = []
+            for item in assignments:
+                ids = (
+                    find_trip_by_display_name(item['trip'], item.get('date')) if item.get('trip') else None,
+                    find_vehicle_by_plate(item['vehicle']) if item.get('vehicle') else None,
+                    find_driver_by_name(item['driver']) if item.get('driver') else None,
+                )
+                if all(ids):
+                    rows.append(ids)
+                else:
+                    unresolved.append(item.get('trip') or item.get('clause'))
+            result = bulk_assign_deployments(rows)
+            assigned = result['created'] + result['updated']
+            response = f"Assigned {assigned} of {len(assignments)} trips ({result['created']} new, {result['updated']} replaced)."
+            if unresolved:
+                response += f" Could not resolve: {'; '.join(str(name) for name in unresolved)}."
+            if result['conflicts']:
+                response += f" {len(result['conflicts'])} conflicting rows skipped."
         
-        elif action == "list_all_paths":
-            paths = get_paths_with_stops()
-            if paths:
-                formatted_paths = []
-                for path in paths:
-                    stop_names = " → ".join([stop['name'] for stop in path['stops']]) if path['stops'] else "No stops"
-                    formatted_paths.append(f"{path['name']} ({stop_names})")
-                response = f"All paths ({len(paths)}): {'; '.join(formatted_paths)}"
+        elif action in LISTING_REPLIES:
+            if state.get('stream'):
+                state['stream_action'] = action
+                response = ""
             else:
-                response = "No paths available."
+                response = "".join(iter_listing_reply(action))
         
-        elif action == "list_all_deployments":
-            deployments = get_deployments_detailed()
-            if deployments:
-                formatted = []
-                for item in deployments:
-                    formatted.append(f"{item['trip_display_name']} → {item['license_plate']} ({item['driver_name']})")
-                response = f"Active deployments ({len(deployments)}): {'; '.join(formatted)}"
-            else:
-                response = "No active deployments."
+        elif action in ("stops_within_radius", "nearest_stops"):
+            response = _geo_reply(action, params)
         
         elif action == "list_stops_for_route":
             route_name = params.get('route_name')
@@ -571,7 +453,7 @@ def execute_action(state: AgentState) -> AgentState:
             if not trip_name:
                 response = "Please specify a trip name."
             else:
-                trip_info = get_trip_status_by_name(trip_name)
+                trip_info = get_trip_status_by_name(trip_name, params.get('date'))
                 if trip_info:
                     response = f"Trip '{trip_info['display_name']}': {trip_info['booking_status_percentage']*100:.0f}% booked, Status: {trip_info['live_status']}, Date: {trip_info['date']}"
                     try:
@@ -581,27 +463,30 @@ def execute_action(state: AgentState) -> AgentState:
                     except (KeyError, TypeError):
                         pass
                 else:
-                    response = f"Trip '{trip_name}' not found."
+                    response = unresolved_message('Trip', 'trips', trip_name, params.get('date'))
         
         elif action == "remove_vehicle_from_trip_by_name":
             trip_name = params.get('trip_name')
             if not trip_name:
                 response = "Please specify a trip name."
             else:
-                trip_id = find_trip_by_display_name(trip_name)
+                trip_id = find_trip_by_display_name(trip_name, params.get('date'))
                 if trip_id:
-                    conn = get_db_connection()
-                    cursor = conn.cursor()
-                    cursor.execute('DELETE FROM deployments WHERE trip_id = ?', (trip_id,))
-                    removed = cursor.rowcount
-                    conn.commit()
-                    conn.close()
+                    with get_db_connection() as conn:
+                        cursor = conn.cursor()
+                        cursor.execute('DELETE FROM deployments WHERE trip_id = ?', (trip_id,))
+                        removed = cursor.rowcount
+                        conn.commit()
+                    bump_tables('deployments')
                     response = f"Removed vehicle assignment from trip '{trip_name}'" if removed else f"No vehicle assignment found for trip '{trip_name}'"
                 else:
-                    response = f"Trip '{trip_name}' not found."
+                    response = unresolved_message('Trip', 'trips', trip_name, params.get('date'))
         
         else:
             response = f"Action '{action}' not implemented yet."
+        
+        if cache_key is not None and cached is None:
+            action_cache.store(cache_key, versions, response)
     
     except Exception as e:
         response = f"Error executing {action}: {str(e)}"
@@ -625,13 +510,32 @@ def route_to_action(state: AgentState) -> str:
     else:
         return END
 
-def build_agent():
+def create_checkpointer(kind=None):
+    kind = (kind or config.AGENT_CHECKPOINTER).lower()
+    if kind == 'memory':
+        return MemorySaver()
+    if kind == 'sqlite':
+        try:
+            from langgraph.checkpoint.sqlite import SqliteSaver
+        except ImportError:
+            raise RuntimeError("The 'langgraph-checkpoint-sqlite' package is required for AGENT_CHECKPOINTER=sqlite")
+        # One connection shared by the worker's threads; SqliteSaver serialises
+        # access itself and WAL lets other worker processes read meanwhile.
+        conn = sqlite3.connect(config.CHECKPOINT_DB_PATH, check_same_thread=False, timeout=30.0)
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        saver = SqliteSaver(conn)
+        saver.setup()
+        return saver
+    return None
+
+def build_agent(checkpointer=None):
     workflow = StateGraph(AgentState)
     
-    workflow.add_node("start", start_node)
-    workflow.add_node("check_consequences", check_consequences)
-    workflow.add_node("get_confirmation", get_confirmation)
-    workflow.add_node("execute_action", execute_action)
+    workflow.add_node("start", instrument_node("start", start_node))
+    workflow.add_node("check_consequences", instrument_node("check_consequences", check_consequences))
+    workflow.add_node("get_confirmation", instrument_node("get_confirmation", get_confirmation))
+    workflow.add_node("execute_action", instrument_node("execute_action", execute_action))
     
     workflow.add_edge("start", "check_consequences")
     workflow.add_conditional_edges("check_consequences", route_to_action)
@@ -640,7 +544,8 @@ def build_agent():
     
     workflow.set_entry_point("start")
     
-    checkpointer = MemorySaver()
+    if checkpointer is None:
+        checkpointer = create_checkpointer()
     return workflow.compile(checkpointer=checkpointer)
 
 agent = build_agent()
@@ -0,0 +1,106 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, request
+
+from db import table_versions
+
+
+# LRU of values stamped with the table versions they were built from; an
+# entry whose stamp no longer matches counts as a miss.
+class VersionedCache:
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._stats = {'hits': 0, 'misses': 0}
+
+    def lookup(self, key, versions):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != versions:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry[1]
+
+    def store(self, key, versions, value):
+        with self._lock:
+            self._entries[key] = (versions, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries), max_entries=self.max_entries)
+
+
+class ResponseCache(VersionedCache):
+    def __init__(self, max_entries=256):
+        super().__init__(max_entries)
+        self._stats['not_modified'] = 0
+
+    def store(self, key, versions, body):
+        etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        return super().store(key, versions, (body, etag))
+
+    def count_not_modified(self):
+        with self._lock:
+            self._stats['not_modified'] += 1
+
+
+response_cache = ResponseCache()
+
+
+def render_stats(caches):
+    lines = []
+    for metric, key, help_text in (
+        ('hits_total', 'hits', 'Lookups answered from the cache.'),
+        ('misses_total', 'misses', 'Lookups that had to be recomputed.'),
+        ('entries', 'entries', 'Entries currently held.'),
+    ):
+        kind = 'gauge' if key == 'entries' else 'counter'
+        lines.append(f'# HELP movi_cache_{metric} {help_text}')
+        lines.append(f'# TYPE movi_cache_{metric} {kind}')
+        for name, cache in caches.items():
+            lines.append(f'movi_cache_{metric}{{cache="{name}"}} {cache.stats()[key]}')
+    return '\n'.join(lines) + '\n'
+
+
+# Serves a read endpoint from response_cache while none of `tables` has been
+# written since the body was built, and answers If-None-Match with 304.
+# The view returns a dict on success; anything else (errors) passes through.
+def cached_json(*tables):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = (request.path, request.query_string)
+            versions = table_versions.get(*tables)
+            entry = response_cache.lookup(key, versions)
+            if entry is None:
+                result = view(*args, **kwargs)
+                if not isinstance(result, dict):
+                    return result
+                body = json.dumps(result, sort_keys=True, separators=(',', ':')).encode('utf-8')
+                entry = response_cache.store(key, versions, body)
+            body, etag = entry
+            if request.if_none_match.contains(etag):
+                response_cache.count_not_modified()
+                response = Response(status=304)
+            else:
+                response = Response(body, mimetype='application/json')
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
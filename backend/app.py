@@ -1,96 +1,181 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-from agent import agent, AgentState
+from agent import action_cache, agent, AgentState, iter_listing_reply
 from config import config
-import base64
-import io
-from PIL import Image
+from session_store import create_session_store
+from api_cache import cached_json, render_stats, response_cache
+from image_pipeline import prepare, strip_data_url, stats as image_stats
+from instrumentation import collect_timings, metrics
+from path_geometry import path_geometry_cache
+import json
+import time
 import uuid
 
 app = Flask(__name__)
 if config.CORS_ENABLED:
     CORS(app)
 
-session_store = {}
+session_store = create_session_store()
 
-@app.route('/chat', methods=['POST'])
-def chat():
-    try:
-        data = request.json or {}
-        message = data.get('message', '').strip()
-        context = data.get('context', '')
-        image_data = data.get('image')
-        session_id = data.get('sessionId') or data.get('session_id') or str(uuid.uuid4())
-        sanitized_image = None
-        image_metadata = None
-        
-        if image_data:
-            try:
-                payload = image_data.split(config.API_BASE64_DELIMITER)[1] if config.API_BASE64_DELIMITER in image_data else image_data
-                image_bytes = base64.b64decode(payload)
-                with Image.open(io.BytesIO(image_bytes)) as img:
-                    image_metadata = {'width': img.size[0], 'height': img.size[1]}
-                sanitized_image = payload
-            except Exception as exc:
-                print(f"Image processing error: {exc}")
-                sanitized_image = None
-        
-        state = session_store.get(session_id)
-        if not state:
-            state = {
-                "messages": [],
-                "context": context,
-                "pending_action": None,
-                "action_params": None,
-                "needs_confirmation": False,
-                "image_data": None,
-                "confirmation_message": None,
-                "awaiting_confirmation": False,
-                "confirmation_override": False
-            }
-        
-        history = list(state.get('messages', []))
-        if message:
-            history.append({"role": "user", "content": message})
-        
-        state['messages'] = history
-        state['context'] = context
-        state['image_data'] = sanitized_image
-        state.setdefault('awaiting_confirmation', False)
-        state.setdefault('confirmation_override', False)
-        state.setdefault('needs_confirmation', False)
-        state.setdefault('confirmation_message', None)
-        state.setdefault('pending_action', None)
-        state.setdefault('action_params', None)
-        
-        result = agent.invoke(state, config={"recursion_limit": 5, "thread_id": session_id})
-        session_store[session_id] = result
-        
-        response_text = None
+def resolve_session_id(data):
+    return data.get('sessionId') or data.get('session_id') or str(uuid.uuid4())
+
+def run_chat_turn(data, session_id, stream=False):
+    message = data.get('message', '').strip()
+    context = data.get('context', '')
+    image_data = data.get('image')
+    sanitized_image = None
+    image_metadata = None
+    
+    if image_data:
+        # Decoded and prepared for OCR once; the agent's later OCR call finds
+        # it in the pipeline's cache by content hash.
+        prepared = prepare(image_data)
+        if prepared is not None:
+            image_metadata = {'width': prepared.width, 'height': prepared.height}
+            sanitized_image = strip_data_url(image_data)
+        else:
+            print("Image processing error: could not decode image")
+    
+    state = session_store.get(session_id)
+    if not state:
+        state = {
+            "messages": [],
+            "context": context,
+            "pending_action": None,
+            "action_params": None,
+            "needs_confirmation": False,
+            "image_data": None,
+            "confirmation_message": None,
+            "awaiting_confirmation": False,
+            "confirmation_override": False
+        }
+    
+    history = list(state.get('messages', []))
+    if message:
+        history.append({"role": "user", "content": message})
+    
+    state['messages'] = history
+    state['context'] = context
+    state['image_data'] = sanitized_image
+    state.setdefault('awaiting_confirmation', False)
+    state.setdefault('confirmation_override', False)
+    state.setdefault('needs_confirmation', False)
+    state.setdefault('confirmation_message', None)
+    state.setdefault('pending_action', None)
+    state.setdefault('action_params', None)
+    
+    state['stream'] = stream
+    state['stream_action'] = None
+    
+    result = agent.invoke(state, config={"recursion_limit": 5, "configurable": {"thread_id": session_id}})
+    return session_id, result, context, sanitized_image, image_metadata
+
+def chat_payload(session_id, result, context, sanitized_image, image_metadata, response_text=None):
+    if response_text is None:
         for msg in reversed(result.get('messages', [])):
             if isinstance(msg, dict) and msg.get('role') == 'assistant':
                 response_text = msg.get('content')
                 break
-        
-        if not response_text:
-            response_text = config.DEFAULT_RESPONSE
-        
-        return jsonify({
-            'response': response_text,
-            'context': context,
-            'image_processed': sanitized_image is not None,
-            'sessionId': session_id,
-            'awaitingConfirmation': result.get('awaiting_confirmation', False),
-            'imageMetadata': image_metadata
-        })
+    
+    if not response_text:
+        response_text = config.DEFAULT_RESPONSE
+    
+    return {
+        'response': response_text,
+        'context': context,
+        'image_processed': sanitized_image is not None,
+        'sessionId': session_id,
+        'awaitingConfirmation': result.get('awaiting_confirmation', False),
+        'imageMetadata': image_metadata
+    }
+
+# Shared by the Flask view and the ASGI entry point (asgi.py).
+def handle_chat(data):
+    try:
+        # The turn reads and writes the whole session state, so concurrent
+        # turns of one session (in any worker process) run one at a time.
+        session_id = resolve_session_id(data)
+        with session_store.lock(session_id), collect_timings() as timings:
+            turn = run_chat_turn(data, session_id)
+            session_store.set(session_id, turn[1])
+        payload = chat_payload(*turn)
+        if data.get('timings'):
+            payload['timings'] = timings
+        return payload, 200
+    except TimeoutError as e:
+        return {'response': str(e), 'error': True}, 409
     except Exception as e:
         print(f"Chat error: {e}")
         import traceback
         traceback.print_exc()
-        return jsonify({
+        return {
             'response': f"Sorry, I encountered an error: {str(e)}",
             'error': True
-        }), 500
+        }, 500
+
+def sse_event(event, data, event_id=None):
+    prefix = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{prefix}event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# Server-Sent Events for /chat/stream: 'chunk' events carry reply text as it
+# is produced, then one 'done' event carries the usual /chat payload.
+def stream_chat(data):
+    session_id = resolve_session_id(data)
+    try:
+        with session_store.lock(session_id):
+            yield from _stream_turn(data, session_id)
+    except TimeoutError as e:
+        yield sse_event('error', {'response': str(e), 'error': True})
+
+def _stream_turn(data, session_id):
+    try:
+        with collect_timings() as timings:
+            turn = run_chat_turn(data, session_id, stream=True)
+    except Exception as e:
+        print(f"Chat error: {e}")
+        yield sse_event('error', {'response': f"Sorry, I encountered an error: {str(e)}", 'error': True})
+        return
+    result = turn[1]
+    action = result.get('stream_action')
+    if not action:
+        session_store.set(session_id, result)
+        payload = chat_payload(*turn)
+        if data.get('timings'):
+            payload['timings'] = timings
+        yield sse_event('chunk', {'text': payload['response']})
+        yield sse_event('done', payload)
+        return
+    
+    parts = []
+    try:
+        for chunk in iter_listing_reply(action):
+            parts.append(chunk)
+            yield sse_event('chunk', {'text': chunk})
+    except Exception as e:
+        print(f"Stream error: {e}")
+        error_text = f"Error executing {action}: {str(e)}"
+        parts.append(error_text)
+        yield sse_event('chunk', {'text': error_text})
+    finally:
+        # Persist what was produced even if the client went away mid-stream.
+        result['messages'][-1] = {"role": "assistant", "content": "".join(parts)}
+        result['stream_action'] = None
+        session_store.set(session_id, result)
+    payload = chat_payload(*turn, response_text="".join(parts))
+    if data.get('timings'):
+        payload['timings'] = timings
+    yield sse_event('done', payload)
+
+@app.route('/chat', methods=['POST'])
+def chat():
+    payload, status = handle_chat(request.json or {})
+    return jsonify(payload), status
+
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    return Response(stream_chat(request.json or {}), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/speech-to-text', methods=['POST'])
 def speech_to_text():
@@ -101,32 +186,48 @@ def text_to_speech():
     return jsonify({'status': config.TEXT_TO_SPEECH_ERROR, 'error': True}), 501
 
 # Add API endpoints for data access
+LISTING_OPTIONS = ('fields', 'limit', 'cursor')
+
+def listing_payload(key):
+    from listing import list_rows, list_paths
+    filters = request.args.to_dict()
+    options = {name: filters.pop(name, None) for name in LISTING_OPTIONS}
+    if key == 'paths':
+        items, next_cursor = list_paths(filters, **options)
+    else:
+        items, next_cursor = list_rows(key, filters, **options)
+    payload = {key: items}
+    if options['limit']:
+        payload['next_cursor'] = next_cursor
+    return payload
+
 @app.route('/api/vehicles', methods=['GET'])
+@cached_json('vehicles', 'deployments')
 def get_vehicles():
     try:
-        from tools import get_all_vehicles
-        vehicles = get_all_vehicles()
-        payload = [dict(row) for row in vehicles]
-        return jsonify({'vehicles': payload})
+        return listing_payload('vehicles')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/drivers', methods=['GET'])
+@cached_json('drivers', 'deployments')
 def get_drivers():
     try:
-        from tools import get_all_drivers
-        drivers = get_all_drivers()
-        payload = [dict(row) for row in drivers]
-        return jsonify({'drivers': payload})
+        return listing_payload('drivers')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/trips', methods=['GET'])
+@cached_json('daily_trips', 'routes', 'paths', 'deployments')
 def get_trips():
     try:
-        from tools import get_trips_with_routes
-        trips = get_trips_with_routes()
-        return jsonify({'trips': trips})
+        return listing_payload('trips')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         import traceback
         print(f"Error in get_trips: {e}")
@@ -134,38 +235,85 @@ def get_trips():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/stops', methods=['GET'])
+@cached_json('stops')
 def get_stops():
     try:
-        from tools import get_all_stops
-        stops = get_all_stops()
-        payload = [
-            {
-                'id': row['id'],
-                'name': row['name'],
-                'latitude': row['latitude'],
-                'longitude': row['longitude']
-            }
-            for row in stops
-        ]
-        return jsonify({'stops': payload})
+        return listing_payload('stops')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# ?lat=&lng= or ?stop=<name>; a named stop is left out of its own results.
+def geo_origin(args):
+    from geo import locate
+    if args.get('lat') is not None or args.get('lng') is not None:
+        lat, lng = float(args.get('lat', '')), float(args.get('lng', ''))
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            raise ValueError('lat/lng out of range')
+        return {'lat': lat, 'lng': lng, 'stop': None}
+    if not args.get('stop'):
+        raise ValueError('Pass lat and lng, or stop')
+    located = locate(args['stop'])
+    if not located:
+        raise LookupError(f"Stop '{args['stop']}' not found or has no coordinates")
+    return {'lat': located[0], 'lng': located[1], 'stop': located[2]}
+
+@app.route('/api/stops/nearby', methods=['GET'])
+@cached_json('stops')
+def get_stops_nearby():
+    from geo import stops_within
+    try:
+        origin = geo_origin(request.args)
+        radius = float(request.args.get('radius', 500))
+        if radius <= 0:
+            raise ValueError('radius must be positive')
+        limit = min(int(request.args.get('limit', config.API_MAX_PAGE_SIZE)), config.API_MAX_PAGE_SIZE)
+        exclude_id = origin['stop']['id'] if origin['stop'] else None
+        stops = stops_within(origin['lat'], origin['lng'], radius, limit=limit, exclude_id=exclude_id)
+        return {'origin': origin, 'radius_m': radius, 'stops': stops}
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/stops/nearest', methods=['GET'])
+@cached_json('stops')
+def get_stops_nearest():
+    from geo import nearest_stops
+    try:
+        origin = geo_origin(request.args)
+        k = max(1, min(int(request.args.get('k', 5)), config.API_MAX_PAGE_SIZE))
+        max_radius = float(request.args['max_radius']) if request.args.get('max_radius') else None
+        exclude_id = origin['stop']['id'] if origin['stop'] else None
+        stops = nearest_stops(origin['lat'], origin['lng'], k, max_radius_m=max_radius, exclude_id=exclude_id)
+        return {'origin': origin, 'k': k, 'stops': stops}
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/paths', methods=['GET'])
+@cached_json('paths', 'path_stops', 'stops')
 def get_paths():
     try:
-        from tools import get_paths_with_stops
-        paths = get_paths_with_stops()
-        return jsonify({'paths': paths})
+        return listing_payload('paths')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/routes', methods=['GET'])
+@cached_json('routes', 'paths')
 def get_routes():
     try:
-        from tools import get_routes_with_paths
-        routes = get_routes_with_paths()
-        return jsonify({'routes': routes})
+        return listing_payload('routes')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         import traceback
         print(f"Error in get_routes: {e}")
@@ -173,17 +321,196 @@ def get_routes():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/deployments', methods=['GET'])
+@cached_json('deployments', 'vehicles', 'drivers', 'daily_trips', 'routes')
 def get_deployments():
     try:
-        from tools import get_deployments_detailed
-        deployments = get_deployments_detailed()
-        return jsonify({'deployments': deployments})
+        return listing_payload('deployments')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         import traceback
         print(f"Error in get_deployments: {e}")
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/deployments/bulk', methods=['POST'])
+def bulk_deployments():
+    from tools import bulk_assign_deployments
+    try:
+        data = request.json or {}
+        assignments = data.get('assignments')
+        if not isinstance(assignments, list) or not all(isinstance(item, dict) for item in assignments):
+            raise ValueError("'assignments' must be a list of {trip_id, vehicle_id, driver_id} objects")
+        atomic = bool(data.get('atomic', False))
+        result = bulk_assign_deployments(assignments, atomic=atomic)
+        status = 409 if atomic and result['conflicts'] else 200
+        return jsonify(result), status
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        import traceback
+        print(f"Error in bulk_deployments: {e}")
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/deployments/conflicts', methods=['GET'])
+@cached_json('deployments', 'daily_trips', 'routes', 'vehicles', 'drivers')
+def deployment_conflicts():
+    from conflicts import conflicts_for_date
+    try:
+        date = request.args.get('date') or None
+        conflicts = conflicts_for_date(date)
+        return {'date': date, 'count': len(conflicts), 'conflicts': conflicts}
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/optimizer/plan', methods=['POST'])
+def optimizer_preview():
+    from optimizer import build_plan
+    try:
+        data = request.json or {}
+        return jsonify(build_plan(data.get('date')))
+    except Exception as e:
+        import traceback
+        print(f"Error in optimizer_preview: {e}")
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/optimizer/plan/<plan_id>/apply', methods=['POST'])
+def optimizer_apply(plan_id):
+    from optimizer import StalePlanError, apply_plan
+    try:
+        result = apply_plan(plan_id)
+        return jsonify(result), 409 if result['conflicts'] else 200
+    except KeyError:
+        return jsonify({'error': f"Unknown or expired plan '{plan_id}'"}), 404
+    except StalePlanError as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/search', methods=['GET'])
+@cached_json('daily_trips', 'routes', 'vehicles', 'drivers', 'paths', 'stops')
+def search():
+    from search import SEARCH_SOURCES, search_entities
+    try:
+        query = request.args.get('q', '')
+        kinds = [kind for kind in request.args.get('kind', '').split(',') if kind]
+        unknown = [kind for kind in kinds if kind not in SEARCH_SOURCES]
+        if unknown:
+            raise ValueError(f"Unknown kind(s): {', '.join(unknown)}")
+        limit = int(request.args.get('limit', 10))
+        return {'query': query, 'results': search_entities(query, kinds or None, limit=max(1, min(limit, 100)))}
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/impact', methods=['GET'])
+@cached_json('stops', 'paths', 'path_stops', 'routes', 'daily_trips', 'deployments', 'vehicles', 'drivers')
+def impact():
+    from consequences import TRAVERSALS, blast_radius, describe, resolve
+    try:
+        entity = request.args.get('entity', '')
+        if entity not in TRAVERSALS:
+            raise ValueError(f"Unknown entity '{entity}'. Use one of: {', '.join(TRAVERSALS)}")
+        if request.args.get('id'):
+            entity_id, name = int(request.args['id']), None
+        else:
+            match = resolve(entity, request.args.get('name', ''), request.args.get('date'))
+            if not match:
+                return jsonify({'error': f"{entity.capitalize()} not found"}), 404
+            entity_id, name = match['id'], match['name']
+        result = blast_radius(entity, entity_id, name)
+        result['summary'] = describe(result)
+        return result
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def change_cursor(value):
+    try:
+        since = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("'since' must be a change-log cursor from a previous response")
+    if since < 0:
+        raise ValueError("'since' must not be negative")
+    return since
+
+@app.route('/api/changes', methods=['GET'])
+def get_changes():
+    from changes import changes_since, latest_seq, maybe_prune
+    try:
+        if not request.args.get('since'):
+            return {'cursor': latest_seq()}
+        since = change_cursor(request.args['since'])
+        limit = request.args.get('limit')
+        limit = max(1, min(int(limit), config.CHANGE_FEED_PAGE_SIZE)) if limit else None
+        maybe_prune()
+        return changes_since(since, limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Server-Sent Events for /api/changes/stream: a 'changes' event per delta
+# (the /api/changes payload) with the cursor as its id, so a reconnecting
+# EventSource resumes via Last-Event-ID; comments keep idle proxies open.
+# asgi.py serves the same events without blocking a worker thread.
+def change_events(cursor):
+    from changes import changes_since
+    events = []
+    more = True
+    while more:
+        delta = changes_since(cursor)
+        cursor, more = delta['cursor'], delta['more']
+        events.append(sse_event('changes', delta, cursor))
+    return cursor, events
+
+def stream_changes(since):
+    from changes import change_feed
+    cursor = since
+    deadline = time.monotonic() + config.CHANGE_STREAM_MAX_SECONDS
+    yield sse_event('ready', {'cursor': cursor}, cursor)
+    while time.monotonic() < deadline:
+        latest = change_feed.wait(cursor, config.CHANGE_STREAM_HEARTBEAT_SECONDS)
+        if latest is None or latest == cursor:
+            yield ": keepalive\n\n"
+            continue
+        cursor, events = change_events(cursor)
+        yield from events
+
+@app.route('/api/changes/stream', methods=['GET'])
+def get_changes_stream():
+    from changes import latest_seq
+    try:
+        # A reconnecting EventSource repeats the original URL; its
+        # Last-Event-ID is the newer cursor.
+        since = request.headers.get('Last-Event-ID') or request.args.get('since')
+        since = change_cursor(since) if since else latest_seq()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return Response(stream_changes(since), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/sessions/metrics', methods=['GET'])
+def session_metrics():
+    try:
+        return jsonify(session_store.metrics())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify({'actions': action_cache.stats(), 'responses': response_cache.stats(), 'images': image_stats(),
+                    'path_geometry': path_geometry_cache.stats()})
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    body = metrics.render() + render_stats({'actions': action_cache, 'responses': response_cache, 'path_geometry': path_geometry_cache})
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
 @app.route('/health', methods=['GET'])
 def health():
     return jsonify({'status': config.HEALTH_STATUS, 'mode': config.MODE})
@@ -0,0 +1,306 @@
+import asyncio
+import functools
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from io import BytesIO
+from urllib.parse import parse_qs
+
+from app import app as flask_app, change_cursor, change_events, handle_chat, sse_event, stream_chat
+from changes import change_feed, latest_seq
+from config import config
+from db import pool
+
+
+class AsgiApp:
+    def __init__(self, wsgi_app, max_threads=32, max_concurrency=512, queue_timeout=10.0):
+        self.wsgi_app = wsgi_app
+        self.max_threads = max_threads
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix='movi-asgi')
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._session_locks = {}
+        self._stats_lock = threading.Lock()
+        self._stats = {'in_flight': 0, 'completed': 0, 'rejected': 0, 'subscribers': 0}
+        self.routes = {
+            ('POST', '/chat'): self.chat,
+            ('GET', '/health'): self.health,
+        }
+        self.streams = {
+            ('POST', '/chat/stream'): self.chat_stream,
+        }
+        # Long-lived subscriptions that wait on the event loop, not on a
+        # thread, so they bypass the concurrency slots.
+        self.subscriptions = {
+            ('GET', '/api/changes/stream'): self.change_stream,
+        }
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def stats(self):
+        with self._stats_lock:
+            return dict(self._stats, max_concurrency=self.max_concurrency, max_threads=self.max_threads)
+
+    async def run_sync(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args))
+
+    # One chat turn at a time per session, so a fast "yes" cannot race the
+    # request it confirms.
+    @asynccontextmanager
+    async def _session(self, session_id):
+        if not session_id:
+            yield
+            return
+        entry = self._session_locks.setdefault(session_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                self._session_locks.pop(session_id, None)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+        subscription = self.subscriptions.get((scope['method'], scope['path']))
+        if subscription is not None:
+            self._count('subscribers')
+            try:
+                await subscription(scope, receive, send)
+            finally:
+                self._count('subscribers', -1)
+            return
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._count('rejected')
+            await self.send_json(send, 503, {'error': 'Server busy, please retry shortly'}, [(b'retry-after', b'1')])
+            return
+        self._count('in_flight')
+        try:
+            body = await self.read_body(receive)
+            handler = self.routes.get((scope['method'], scope['path']))
+            stream = self.streams.get((scope['method'], scope['path']))
+            if stream is not None:
+                await stream(scope, body, send)
+            elif handler is not None:
+                status, payload = await handler(scope, body)
+                await self.send_json(send, status, payload)
+            else:
+                status, headers, content = await self.run_sync(self.call_wsgi, scope, body)
+                await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+                await send({'type': 'http.response.body', 'body': content})
+        finally:
+            self._count('in_flight', -1)
+            self._count('completed')
+            self._slots.release()
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                # Let in-flight tool calls finish before closing connections.
+                await asyncio.get_running_loop().run_in_executor(None, self.executor.shutdown, True)
+                pool.close_all()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def read_body(self, receive):
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body'):
+                return b''.join(chunks)
+
+    async def send_json(self, send, status, payload, extra_headers=()):
+        body = json.dumps(payload).encode('utf-8')
+        headers = [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+        if config.CORS_ENABLED:
+            headers.append((b'access-control-allow-origin', b'*'))
+        headers.extend(extra_headers)
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def chat(self, scope, body):
+        try:
+            data = json.loads(body or b'{}')
+        except ValueError:
+            return 400, {'response': 'Request body must be JSON', 'error': True}
+        if not isinstance(data, dict):
+            return 400, {'response': 'Request body must be a JSON object', 'error': True}
+        async with self._session(data.get('sessionId') or data.get('session_id')):
+            payload, status = await self.run_sync(handle_chat, data)
+        return status, payload
+
+    # The sync generator runs start to finish on one executor thread (it holds
+    # a pooled connection between chunks); chunks cross over through a queue.
+    async def chat_stream(self, scope, body, send):
+        try:
+            data = json.loads(body or b'{}')
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            await self.send_json(send, 400, {'response': 'Request body must be a JSON object', 'error': True})
+            return
+        headers = [(b'content-type', b'text/event-stream'), (b'cache-control', b'no-cache'), (b'x-accel-buffering', b'no')]
+        if config.CORS_ENABLED:
+            headers.append((b'access-control-allow-origin', b'*'))
+
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        cancelled = threading.Event()
+
+        def produce():
+            events = stream_chat(data)
+            try:
+                for event in events:
+                    if cancelled.is_set():
+                        break
+                    loop.call_soon_threadsafe(queue.put_nowait, event.encode('utf-8'))
+            finally:
+                events.close()
+                loop.call_soon_threadsafe(queue.put_nowait, None)
+
+        async with self._session(data.get('sessionId') or data.get('session_id')):
+            await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+            producer = loop.run_in_executor(self.executor, produce)
+            try:
+                while True:
+                    chunk = await queue.get()
+                    if chunk is None:
+                        break
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                await send({'type': 'http.response.body', 'body': b''})
+            finally:
+                cancelled.set()
+                await producer
+
+    # /api/changes/stream without the Flask generator: waiting for the log
+    # head is a future resolved by the feed's poller, and only reading a
+    # delta borrows an executor thread.
+    async def change_stream(self, scope, receive, send):
+        await self.read_body(receive)
+        request_headers = dict(scope.get('headers', []))
+        since = request_headers.get(b'last-event-id', b'').decode('latin-1')
+        if not since:
+            since = parse_qs(scope.get('query_string', b'').decode('latin-1')).get('since', [''])[0]
+        try:
+            cursor = change_cursor(since) if since else await self.run_sync(latest_seq)
+        except ValueError as e:
+            await self.send_json(send, 400, {'error': str(e)})
+            return
+        headers = [(b'content-type', b'text/event-stream'), (b'cache-control', b'no-cache'), (b'x-accel-buffering', b'no')]
+        if config.CORS_ENABLED:
+            headers.append((b'access-control-allow-origin', b'*'))
+
+        # With the request read, the only message left is http.disconnect.
+        disconnected = asyncio.ensure_future(receive())
+        deadline = time.monotonic() + config.CHANGE_STREAM_MAX_SECONDS
+        try:
+            await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+            await send({'type': 'http.response.body', 'body': sse_event('ready', {'cursor': cursor}, cursor).encode('utf-8'),
+                        'more_body': True})
+            while time.monotonic() < deadline and not disconnected.done():
+                waiting = asyncio.ensure_future(change_feed.wait_async(cursor, config.CHANGE_STREAM_HEARTBEAT_SECONDS))
+                await asyncio.wait((waiting, disconnected), return_when=asyncio.FIRST_COMPLETED)
+                if disconnected.done():
+                    waiting.cancel()
+                    break
+                latest = waiting.result()
+                if latest is None or latest == cursor:
+                    chunk = ": keepalive\n\n"
+                else:
+                    cursor, events = await self.run_sync(change_events, cursor)
+                    chunk = ''.join(events)
+                await send({'type': 'http.response.body', 'body': chunk.encode('utf-8'), 'more_body': True})
+            if not disconnected.done():
+                await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnected.cancel()
+
+    async def health(self, scope, body):
+        return 200, {'status': config.HEALTH_STATUS, 'mode': config.MODE, 'server': 'asgi', 'concurrency': self.stats()}
+
+    # Everything without a native async handler is served by the Flask app on
+    # the same bounded executor.
+    def call_wsgi(self, scope, body):
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+            'REMOTE_ADDR': client[0],
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope.get('headers', []):
+            key = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if key in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                environ[key] = value
+            else:
+                key = 'HTTP_' + key
+                environ[key] = environ[key] + ',' + value if key in environ else value
+
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            content = b''.join(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return response['status'], response['headers'], content
+
+
+app = AsgiApp(
+    flask_app,
+    max_threads=config.ASGI_WORKER_THREADS,
+    max_concurrency=config.ASGI_MAX_CONCURRENCY,
+    queue_timeout=config.ASGI_QUEUE_TIMEOUT,
+)
+
+if __name__ == '__main__':
+    try:
+        import uvicorn
+    except ImportError:
+        print("uvicorn is required for the ASGI server: pip install uvicorn")
+        sys.exit(1)
+    from tools import init_database
+    print("Initializing database (migrations will run automatically)...")
+    init_database()
+
+    for msg in config.STARTUP_MESSAGES:
+        print(msg)
+    print(f"[OK] ASGI mode: {config.ASGI_WORKER_THREADS} worker threads, {config.ASGI_MAX_CONCURRENCY} concurrent requests")
+
+    uvicorn.run(app, host=config.FLASK_HOST, port=config.FLASK_PORT, lifespan='on')
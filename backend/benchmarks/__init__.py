@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+# Benchmarks never touch the real database unless MOVI_DB_PATH says so.
+os.environ.setdefault('MOVI_DB_PATH', os.path.join(tempfile.gettempdir(), 'movi_bench.db'))
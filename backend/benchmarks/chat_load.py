@@ -0,0 +1,88 @@
+import asyncio
+import json
+import sys
+import time
+
+import benchmarks  # noqa: F401  (sets up sys.path / MOVI_DB_PATH)
+from tools import init_database
+
+# Read-only turns, so every session sees the same data however they interleave.
+TURNS = [
+    "Show all vehicles",
+    "What's the status of the 'South Bangalore - Morning 08:00' trip?",
+    "show available drivers",
+    "display deployments",
+]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+async def post_json(app, path, payload):
+    body = json.dumps(payload).encode('utf-8')
+    scope = {
+        'type': 'http', 'method': 'POST', 'path': path, 'root_path': '', 'query_string': b'',
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())],
+        'http_version': '1.1', 'scheme': 'http', 'server': ('bench', 80), 'client': ('127.0.0.1', 0),
+    }
+    delivered = False
+
+    async def receive():
+        nonlocal delivered
+        if not delivered:
+            delivered = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        await asyncio.Event().wait()
+
+    status = {}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status['code'] = message['status']
+
+    await app(scope, receive, send)
+    return status['code']
+
+
+async def session(app, session_id, turns, latencies, statuses):
+    for message in turns:
+        started = time.perf_counter()
+        code = await post_json(app, '/chat', {'message': message, 'sessionId': session_id})
+        latencies.append((time.perf_counter() - started) * 1000)
+        statuses[code] = statuses.get(code, 0) + 1
+
+
+async def drive(app, sessions, turns):
+    latencies = []
+    statuses = {}
+    started = time.perf_counter()
+    await asyncio.gather(*(session(app, f'load-{i}', turns, latencies, statuses) for i in range(sessions)))
+    return latencies, statuses, time.perf_counter() - started
+
+
+def run(sessions=500, turns=TURNS):
+    init_database()
+    from asgi import app
+
+    latencies, statuses, elapsed = asyncio.run(drive(app, sessions, turns))
+    return {
+        'benchmark': 'asgi_chat_load',
+        'sessions': sessions,
+        'requests': len(latencies),
+        'statuses': {str(code): count for code, count in sorted(statuses.items())},
+        'worker_threads': app.max_threads,
+        'max_concurrency': app.max_concurrency,
+        'elapsed_seconds': round(elapsed, 3),
+        'requests_per_sec': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+        'max_ms': round(max(latencies), 2),
+    }
+
+
+if __name__ == '__main__':
+    sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    print(json.dumps(run(sessions), indent=2))
@@ -0,0 +1,198 @@
+import argparse
+import json
+import platform
+import sqlite3
+import statistics
+import time
+
+import benchmarks  # noqa: F401  (sets up sys.path / MOVI_DB_PATH)
+from benchmarks.synthetic import SCALES, populate
+
+INTENT_MESSAGES = [
+    "Show all vehicles",
+    "list drivers",
+    "List all trips for today",
+    "show me the routes using path '{path}'",
+    "List all stops for path '{path}'",
+    "Show stops on route '{route}'",
+    "What's the status of the '{trip}' trip?",
+    "Remove the vehicle from '{trip}'",
+    "Assign vehicle '{plate}' and driver '{driver}' to trip '{trip}'",
+    "Create a new stop called 'Odeon Circle'",
+    "add driver named Ravi Rao",
+    "which vehicles are unassigned?",
+    "show available drivers",
+    "display deployments",
+    "hello there",
+]
+
+# Read-only turns, so repeated runs see the same data.
+AGENT_TURNS = [
+    "What's the status of the '{trip}' trip?",
+    "Show stops on route '{route}'",
+    "show me the routes using path '{path}'",
+    "which vehicles are unassigned?",
+    "hello there",
+]
+
+API_ENDPOINTS = [
+    '/api/vehicles', '/api/drivers', '/api/trips', '/api/stops', '/api/paths', '/api/routes',
+    '/api/deployments', '/api/deployments/conflicts', '/api/trips?limit=100', '/api/search?q={search}',
+]
+
+
+def measure(func, repeat=5, number=1):
+    func()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - started) * 1000 / number)
+    samples.sort()
+    return {
+        'repeat': repeat,
+        'number': number,
+        'min_ms': round(samples[0], 4),
+        'median_ms': round(statistics.median(samples), 4),
+        'max_ms': round(samples[-1], 4),
+    }
+
+
+def _names():
+    from db import pool
+    with pool.acquire() as conn:
+        trip = conn.execute('''SELECT dt.display_name FROM deployments d
+            JOIN daily_trips dt ON d.trip_id = dt.id ORDER BY d.id LIMIT 1''').fetchone()
+        return {
+            'trip': trip[0] if trip else '',
+            'route': conn.execute('SELECT route_display_name FROM routes ORDER BY id LIMIT 1').fetchone()[0],
+            'path': conn.execute('SELECT name FROM paths ORDER BY id LIMIT 1').fetchone()[0],
+            'plate': conn.execute('SELECT license_plate FROM vehicles ORDER BY id DESC LIMIT 1').fetchone()[0],
+            'driver': conn.execute('SELECT name FROM drivers ORDER BY id DESC LIMIT 1').fetchone()[0],
+            'search': 'Koramangala',
+        }
+
+
+def bench_intent(names, repeat):
+    from intent import (
+        detect_action_intent, extract_driver_name, extract_license_plate, extract_path_name,
+        extract_quoted_string, extract_route_name, extract_stops_list, extract_trip_identifier,
+    )
+    messages = [message.format(**names) for message in INTENT_MESSAGES]
+    helpers = {
+        'detect_action_intent': detect_action_intent,
+        'extract_quoted_string': extract_quoted_string,
+        'extract_license_plate': extract_license_plate,
+        'extract_driver_name': extract_driver_name,
+        'extract_trip_identifier': extract_trip_identifier,
+        'extract_path_name': extract_path_name,
+        'extract_stops_list': extract_stops_list,
+        'extract_route_name': extract_route_name,
+    }
+    results = {}
+    for name, helper in helpers.items():
+        stats = measure(lambda: [helper(message) for message in messages], repeat, number=20)
+        stats['us_per_message'] = round(stats['median_ms'] * 1000 / len(messages), 3)
+        results[name] = stats
+    return results
+
+
+def bench_joins(repeat):
+    from tools import get_deployments_detailed, get_paths_with_stops, get_routes_with_paths, get_trips_with_routes
+    results = {}
+    for func in (get_paths_with_stops, get_routes_with_paths, get_trips_with_routes, get_deployments_detailed):
+        rows = len(func())
+        results[func.__name__] = dict(measure(func, repeat), rows=rows)
+    return results
+
+
+def bench_api(names, repeat):
+    from api_cache import response_cache
+    from app import app
+    client = app.test_client()
+    results = {}
+    for template in API_ENDPOINTS:
+        url = template.format(**names)
+
+        def cold():
+            response_cache.clear()
+            return client.get(url)
+
+        response = cold()
+        results[url] = {
+            'status': response.status_code,
+            'bytes': len(response.data),
+            'cold': measure(cold, repeat),
+            'cached': measure(lambda: client.get(url), repeat),
+        }
+    return results
+
+
+def bench_agent(names, repeat):
+    from agent import agent
+    results = {}
+    for template in AGENT_TURNS:
+        message = template.format(**names)
+
+        def turn():
+            state = {
+                'messages': [{'role': 'user', 'content': message}], 'context': '',
+                'pending_action': None, 'action_params': None, 'needs_confirmation': False,
+                'image_data': None, 'confirmation_message': None, 'awaiting_confirmation': False,
+                'confirmation_override': False, 'stream': False, 'stream_action': None,
+            }
+            return agent.invoke(state, config={'recursion_limit': 5, 'configurable': {'thread_id': 'bench'}})
+
+        reply = turn()['messages'][-1].get('content', '')
+        results[template] = dict(measure(turn, repeat), reply_bytes=len(reply.encode('utf-8')))
+    return results
+
+
+SUITES = ('intent', 'joins', 'api', 'agent')
+
+
+def run(scale='small', seed=42, repeat=5, suites=SUITES, **overrides):
+    started = time.perf_counter()
+    rows = populate(scale, seed, **overrides)
+    generated = time.perf_counter() - started
+    names = _names()
+    results = {}
+    if 'intent' in suites:
+        results['intent'] = bench_intent(names, repeat)
+    if 'joins' in suites:
+        results['joins'] = bench_joins(repeat)
+    if 'api' in suites:
+        results['api'] = bench_api(names, repeat)
+    if 'agent' in suites:
+        results['agent'] = bench_agent(names, repeat)
+    return {
+        'benchmark': 'hot_paths',
+        'scale': scale,
+        'seed': seed,
+        'repeat': repeat,
+        'rows': rows,
+        'generate_seconds': round(generated, 3),
+        'environment': {
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark backend hot paths on synthetic data.')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--suite', action='append', choices=SUITES, help='Run only these suites (repeatable).')
+    parser.add_argument('--output', help='Write the JSON report here as well as to stdout.')
+    args = parser.parse_args()
+    report = run(args.scale, args.seed, args.repeat, tuple(args.suite or SUITES))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as handle:
+            handle.write(text + '\n')
+    print(text)
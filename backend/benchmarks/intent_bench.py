@@ -0,0 +1,149 @@
+import json
+import re
+import sys
+import time
+
+import benchmarks  # noqa: F401  (sets up sys.path / MOVI_DB_PATH)
+from intent import (
+    classify_intent, extract_driver_name, extract_license_plate, extract_path_name,
+    extract_quoted_string, extract_route_name, extract_trip_identifier, get_sample_vehicle_config,
+)
+from tools import init_database
+
+MESSAGES = [
+    "Show all vehicles",
+    "list drivers",
+    "List all trips for today",
+    "show me the routes using path 'South Bangalore - MG Road to BTM Layout'",
+    "List all stops for path 'Central Bangalore - Indiranagar to Koramangala'",
+    "Show stops on route 'South Bangalore - Morning 08:00'",
+    "What's the status of the 'South Bangalore - Morning 08:00' trip?",
+    "Remove the vehicle from 'South Bangalore - Evening 18:00'",
+    "Assign vehicle 'KA-01-IJ-7890' and driver 'Deepak Verma' to trip 'Central Bangalore - Evening 17:00'",
+    "Create a new stop called 'Odeon Circle'",
+    "add driver named Ravi Rao",
+    "which vehicles are unassigned?",
+    "show available drivers",
+    "display deployments",
+    "hello there",
+]
+
+
+# The pre-rule-table cascade, kept verbatim as the benchmark baseline.
+def legacy_detect_action_intent(text: str) -> tuple:
+    text_lower = text.lower()
+
+    action_verbs = r'\b(show|list|display|get|check|find|remove|delete|unassign|assign|allocate|add|create|update)\b'
+    action_match = re.search(action_verbs, text_lower)
+    action_verb = action_match.group(1) if action_match else 'show'
+
+    entity_patterns = [
+        (r'vehicle[s]?', 'vehicles'),
+        (r'driver[s]?', 'drivers'),
+        (r'trip[s]?', 'trips'),
+        (r'route[s]?', 'routes'),
+        (r'path[s]?', 'paths'),
+        (r'stop[s]?', 'stops'),
+        (r'deployment[s]?|assignment[s]?', 'deployments'),
+    ]
+
+    detected_entity = None
+    for pattern, entity_type in entity_patterns:
+        if re.search(pattern, text_lower):
+            detected_entity = entity_type
+            break
+
+    if action_verb in ['remove', 'delete', 'unassign']:
+        if 'vehicle' in text_lower:
+            trip_name = extract_trip_identifier(text)
+            if trip_name:
+                return ('remove_vehicle_from_trip_by_name', {'trip_name': trip_name})
+
+    if action_verb in ['assign', 'allocate']:
+        if ('vehicle' in text_lower or 'driver' in text_lower) and 'trip' in text_lower:
+            vehicle = extract_license_plate(text)
+            driver = extract_driver_name(text)
+            trip = extract_trip_identifier(text)
+            if vehicle or driver or trip:
+                return ('assign_vehicle_driver', {'vehicle': vehicle, 'driver': driver, 'trip': trip})
+
+    if action_verb in ['create', 'add']:
+        if 'stop' in text_lower:
+            stop_name = extract_quoted_string(text, ["called", "named", "stop"])
+            return ('create_stop', {"name": stop_name or "New Stop", "lat": 0.0, "lng": 0.0})
+        elif 'path' in text_lower:
+            path_name = extract_quoted_string(text, ["called", "named", "path"])
+            return ('create_path', {"name": path_name or "New Path"})
+        elif 'vehicle' in text_lower:
+            license_plate = extract_license_plate(text)
+            vehicle_config = get_sample_vehicle_config()
+            return ('create_vehicle', {"license_plate": license_plate or "XX-XX-XXXX", "capacity": vehicle_config['capacity'], "model": vehicle_config['model']})
+        elif 'driver' in text_lower:
+            driver_name = extract_driver_name(text)
+            return ('create_driver', {"name": driver_name or "New Driver", "license": "DL0000000", "phone": "9000000000"})
+
+    if 'unassigned' in text_lower or 'available' in text_lower or 'free' in text_lower:
+        if 'vehicle' in text_lower:
+            return ('get_unassigned_vehicles', {})
+        elif 'driver' in text_lower:
+            return ('get_unassigned_drivers', {})
+
+    if action_verb in ['list', 'show', 'display', 'get']:
+        if detected_entity == 'vehicles':
+            return ('list_all_vehicles', {})
+        elif detected_entity == 'drivers':
+            return ('list_all_drivers', {})
+        elif detected_entity == 'trips':
+            return ('list_all_trips', {})
+        elif detected_entity == 'stops':
+            return ('list_all_stops', {})
+        elif detected_entity == 'routes':
+            if 'path' in text_lower:
+                path_name = extract_path_name(text)
+                if path_name:
+                    return ('list_routes_using_path', {'path_name': path_name})
+            return ('list_all_routes', {})
+        elif detected_entity == 'paths':
+            return ('list_all_paths', {})
+        elif detected_entity == 'deployments':
+            return ('list_all_deployments', {})
+
+    return (None, {})
+
+
+def measure(func, messages, seconds):
+    count = 0
+    deadline = time.perf_counter() + seconds
+    start = time.perf_counter()
+    while time.perf_counter() < deadline:
+        for message in messages:
+            func(message)
+        count += len(messages)
+    return count / (time.perf_counter() - start)
+
+
+def run(seconds=1.0):
+    init_database()
+    # Messages the old cascade mis-routed (stops for a path/route, trip
+    # status) now do slot extraction, so they are reported separately.
+    same = []
+    for message in MESSAGES:
+        intent = classify_intent(message)
+        if legacy_detect_action_intent(message) == (intent.action, intent.params):
+            same.append(message)
+    results = {'benchmark': 'detect_action_intent', 'seconds': seconds}
+    for label, messages in (('all', MESSAGES), ('same_outcome', same)):
+        legacy = measure(legacy_detect_action_intent, messages, seconds)
+        compiled = measure(classify_intent, messages, seconds)
+        results[label] = {
+            'messages': len(messages),
+            'legacy_msgs_per_sec': round(legacy, 1),
+            'compiled_msgs_per_sec': round(compiled, 1),
+            'speedup': round(compiled / legacy, 2) if legacy else None,
+        }
+    return results
+
+
+if __name__ == '__main__':
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+    print(json.dumps(run(seconds), indent=2))
@@ -0,0 +1,91 @@
+import json
+import sys
+
+import benchmarks  # noqa: F401  (sets up sys.path / MOVI_DB_PATH)
+from benchmarks.hot_paths import measure
+from benchmarks.synthetic import populate
+from db import pool
+from tools import get_paths_with_stops
+
+PATH_COUNTS = (1250, 2500, 5000, 10000)
+STOPS_PER_PATH = 50
+
+
+# The row-at-a-time version with the per-row any() dedup, kept verbatim as the
+# benchmark baseline.
+def legacy_get_paths_with_stops():
+    with pool.acquire() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT p.id as path_id, p.name as path_name, s.id as stop_id, s.name as stop_name, s.latitude, s.longitude, ps.order_index
+            FROM paths p
+            LEFT JOIN path_stops ps ON ps.path_id = p.id
+            LEFT JOIN stops s ON s.id = ps.stop_id
+            ORDER BY p.id, ps.order_index
+        ''')
+        rows = cursor.fetchall()
+    paths = {}
+    for row in rows:
+        path_id = row['path_id']
+        if path_id not in paths:
+            paths[path_id] = {
+                'id': path_id,
+                'name': row['path_name'],
+                'stops': []
+            }
+        if row['stop_id'] is not None:
+            stop_data = {
+                'id': row['stop_id'],
+                'name': row['stop_name'],
+                'latitude': row['latitude'],
+                'longitude': row['longitude'],
+                'order': row['order_index']
+            }
+            if not any(s['id'] == row['stop_id'] for s in paths[path_id]['stops']):
+                paths[path_id]['stops'].append(stop_data)
+    for path in paths.values():
+        path['stops'].sort(key=lambda item: item['order'] if item['order'] is not None else 0)
+    return list(paths.values())
+
+
+# The legacy shape, for comparison: drops the geometry figures the listing adds.
+def without_geometry(paths):
+    return [
+        {'id': path['id'], 'name': path['name'], 'stops': [
+            {key: stop[key] for key in ('id', 'name', 'latitude', 'longitude', 'order')} for stop in path['stops']
+        ]}
+        for path in paths
+    ]
+
+
+def run(path_counts=PATH_COUNTS, stops_per_path=STOPS_PER_PATH, repeat=3, seed=42):
+    results = []
+    for paths in path_counts:
+        populate('tiny', seed, stops=max(stops_per_path * 4, paths * 2), paths=paths, stops_per_path=stops_per_path,
+                 routes_per_path=1, dates=1, vehicles=10, drivers=10)
+        rows = paths * stops_per_path
+        entry = {'paths': paths, 'stops_per_path': stops_per_path, 'path_stops': rows}
+        if legacy_get_paths_with_stops() != without_geometry(get_paths_with_stops()):
+            raise AssertionError(f'results differ at {paths} paths')
+        for label, func in (('legacy', legacy_get_paths_with_stops), ('set_based', get_paths_with_stops)):
+            stats = measure(func, repeat)
+            stats['us_per_path_stop'] = round(stats['median_ms'] * 1000 / rows, 3)
+            entry[label] = stats
+        results.append(entry)
+    # Linear scaling keeps the per-row cost flat as the dataset grows.
+    first, last = results[0], results[-1]
+    return {
+        'benchmark': 'path_scaling',
+        'seed': seed,
+        'repeat': repeat,
+        'sizes': results,
+        'per_row_growth': {
+            label: round(last[label]['us_per_path_stop'] / first[label]['us_per_path_stop'], 2)
+            for label in ('legacy', 'set_based')
+        },
+    }
+
+
+if __name__ == '__main__':
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    print(json.dumps(run(repeat=repeat), indent=2))
@@ -0,0 +1,151 @@
+import datetime
+import json
+import random
+import sys
+
+import benchmarks  # noqa: F401  (sets up sys.path / MOVI_DB_PATH)
+from db import TABLES, bump_tables, pool
+from migrations import run_migrations
+
+AREAS = [
+    'MG Road', 'BTM Layout', 'Indiranagar', 'Koramangala', 'Whitefield', 'Electronic City',
+    'Hebbal', 'Jayanagar', 'Marathahalli', 'Yelahanka', 'Banashankari', 'Malleshwaram',
+    'HSR Layout', 'Bellandur', 'Rajajinagar', 'Basavanagudi', 'Domlur', 'Ulsoor',
+]
+REGIONS = ['North', 'South', 'East', 'West', 'Central']
+LANDMARKS = ['Station', 'Junction', 'Terminal', 'Center', 'Circle', 'Gate', 'Cross', 'Market']
+FIRST_NAMES = [
+    'Amit', 'Rajesh', 'Priya', 'Suresh', 'Deepak', 'Anita', 'Vikram', 'Kavya', 'Ravi', 'Meera',
+    'Arjun', 'Sneha', 'Kiran', 'Pooja', 'Manoj', 'Divya', 'Rahul', 'Lakshmi', 'Sanjay', 'Nisha',
+]
+LAST_NAMES = ['Kumar', 'Singh', 'Sharma', 'Patel', 'Verma', 'Rao', 'Reddy', 'Iyer', 'Nair', 'Gupta']
+VEHICLE_MODELS = [
+    ('Bus', 52, 'Volvo AC Bus'), ('Bus', 45, 'Tata Bus'), ('Bus', 50, 'Ashok Leyland'),
+    ('Cab', 4, 'Swift Sedan'), ('Cab', 6, 'Toyota Innova'), ('Tempo', 12, 'Force Traveller'),
+]
+SHIFTS = ['06:00', '07:00', '08:00', '09:00', '10:00', '16:00', '17:00', '18:00', '19:00', '21:00']
+
+# Named sizes; every count can also be overridden on the command line.
+SCALES = {
+    'tiny': dict(stops=50, paths=10, stops_per_path=5, routes_per_path=2, dates=3, vehicles=20, drivers=20),
+    'small': dict(stops=500, paths=100, stops_per_path=8, routes_per_path=4, dates=7, vehicles=200, drivers=200),
+    'medium': dict(stops=5000, paths=1000, stops_per_path=10, routes_per_path=4, dates=30, vehicles=2000, drivers=2000),
+    'large': dict(stops=20000, paths=5000, stops_per_path=12, routes_per_path=6, dates=30, vehicles=10000, drivers=10000),
+}
+
+
+def _wipe(conn):
+    for table in reversed(TABLES):
+        conn.execute(f'DELETE FROM {table}')
+    conn.execute("DELETE FROM sqlite_sequence WHERE name IN ({})".format(', '.join('?' for _ in TABLES)), TABLES)
+    # The wipe itself was logged row by row; synthetic data starts a fresh feed.
+    conn.execute('DELETE FROM change_log')
+
+
+# Rows are built in Python first and written with one executemany per table,
+# so ids are sequential from 1 and every foreign key can be computed up front.
+def generate(conn, seed=42, stops=500, paths=100, stops_per_path=8, routes_per_path=4, dates=7,
+             vehicles=200, drivers=200, deployment_ratio=0.6, start_date='2025-11-15'):
+    rng = random.Random(seed)
+    stops_per_path = min(stops_per_path, stops)
+
+    stop_rows = [
+        (f'{rng.choice(AREAS)} {rng.choice(LANDMARKS)} {i}',
+         round(12.85 + rng.random() * 0.25, 6), round(77.45 + rng.random() * 0.3, 6))
+        for i in range(1, stops + 1)
+    ]
+
+    path_rows = []
+    path_stop_rows = []
+    path_ends = []
+    for path_id in range(1, paths + 1):
+        chosen = rng.sample(range(1, stops + 1), stops_per_path)
+        first, last = stop_rows[chosen[0] - 1][0], stop_rows[chosen[-1] - 1][0]
+        region = rng.choice(REGIONS)
+        path_rows.append((f'{region} Bangalore - {first} to {last} #{path_id}',))
+        path_stop_rows.extend((path_id, stop_id, order) for order, stop_id in enumerate(chosen))
+        path_ends.append((region, first, last))
+
+    route_rows = []
+    for path_id, (region, first, last) in enumerate(path_ends, 1):
+        for shift in sorted(rng.sample(SHIFTS, min(routes_per_path, len(SHIFTS)))):
+            period = 'Morning' if shift < '12:00' else 'Evening'
+            name = f'{region} Bangalore - {period} {shift} #{len(route_rows) + 1}'
+            route_rows.append((path_id, name, shift, region, first, last, 'active'))
+
+    day = datetime.date.fromisoformat(start_date)
+    trip_rows = []
+    for offset in range(dates):
+        date = (day + datetime.timedelta(days=offset)).isoformat()
+        for route_id, route in enumerate(route_rows, 1):
+            status = rng.choice(['Scheduled', 'Scheduled', 'Scheduled', 'In Progress', 'Completed'])
+            trip_rows.append((route_id, route[1], round(rng.random(), 2), status, date))
+
+    vehicle_rows = []
+    for i in range(1, vehicles + 1):
+        vtype, capacity, model = rng.choice(VEHICLE_MODELS)
+        vehicle_rows.append((f'KA-{i // 10000:02d}-{chr(65 + i // 260 % 26)}{chr(65 + i // 10 % 26)}-{i % 10000:04d}', vtype, capacity, model))
+
+    driver_rows = [
+        (f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}', f'DL{100000 + i}', f'9{800000000 + i:09d}')
+        for i in range(1, drivers + 1)
+    ]
+
+    # Each (date, shift) slot draws vehicles and drivers without replacement,
+    # so the synthetic deployments never double-book anyone.
+    deployment_rows = []
+    slots = {}
+    for trip_id, trip in enumerate(trip_rows, 1):
+        if rng.random() >= deployment_ratio:
+            continue
+        key = (trip[4], route_rows[trip[0] - 1][2])
+        free = slots.get(key)
+        if free is None:
+            free = slots[key] = (rng.sample(range(1, vehicles + 1), vehicles), rng.sample(range(1, drivers + 1), drivers))
+        if free[0] and free[1]:
+            deployment_rows.append((trip_id, free[0].pop(), free[1].pop()))
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        _wipe(conn)
+        conn.executemany('INSERT INTO stops (name, latitude, longitude) VALUES (?, ?, ?)', stop_rows)
+        conn.executemany('INSERT INTO paths (name) VALUES (?)', path_rows)
+        conn.executemany('INSERT INTO path_stops (path_id, stop_id, order_index) VALUES (?, ?, ?)', path_stop_rows)
+        conn.executemany('''INSERT INTO routes (path_id, route_display_name, shift_time, direction, start_point, end_point, status)
+            VALUES (?, ?, ?, ?, ?, ?, ?)''', route_rows)
+        conn.executemany('''INSERT INTO daily_trips (route_id, display_name, booking_status_percentage, live_status, date)
+            VALUES (?, ?, ?, ?, ?)''', trip_rows)
+        conn.executemany('INSERT INTO vehicles (license_plate, type, capacity, model) VALUES (?, ?, ?, ?)', vehicle_rows)
+        conn.executemany('INSERT INTO drivers (name, license_number, phone) VALUES (?, ?, ?)', driver_rows)
+        conn.executemany('INSERT INTO deployments (trip_id, vehicle_id, driver_id) VALUES (?, ?, ?)', deployment_rows)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    conn.execute('ANALYZE')
+    bump_tables()
+    return {
+        'stops': len(stop_rows),
+        'paths': len(path_rows),
+        'path_stops': len(path_stop_rows),
+        'routes': len(route_rows),
+        'daily_trips': len(trip_rows),
+        'vehicles': len(vehicle_rows),
+        'drivers': len(driver_rows),
+        'deployments': len(deployment_rows),
+    }
+
+
+# Replaces every row in the configured database (a temp file unless
+# MOVI_DB_PATH is set) with a deterministic synthetic dataset.
+def populate(scale='small', seed=42, **overrides):
+    options = dict(SCALES[scale], **overrides)
+    with pool.acquire() as conn:
+        run_migrations(conn)
+        return generate(conn, seed=seed, **options)
+
+
+if __name__ == '__main__':
+    scale = sys.argv[1] if len(sys.argv) > 1 else 'small'
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 42
+    print(json.dumps({'scale': scale, 'seed': seed, 'rows': populate(scale, seed)}, indent=2))
@@ -0,0 +1,158 @@
+import asyncio
+import threading
+import time
+from collections import defaultdict
+
+from config import config
+from db import pool
+from listing import rows_by_id
+
+# (collection, table, key) -> each row change in `table` is logged as a
+# change to the /api/<collection> row whose id is the row's `key`. Trips and
+# deployments are logged off the materialized views, so a renamed route or
+# vehicle shows up as changes to every trip and deployment that displays it.
+# The logging triggers come from migration 10.
+CHANGE_SOURCES = (
+    ('vehicles', 'vehicles', 'id'),
+    ('drivers', 'drivers', 'id'),
+    ('stops', 'stops', 'id'),
+    ('paths', 'paths', 'id'),
+    ('paths', 'path_stops', 'path_id'),
+    ('routes', 'routes', 'id'),
+    ('trips', 'trip_view', 'id'),
+    ('deployments', 'deployment_view', 'id'),
+)
+COLLECTIONS = tuple(dict.fromkeys(collection for collection, _, _ in CHANGE_SOURCES))
+
+
+def latest_seq(conn=None):
+    if conn is None:
+        with pool.acquire() as conn:
+            return latest_seq(conn)
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+    return row[0] if row else 0
+
+
+# Keeps the newest CHANGE_LOG_MAX_ROWS entries; clients further behind than
+# that get reset=True and reload in full.
+def prune(conn=None):
+    if conn is None:
+        with pool.acquire() as conn:
+            return prune(conn)
+    deleted = conn.execute('DELETE FROM change_log WHERE seq <= ?', (latest_seq(conn) - config.CHANGE_LOG_MAX_ROWS,)).rowcount
+    conn.commit()
+    return deleted
+
+
+_last_prune = time.monotonic()
+
+
+def maybe_prune():
+    global _last_prune
+    if time.monotonic() - _last_prune > config.CHANGE_LOG_PRUNE_SECONDS:
+        _last_prune = time.monotonic()
+        prune()
+
+
+# Changes after `since`, collapsed to the current state of each touched row:
+# {collection: {'upserted': [rows], 'deleted': [ids]}}. Rows are read now, so
+# they may already include later changes; applying them again is harmless.
+def changes_since(since, limit=None):
+    limit = limit or config.CHANGE_FEED_PAGE_SIZE
+    with pool.acquire() as conn:
+        latest = latest_seq(conn)
+        oldest = conn.execute('SELECT MIN(seq) FROM change_log').fetchone()[0]
+        if since > latest or (oldest is not None and since < oldest - 1) or (oldest is None and since < latest):
+            return {'since': since, 'cursor': latest, 'reset': True, 'more': False, 'changes': {}}
+        rows = conn.execute('SELECT seq, collection, row_id FROM change_log WHERE seq > ? ORDER BY seq LIMIT ?',
+                            (since, limit + 1)).fetchall()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    touched = defaultdict(dict)
+    for _, collection, row_id in rows:
+        if row_id is not None:
+            touched[collection][row_id] = None
+    changes = {}
+    for collection, ids in touched.items():
+        upserted = rows_by_id(collection, ids)
+        present = {item['id'] for item in upserted}
+        changes[collection] = {'upserted': upserted, 'deleted': [row_id for row_id in ids if row_id not in present]}
+    return {
+        'since': since,
+        'cursor': rows[-1][0] if rows else since,
+        'reset': False,
+        'more': more,
+        'changes': changes,
+    }
+
+
+def _resolve(future, seq):
+    if not future.done():
+        future.set_result(seq)
+
+
+# One poller thread per process watches the log head, so any number of
+# streaming clients cost one cheap query per interval. Threads block in
+# wait(); coroutines await wait_async(), which holds no thread at all.
+class ChangeFeed:
+    def __init__(self, interval):
+        self.interval = interval
+        self._condition = threading.Condition()
+        self._latest = None
+        self._thread = None
+        self._waiters = set()
+
+    def _run(self):
+        while True:
+            try:
+                seq = latest_seq()
+                maybe_prune()
+            except Exception as e:
+                print(f"Change feed poll failed: {e}")
+                seq = self._latest
+            with self._condition:
+                if seq != self._latest:
+                    self._latest = seq
+                    self._condition.notify_all()
+                    waiters, self._waiters = self._waiters, set()
+                else:
+                    waiters = ()
+            for loop, future in waiters:
+                try:
+                    loop.call_soon_threadsafe(_resolve, future, seq)
+                except RuntimeError:
+                    pass  # the subscriber's event loop has closed
+            time.sleep(self.interval)
+
+    def _start(self):
+        with self._condition:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='change-feed', daemon=True)
+                self._thread.start()
+
+    # Blocks until the log head moves past `cursor` or `timeout` passes;
+    # returns the head as last seen.
+    def wait(self, cursor, timeout):
+        self._start()
+        with self._condition:
+            self._condition.wait_for(lambda: self._latest is not None and self._latest != cursor, timeout)
+            return self._latest
+
+    async def wait_async(self, cursor, timeout):
+        self._start()
+        loop = asyncio.get_running_loop()
+        waiter = (loop, loop.create_future())
+        with self._condition:
+            if self._latest is not None and self._latest != cursor:
+                return self._latest
+            self._waiters.add(waiter)
+        try:
+            return await asyncio.wait_for(waiter[1], timeout)
+        except asyncio.TimeoutError:
+            return self._latest
+        finally:
+            with self._condition:
+                self._waiters.discard(waiter)
+
+
+change_feed = ChangeFeed(config.CHANGE_FEED_POLL_SECONDS)
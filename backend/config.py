@@ -7,6 +7,68 @@ class Config:
     FLASK_DEBUG = os.getenv('FLASK_DEBUG', 'True') == 'True'
     CORS_ENABLED = os.getenv('CORS_ENABLED', 'True') == 'True'
     
+    DB_PATH = os.getenv('MOVI_DB_PATH', os.path.join(os.path.dirname(__file__), '..', 'moveinsync.db'))
+    DB_TIMEOUT = float(os.getenv('MOVI_DB_TIMEOUT', 30.0))
+    DB_JOURNAL_MODE = os.getenv('MOVI_DB_JOURNAL_MODE', 'WAL')
+    DB_SYNCHRONOUS = os.getenv('MOVI_DB_SYNCHRONOUS', 'NORMAL')
+    DB_CACHE_SIZE_KB = int(os.getenv('MOVI_DB_CACHE_SIZE_KB', 16384))
+    DB_MMAP_SIZE = int(os.getenv('MOVI_DB_MMAP_SIZE', 268435456))
+    DB_STATEMENT_CACHE_SIZE = int(os.getenv('MOVI_DB_STATEMENT_CACHE_SIZE', 256))
+    DB_MAX_IDLE_SECONDS = float(os.getenv('MOVI_DB_MAX_IDLE_SECONDS', 300))
+    DB_MAX_LIFETIME_SECONDS = float(os.getenv('MOVI_DB_MAX_LIFETIME_SECONDS', 3600))
+    
+    API_MAX_PAGE_SIZE = int(os.getenv('MOVI_API_MAX_PAGE_SIZE', 1000))
+    # Replies of read-only agent actions kept per process; 0 disables.
+    ACTION_CACHE_SIZE = int(os.getenv('MOVI_ACTION_CACHE_SIZE', 256))
+    
+    # Several worker processes sharing one database: sessions, checkpoints and
+    # cache invalidation all go through SQLite instead of process memory.
+    SHARED_STATE = os.getenv('MOVI_SHARED_STATE', 'False') == 'True'
+    
+    SESSION_BACKEND = os.getenv('MOVI_SESSION_BACKEND', 'sqlite' if SHARED_STATE else 'memory')
+    SESSION_MAX_ENTRIES = int(os.getenv('MOVI_SESSION_MAX_ENTRIES', 10000))
+    SESSION_TTL_SECONDS = float(os.getenv('MOVI_SESSION_TTL_SECONDS', 3600))
+    SESSION_MAX_HISTORY = int(os.getenv('MOVI_SESSION_MAX_HISTORY', 50))
+    SESSION_DB_PATH = os.getenv('MOVI_SESSION_DB_PATH', os.path.join(os.path.dirname(__file__), '..', 'sessions.db'))
+    SESSION_REDIS_URL = os.getenv('MOVI_SESSION_REDIS_URL', 'redis://localhost:6379/0')
+    SESSION_LOCK_TIMEOUT = float(os.getenv('MOVI_SESSION_LOCK_TIMEOUT', 30.0))
+    AGENT_CHECKPOINTER = os.getenv('MOVI_AGENT_CHECKPOINTER', 'sqlite' if SHARED_STATE else 'none')
+    CHECKPOINT_DB_PATH = os.getenv('MOVI_CHECKPOINT_DB_PATH', os.path.join(os.path.dirname(__file__), '..', 'checkpoints.db'))
+    
+    ASGI_WORKER_THREADS = int(os.getenv('MOVI_ASGI_WORKER_THREADS', 32))
+    ASGI_MAX_CONCURRENCY = int(os.getenv('MOVI_ASGI_MAX_CONCURRENCY', 512))
+    ASGI_QUEUE_TIMEOUT = float(os.getenv('MOVI_ASGI_QUEUE_TIMEOUT', 10.0))
+    
+    METRICS_ENABLED = os.getenv('MOVI_METRICS_ENABLED', 'True') == 'True'
+    
+    # Screenshot OCR runs in a process pool (0 workers runs it inline) on a
+    # cropped grayscale copy no larger than IMAGE_OCR_MAX_SIDE pixels.
+    IMAGE_OCR_WORKERS = int(os.getenv('MOVI_IMAGE_OCR_WORKERS', 2))
+    IMAGE_OCR_TIMEOUT = float(os.getenv('MOVI_IMAGE_OCR_TIMEOUT', 10.0))
+    IMAGE_OCR_MAX_SIDE = int(os.getenv('MOVI_IMAGE_OCR_MAX_SIDE', 1600))
+    IMAGE_CACHE_SIZE = int(os.getenv('MOVI_IMAGE_CACHE_SIZE', 64))
+    
+    # Path ETAs: straight-line distance times the detour factor at the
+    # average speed, plus a dwell at every intermediate stop.
+    PATH_AVERAGE_SPEED_KMH = float(os.getenv('MOVI_PATH_AVERAGE_SPEED_KMH', 25.0))
+    PATH_DETOUR_FACTOR = float(os.getenv('MOVI_PATH_DETOUR_FACTOR', 1.3))
+    PATH_STOP_DWELL_SECONDS = float(os.getenv('MOVI_PATH_STOP_DWELL_SECONDS', 60))
+    PATH_GEOMETRY_CACHE_SIZE = int(os.getenv('MOVI_PATH_GEOMETRY_CACHE_SIZE', 10000))
+    
+    # Change feed for the dashboards: /api/changes pages through at most
+    # CHANGE_FEED_PAGE_SIZE log entries; streams poll the log head every
+    # CHANGE_FEED_POLL_SECONDS and close after CHANGE_STREAM_MAX_SECONDS so
+    # EventSource reconnects (resuming from Last-Event-ID) free their thread.
+    CHANGE_LOG_MAX_ROWS = int(os.getenv('MOVI_CHANGE_LOG_MAX_ROWS', 100000))
+    CHANGE_LOG_PRUNE_SECONDS = float(os.getenv('MOVI_CHANGE_LOG_PRUNE_SECONDS', 60))
+    CHANGE_FEED_PAGE_SIZE = int(os.getenv('MOVI_CHANGE_FEED_PAGE_SIZE', 1000))
+    CHANGE_FEED_POLL_SECONDS = float(os.getenv('MOVI_CHANGE_FEED_POLL_SECONDS', 1.0))
+    CHANGE_STREAM_HEARTBEAT_SECONDS = float(os.getenv('MOVI_CHANGE_STREAM_HEARTBEAT_SECONDS', 15))
+    CHANGE_STREAM_MAX_SECONDS = float(os.getenv('MOVI_CHANGE_STREAM_MAX_SECONDS', 300))
+    
+    OPTIMIZER_SHIFT_MINUTES = int(os.getenv('MOVI_OPTIMIZER_SHIFT_MINUTES', 120))
+    OPTIMIZER_TRIP_SEATS = int(os.getenv('MOVI_OPTIMIZER_TRIP_SEATS', 50))
+    
     API_BASE64_DELIMITER = 'base64,'
     
     DEFAULT_RESPONSE = "I'm not sure how to help with that."
@@ -26,29 +88,56 @@ class Config:
         "[OK] Database-driven (no hardcoding)",
         "\nAvailable endpoints:",
         "  POST /chat - Main Movi chat interface",
+        "  POST /chat/stream - Chat replies as Server-Sent Events",
         "  GET  /health - Health check",
+        "  GET  /sessions/metrics - Session store metrics",
+        "  GET  /metrics - Agent node and DB function timings (Prometheus)",
+        "  GET  /cache/stats - Hit/miss counts for agent reply and API response caches",
         "  GET  /api/vehicles - Get all vehicles",
         "  GET  /api/drivers - Get all drivers",
         "  GET  /api/trips - Get all trips",
         "  GET  /api/stops - Get all stops",
+        "  GET  /api/stops/nearby?lat=&lng=&radius= - Stops within a radius (metres)",
+        "  GET  /api/stops/nearest?stop=&k= - Nearest stops to a point or stop",
         "  GET  /api/paths - Get all paths",
         "  GET  /api/routes - Get all routes",
         "  GET  /api/deployments - Get all deployments",
+        "  POST /api/deployments/bulk - Assign many trips in one transaction",
+        "  GET  /api/deployments/conflicts?date= - Vehicles/drivers double-booked in overlapping shifts",
+        "  POST /api/optimizer/plan - Preview an optimal assignment of unassigned trips",
+        "  POST /api/optimizer/plan/<id>/apply - Apply a previewed plan",
+        "  GET  /api/search?q= - Ranked trip/route/vehicle/driver/path/stop lookup",
+        "  GET  /api/impact?entity=&name= - What depends on a stop/path/route/trip/vehicle/driver",
+        "  GET  /api/changes?since= - Rows changed since a change-log cursor",
+        "  GET  /api/changes/stream?since= - Change deltas pushed as Server-Sent Events",
         "=" * 60
     ]
     
     ENDPOINTS = {
         'CHAT': '/chat',
+        'CHAT_STREAM': '/chat/stream',
         'SPEECH_TO_TEXT': '/speech-to-text',
         'TEXT_TO_SPEECH': '/text-to-speech',
         'HEALTH': '/health',
+        'SESSION_METRICS': '/sessions/metrics',
+        'METRICS': '/metrics',
+        'CACHE_STATS': '/cache/stats',
         'VEHICLES': '/api/vehicles',
         'DRIVERS': '/api/drivers',
         'TRIPS': '/api/trips',
         'STOPS': '/api/stops',
+        'STOPS_NEARBY': '/api/stops/nearby',
+        'STOPS_NEAREST': '/api/stops/nearest',
         'PATHS': '/api/paths',
         'ROUTES': '/api/routes',
-        'DEPLOYMENTS': '/api/deployments'
+        'DEPLOYMENTS': '/api/deployments',
+        'DEPLOYMENTS_BULK': '/api/deployments/bulk',
+        'DEPLOYMENTS_CONFLICTS': '/api/deployments/conflicts',
+        'OPTIMIZER_PLAN': '/api/optimizer/plan',
+        'SEARCH': '/api/search',
+        'IMPACT': '/api/impact',
+        'CHANGES': '/api/changes',
+        'CHANGES_STREAM': '/api/changes/stream'
     }
 
 config = Config()
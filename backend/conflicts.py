@@ -0,0 +1,131 @@
+import heapq
+import re
+from collections import defaultdict
+
+from config import config
+from db import pool
+
+DAY_MINUTES = 24 * 60
+RESOURCES = ('vehicle', 'driver')
+
+_SHIFT = re.compile(r'(\d{1,2}):(\d\d)')
+
+
+def shift_start(shift_time):
+    match = _SHIFT.match(str(shift_time or '').strip())
+    if not match:
+        return None
+    return int(match.group(1)) * 60 + int(match.group(2))
+
+
+def parse_shift(shift_time):
+    start = shift_start(shift_time)
+    if start is None:
+        # Unknown shifts block the whole day rather than risk a double booking.
+        return 0, DAY_MINUTES
+    return start, start + config.OPTIMIZER_SHIFT_MINUTES
+
+
+# shift_start() in SQL, so triggers can keep the window table current.
+def start_sql(column):
+    value = f'trim({column})'
+    return f'''(CASE WHEN {value} GLOB '[0-9]:[0-9][0-9]*' OR {value} GLOB '[0-9][0-9]:[0-9][0-9]*'
+        THEN CAST(substr({value}, 1, instr({value}, ':') - 1) AS INTEGER) * 60
+             + CAST(substr({value}, instr({value}, ':') + 1, 2) AS INTEGER) END)'''
+
+
+# Every shift lasts OPTIMIZER_SHIFT_MINUTES, so two known windows overlap iff
+# their starts are less than one shift apart: a range seek on start_min.
+# A NULL start is an unknown shift and overlaps the whole day.
+def overlap_sql(a, b):
+    return (f'({a}.start_min IS NULL OR {b}.start_min IS NULL OR '
+            f'({a}.start_min > {b}.start_min - :shift AND {a}.start_min < {b}.start_min + :shift))')
+
+
+# overlap_sql() for two start_min values held in Python.
+def overlaps(a, b):
+    return a is None or b is None or abs(a - b) < config.OPTIMIZER_SHIFT_MINUTES
+
+
+# The deployment_windows row of a deployment; migration 8 holds the trigger
+# copy of this select.
+_WINDOW_SELECT = f'''SELECT d.id, d.trip_id, d.vehicle_id, d.driver_id, dt.date, {start_sql('r.shift_time')}
+    FROM deployments d JOIN daily_trips dt ON dt.id = d.trip_id LEFT JOIN routes r ON r.id = dt.route_id'''
+
+
+# For bulk loads that bypass the per-row triggers (see importer.py).
+def index_new_deployments(conn, table, min_id):
+    if table == 'deployments':
+        conn.execute(f'INSERT OR REPLACE INTO deployment_windows {_WINDOW_SELECT} WHERE d.id >= ?', (min_id,))
+
+
+# Deployments that would clash with putting vehicle_id and driver_id on
+# trip_id. Each probe is an index seek on (resource, date, start_min).
+def assignment_conflicts(trip_id, vehicle_id, driver_id, conn=None):
+    if conn is None:
+        with pool.acquire() as conn:
+            return assignment_conflicts(trip_id, vehicle_id, driver_id, conn)
+    row = conn.execute(f'''SELECT dt.date, {start_sql('r.shift_time')} AS start_min
+        FROM daily_trips dt LEFT JOIN routes r ON r.id = dt.route_id WHERE dt.id = ?''', (trip_id,)).fetchone()
+    if row is None:
+        return []
+    params = {'trip_id': trip_id, 'date': row[0], 'start_min': row[1], 'shift': config.OPTIMIZER_SHIFT_MINUTES}
+    conflicts = []
+    for resource, resource_id in zip(RESOURCES, (vehicle_id, driver_id)):
+        if resource_id is None:
+            continue
+        clash = conn.execute(f'''SELECT w.trip_id, dt.display_name FROM deployment_windows w
+            JOIN daily_trips dt ON dt.id = w.trip_id, (SELECT :start_min AS start_min) t
+            WHERE w.{resource}_id = :resource_id AND w.date IS :date AND w.trip_id != :trip_id
+              AND {overlap_sql('w', 't')}
+            ORDER BY w.start_min LIMIT 1''', dict(params, resource_id=resource_id)).fetchone()
+        if clash:
+            conflicts.append({'resource': resource, 'resource_id': resource_id, 'trip_id': clash[0], 'trip': clash[1]})
+    return conflicts
+
+
+def describe(conflict):
+    return f"{conflict['resource']} already deployed on trip '{conflict['trip']}' in an overlapping shift"
+
+
+# Every pair of deployments on `date` (all dates when None) that share a
+# vehicle or driver in overlapping shifts. One ordered scan, then a sweep per
+# resource with a heap of open windows, so it is O(n log n + conflicts).
+def conflicts_for_date(date=None):
+    sql = '''SELECT w.trip_id, dt.display_name, w.vehicle_id, v.license_plate, w.driver_id, dr.name, w.date, w.start_min
+        FROM deployment_windows w
+        JOIN daily_trips dt ON dt.id = w.trip_id
+        LEFT JOIN vehicles v ON v.id = w.vehicle_id
+        LEFT JOIN drivers dr ON dr.id = w.driver_id'''
+    params = ()
+    if date:
+        sql += ' WHERE w.date = ?'
+        params = (date,)
+    with pool.acquire() as conn:
+        rows = conn.execute(sql + ' ORDER BY w.date, w.start_min', params).fetchall()
+    shift = config.OPTIMIZER_SHIFT_MINUTES
+    conflicts = []
+    for resource, (id_column, label_column) in zip(RESOURCES, ((2, 3), (4, 5))):
+        windows = defaultdict(list)
+        for row in rows:
+            if row[id_column] is not None:
+                start, end = (0, DAY_MINUTES) if row[7] is None else (row[7], row[7] + shift)
+                windows[(row[6], row[id_column])].append((start, end, row))
+        for (day, resource_id), items in windows.items():
+            items.sort(key=lambda item: (item[0], item[2][0]))
+            open_windows = []
+            for start, end, row in items:
+                while open_windows and open_windows[0][0] <= start:
+                    heapq.heappop(open_windows)
+                for _, _, other in open_windows:
+                    conflicts.append({
+                        'resource': resource,
+                        'resource_id': resource_id,
+                        'label': row[label_column],
+                        'date': day,
+                        'trip_ids': [other[0], row[0]],
+                        'trips': [other[1], row[1]],
+                    })
+                heapq.heappush(open_windows, (end, row[0], row))
+    conflicts.sort(key=lambda item: (item['date'] or '', item['resource'], item['resource_id'], item['trip_ids']))
+    return conflicts
@@ -0,0 +1,154 @@
+import json
+
+from db import pool
+from search import SEARCH_SOURCES, unique_match
+
+# entity -> (table holding the rows that depend on it, referencing column).
+# dependency_counts keeps COUNT(*) of those rows per entity, maintained by
+# triggers (migration 6), so "is anything using this?" is one primary-key
+# lookup.
+DEPENDENCIES = {
+    'stop': ('path_stops', 'stop_id'),
+    'path': ('routes', 'path_id'),
+    'route': ('daily_trips', 'route_id'),
+    'trip': ('deployments', 'trip_id'),
+    'vehicle': ('deployments', 'vehicle_id'),
+    'driver': ('deployments', 'driver_id'),
+}
+
+SEARCH_KINDS = {
+    'stop': 'stops', 'path': 'paths', 'route': 'routes',
+    'trip': 'trips', 'vehicle': 'vehicles', 'driver': 'drivers',
+}
+
+EXAMPLE_LIMIT = 3
+
+_NONE = 'SELECT NULL WHERE 0'
+_ROUTES_OF_PATHS = 'SELECT id FROM routes WHERE path_id IN (SELECT id FROM p)'
+_TRIPS = 'SELECT id, booking_status_percentage, display_name FROM daily_trips WHERE '
+_DEPLOYMENTS_OF_TRIPS = 'SELECT id FROM deployments WHERE trip_id IN (SELECT id FROM t)'
+
+# entity -> seeds for the p(aths), r(outes), t(rips), d(eployments) CTEs; each
+# level defaults to everything hanging off the level above.
+TRAVERSALS = {
+    'stop': ('SELECT DISTINCT path_id FROM path_stops WHERE stop_id = :id', _ROUTES_OF_PATHS,
+             _TRIPS + 'route_id IN (SELECT id FROM r)', _DEPLOYMENTS_OF_TRIPS),
+    'path': ('SELECT :id', _ROUTES_OF_PATHS, _TRIPS + 'route_id IN (SELECT id FROM r)', _DEPLOYMENTS_OF_TRIPS),
+    'route': (_NONE, 'SELECT :id', _TRIPS + 'route_id IN (SELECT id FROM r)', _DEPLOYMENTS_OF_TRIPS),
+    'trip': (_NONE, _NONE, _TRIPS + 'id = :id', _DEPLOYMENTS_OF_TRIPS),
+    'vehicle': (_NONE, _NONE, _TRIPS + 'id IN (SELECT trip_id FROM deployments WHERE vehicle_id = :id)',
+                'SELECT id FROM deployments WHERE vehicle_id = :id'),
+    'driver': (_NONE, _NONE, _TRIPS + 'id IN (SELECT trip_id FROM deployments WHERE driver_id = :id)',
+               'SELECT id FROM deployments WHERE driver_id = :id'),
+}
+
+
+# For bulk loads that bypass the per-row triggers (see importer.py).
+def count_new_dependents(conn, table, min_id):
+    for entity, (source, column) in DEPENDENCIES.items():
+        if source == table:
+            conn.execute(f'''INSERT INTO dependency_counts (entity, entity_id, dependents)
+                SELECT '{entity}', {column}, COUNT(*) FROM {table} WHERE id >= ? AND {column} IS NOT NULL GROUP BY {column}
+                ON CONFLICT (entity, entity_id) DO UPDATE SET dependents = dependents + excluded.dependents''', (min_id,))
+
+
+def dependents(entity, entity_id, conn=None):
+    if conn is None:
+        with pool.acquire() as conn:
+            return dependents(entity, entity_id, conn)
+    row = conn.execute(
+        'SELECT dependents FROM dependency_counts WHERE entity = ? AND entity_id = ?', (entity, entity_id)
+    ).fetchone()
+    return row[0] if row else 0
+
+
+# Exact (case-insensitive) and unique names only: a deletion must never land
+# on a near-miss or on one of several rows sharing a name.
+def resolve(entity, name, date=None):
+    return unique_match(SEARCH_KINDS[entity], name, date)
+
+
+class StaleImpactError(Exception):
+    pass
+
+
+# Run inside a delete's transaction: refuses when the row previewed for
+# confirmation was renamed, removed or gained or lost dependents since.
+def assert_unchanged(conn, entity, entity_id, name, expected_dependents):
+    table, column, _ = SEARCH_SOURCES[SEARCH_KINDS[entity]]
+    row = conn.execute(f'SELECT {column} FROM {table} WHERE id = ?', (entity_id,)).fetchone()
+    if row is None or row[0] != name or dependents(entity, entity_id, conn) != expected_dependents:
+        raise StaleImpactError(f"{entity.capitalize()} '{name}' changed since it was checked. Please ask again.")
+
+
+def blast_radius(entity, entity_id, name=None):
+    if entity not in TRAVERSALS:
+        raise ValueError(f"Unknown entity '{entity}'")
+    impact = {
+        'entity': entity, 'id': entity_id, 'name': name, 'dependents': 0,
+        'paths': 0, 'routes': 0, 'trips': 0, 'booked_trips': 0, 'max_booking': 0.0,
+        'deployments': 0, 'examples': [],
+    }
+    paths, routes, trips, deployments = TRAVERSALS[entity]
+    with pool.acquire() as conn:
+        impact['dependents'] = dependents(entity, entity_id, conn)
+        # Nothing references it: no traversal needed, except that a trip's
+        # own bookings still count.
+        if not impact['dependents'] and entity != 'trip':
+            return impact
+        row = conn.execute(f'''
+            WITH p(id) AS ({paths}),
+                 r(id) AS ({routes}),
+                 t(id, booking, name) AS ({trips}),
+                 d(id) AS ({deployments})
+            SELECT (SELECT COUNT(*) FROM p), (SELECT COUNT(*) FROM r), (SELECT COUNT(*) FROM t),
+                   (SELECT COUNT(*) FROM t WHERE booking > 0), (SELECT COALESCE(MAX(booking), 0) FROM t),
+                   (SELECT COUNT(*) FROM d),
+                   (SELECT json_group_array(name) FROM (
+                        SELECT name FROM t WHERE booking > 0 ORDER BY booking DESC, id LIMIT {EXAMPLE_LIMIT}))
+        ''', {'id': entity_id}).fetchone()
+    impact.update(
+        paths=row[0], routes=row[1], trips=row[2], booked_trips=row[3],
+        max_booking=row[4], deployments=row[5], examples=_json_list(row[6]),
+    )
+    return impact
+
+
+def _json_list(value):
+    return json.loads(value) if value else []
+
+
+def _plural(count, word):
+    return f"{count} {word}{'' if count == 1 else 's'}"
+
+
+def describe(impact):
+    label = f"{impact['entity'].capitalize()} '{impact['name'] or impact['id']}'"
+    if impact['entity'] == 'trip':
+        if not impact['booked_trips'] and not impact['deployments']:
+            return f"{label} has no bookings or assignments."
+        parts = [f"is {impact['max_booking'] * 100:.0f}% booked"]
+        if impact['deployments']:
+            parts.append("has a vehicle and driver assigned")
+        return f"{label} {' and '.join(parts)}."
+    if not impact['dependents']:
+        return f"{label} is not used by any {', '.join(_dependent_words(impact['entity']))}."
+    reach = [
+        _plural(impact[key], word) for key, word in (('paths', 'path'), ('routes', 'route'), ('trips', 'trip'))
+        if impact[key] and not (impact['entity'] == 'path' and key == 'paths')
+    ]
+    text = f"{label} affects {', '.join(reach)}" if reach else f"{label} is in use"
+    if impact['booked_trips']:
+        text += f"; {_plural(impact['booked_trips'], 'trip')} already booked (up to {impact['max_booking'] * 100:.0f}%)"
+        if impact['examples']:
+            text += f", e.g. {', '.join(impact['examples'])}"
+    if impact['deployments']:
+        text += f"; {_plural(impact['deployments'], 'vehicle/driver assignment')} will be affected"
+    return text + "."
+
+
+def _dependent_words(entity):
+    return {
+        'stop': ('path',), 'path': ('route',), 'route': ('trip',),
+        'vehicle': ('deployment',), 'driver': ('deployment',),
+    }[entity]
@@ -0,0 +1,244 @@
+import sqlite3
+import threading
+import time
+
+from config import config
+from instrumentation import attach_connection
+
+
+class _Slot:
+    __slots__ = ('conn', 'thread', 'created_at', 'last_used', 'depth', 'closed')
+
+    def __init__(self, conn):
+        now = time.monotonic()
+        self.conn = conn
+        self.thread = threading.current_thread()
+        self.created_at = now
+        self.last_used = now
+        self.depth = 0
+        self.closed = False
+
+
+# Behaves like sqlite3.Connection; close() hands the connection back to the pool.
+class PooledConnection:
+    def __init__(self, pool, slot):
+        self._pool = pool
+        self._slot = slot
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._slot.conn, name)
+
+    def close(self):
+        if not self._released:
+            self._released = True
+            self._pool.release(self._slot)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and self._slot.depth == 1 and self._slot.conn.in_transaction:
+            self._slot.conn.rollback()
+        self.close()
+        return False
+
+
+class ConnectionPool:
+    def __init__(self, db_path, timeout=30.0, journal_mode='WAL', synchronous='NORMAL',
+                 cache_size_kb=16384, mmap_size=268435456, statement_cache_size=256,
+                 max_idle_seconds=300.0, max_lifetime_seconds=3600.0, health_check_seconds=5.0):
+        self.db_path = db_path
+        self.timeout = timeout
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+        self.statement_cache_size = statement_cache_size
+        self.max_idle_seconds = max_idle_seconds
+        self.max_lifetime_seconds = max_lifetime_seconds
+        self.health_check_seconds = health_check_seconds
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._slots = set()
+        self._stats = {'created': 0, 'borrowed': 0, 'evicted': 0}
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.timeout,
+            check_same_thread=False,
+            cached_statements=self.statement_cache_size,
+        )
+        conn.row_factory = sqlite3.Row
+        attach_connection(conn)
+        if self.journal_mode:
+            conn.execute(f'PRAGMA journal_mode = {self.journal_mode}')
+        conn.execute(f'PRAGMA synchronous = {self.synchronous}')
+        conn.execute(f'PRAGMA cache_size = {-int(self.cache_size_kb)}')
+        conn.execute(f'PRAGMA mmap_size = {int(self.mmap_size)}')
+        conn.execute(f'PRAGMA busy_timeout = {int(self.timeout * 1000)}')
+        conn.execute('PRAGMA temp_store = MEMORY')
+        return conn
+
+    def _is_healthy(self, slot):
+        if slot.closed:
+            return False
+        now = time.monotonic()
+        if now - slot.created_at > self.max_lifetime_seconds:
+            return False
+        idle = now - slot.last_used
+        if idle > self.max_idle_seconds:
+            return False
+        if idle > self.health_check_seconds:
+            try:
+                slot.conn.execute('SELECT 1').fetchone()
+            except sqlite3.Error:
+                return False
+        return True
+
+    def _discard(self, slot):
+        with self._lock:
+            self._slots.discard(slot)
+            self._stats['evicted'] += 1
+        slot.closed = True
+        try:
+            slot.conn.close()
+        except sqlite3.Error:
+            pass
+
+    def prune(self):
+        with self._lock:
+            dead = [slot for slot in self._slots if not slot.thread.is_alive()]
+        for slot in dead:
+            self._discard(slot)
+        return len(dead)
+
+    def acquire(self):
+        slot = getattr(self._local, 'slot', None)
+        if slot is not None and slot.depth == 0 and not self._is_healthy(slot):
+            if not slot.closed:
+                self._discard(slot)
+            slot = None
+        if slot is None:
+            self.prune()
+            slot = _Slot(self._connect())
+            self._local.slot = slot
+            with self._lock:
+                self._slots.add(slot)
+                self._stats['created'] += 1
+        slot.depth += 1
+        with self._lock:
+            self._stats['borrowed'] += 1
+        return PooledConnection(self, slot)
+
+    def release(self, slot):
+        slot.depth -= 1
+        if slot.depth > 0:
+            return
+        slot.depth = 0
+        slot.last_used = time.monotonic()
+        if slot.closed:
+            return
+        if slot.conn.in_transaction:
+            slot.conn.rollback()
+
+    def close_all(self):
+        with self._lock:
+            slots = list(self._slots)
+        for slot in slots:
+            self._discard(slot)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, open=len(self._slots))
+
+
+pool = ConnectionPool(
+    config.DB_PATH,
+    timeout=config.DB_TIMEOUT,
+    journal_mode=config.DB_JOURNAL_MODE,
+    synchronous=config.DB_SYNCHRONOUS,
+    cache_size_kb=config.DB_CACHE_SIZE_KB,
+    mmap_size=config.DB_MMAP_SIZE,
+    statement_cache_size=config.DB_STATEMENT_CACHE_SIZE,
+    max_idle_seconds=config.DB_MAX_IDLE_SECONDS,
+    max_lifetime_seconds=config.DB_MAX_LIFETIME_SECONDS,
+)
+
+
+TABLES = ('stops', 'paths', 'path_stops', 'routes', 'vehicles', 'drivers', 'daily_trips', 'deployments')
+
+
+# Per-table write counters. Mutators bump them after commit; caches compare
+# the versions they were built against and subscribers are told which tables
+# changed. In shared mode (several worker processes on one database) the
+# versions come from the trigger-maintained change_counters table instead, so
+# writes made by other processes invalidate this process's caches too.
+class TableVersions:
+    def __init__(self, shared=False):
+        self.shared = shared
+        self._lock = threading.Lock()
+        self._versions = {}
+        self._seen = None
+        self._listeners = []
+
+    def bump(self, *tables):
+        tables = tables or TABLES
+        with self._lock:
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(tables)
+
+    def refresh(self):
+        if not self.shared:
+            return None
+        try:
+            with pool.acquire() as conn:
+                current = dict(conn.execute('SELECT table_name, version FROM change_counters').fetchall())
+        except sqlite3.OperationalError:
+            # Not migrated yet; fall back to process-local counters.
+            return None
+        with self._lock:
+            previous, self._seen = self._seen, current
+            listeners = list(self._listeners)
+        if previous is not None:
+            changed = tuple(table for table, version in current.items() if previous.get(table) != version)
+            if changed:
+                for listener in listeners:
+                    listener(changed)
+        return current
+
+    def get(self, *tables):
+        current = self.refresh()
+        if current is not None:
+            return tuple(current.get(table, 0) for table in tables)
+        with self._lock:
+            return tuple(self._versions.get(table, 0) for table in tables)
+
+    def snapshot(self):
+        current = self.refresh()
+        if current is not None:
+            return dict(current)
+        with self._lock:
+            return dict(self._versions)
+
+    def subscribe(self, listener):
+        with self._lock:
+            self._listeners.append(listener)
+
+
+table_versions = TableVersions(shared=config.SHARED_STATE)
+
+
+def bump_tables(*tables):
+    table_versions.bump(*tables)
+
+
+# Trigger-maintained write counts of `tables` as `conn` sees them. Unlike
+# table_versions outside shared mode, these are the same in every process.
+def stored_versions(conn, tables):
+    current = dict(conn.execute('SELECT table_name, version FROM change_counters').fetchall())
+    return tuple(current.get(table, 0) for table in tables)
@@ -0,0 +1,168 @@
+import bisect
+import threading
+from collections import deque
+
+from db import pool, table_versions
+
+
+class AhoCorasick:
+    def __init__(self, patterns):
+        self.patterns = []
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for pattern in patterns:
+            self._add(pattern)
+        self._link()
+
+    def _add(self, pattern):
+        if not pattern:
+            return
+        node = 0
+        for char in pattern:
+            nxt = self._goto[node].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append(len(self.patterns))
+        self.patterns.append(pattern)
+
+    def _link(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def iter_matches(self, text):
+        node = 0
+        for end, char in enumerate(text, 1):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for index in self._out[node]:
+                pattern = self.patterns[index]
+                yield end - len(pattern), end, pattern
+
+
+class _Snapshot:
+    def __init__(self, names_by_kind):
+        self.names = {}
+        keys = {}
+        suffixes = {}
+        for kind, names in names_by_kind.items():
+            by_key = {}
+            for name in names:
+                if name:
+                    by_key.setdefault(name.lower(), name)
+            self.names[kind] = by_key
+            for key, name in by_key.items():
+                keys.setdefault(key, []).append((kind, name))
+            # Word-start suffixes of every name, so a fragment such as "kumar"
+            # resolves to "Amit Kumar" with a single bisect.
+            kind_suffixes = []
+            for key, name in by_key.items():
+                for pos, char in enumerate(key):
+                    if pos == 0 or (key[pos - 1] == ' ' and char != ' '):
+                        kind_suffixes.append((key[pos:], name))
+            kind_suffixes.sort()
+            suffixes[kind] = (kind_suffixes, [item[0] for item in kind_suffixes])
+        self.owners = keys
+        self.suffixes = suffixes
+        self.matcher = AhoCorasick(keys)
+
+
+class EntityIndex:
+    SOURCES = {
+        'vehicles': 'SELECT license_plate FROM vehicles',
+        'drivers': 'SELECT name FROM drivers',
+        'trips': 'SELECT display_name FROM daily_trips',
+        'paths': 'SELECT name FROM paths',
+        'routes': 'SELECT route_display_name FROM routes',
+        'stops': 'SELECT name FROM stops',
+    }
+    TABLE_KINDS = {
+        'vehicles': 'vehicles',
+        'drivers': 'drivers',
+        'daily_trips': 'trips',
+        'paths': 'paths',
+        'routes': 'routes',
+        'stops': 'stops',
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._names = {}
+        self._snapshot = None
+        self.generation = 0
+        self.builds = 0
+
+    def invalidate(self, *kinds):
+        with self._lock:
+            for kind in kinds or list(self._names):
+                self._names.pop(kind, None)
+            self._snapshot = None
+            self.generation += 1
+
+    def on_tables_changed(self, tables):
+        kinds = [self.TABLE_KINDS[table] for table in tables if table in self.TABLE_KINDS]
+        if kinds:
+            self.invalidate(*kinds)
+
+    def _get(self):
+        # Picks up writes from other worker processes; a no-op unless shared.
+        table_versions.refresh()
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+        with self._lock:
+            if self._snapshot is None:
+                missing = [kind for kind in self.SOURCES if kind not in self._names]
+                if missing:
+                    with pool.acquire() as conn:
+                        for kind in missing:
+                            self._names[kind] = [row[0] for row in conn.execute(self.SOURCES[kind])]
+                self._snapshot = _Snapshot(self._names)
+                self.builds += 1
+            return self._snapshot
+
+    def find_all(self, text, kinds=None):
+        snapshot = self._get()
+        wanted = kinds or self.SOURCES
+        found = {kind: [] for kind in wanted}
+        for start, end, key in snapshot.matcher.iter_matches((text or '').lower()):
+            for kind, name in snapshot.owners[key]:
+                if kind in found:
+                    found[kind].append((start, end, name))
+        return found
+
+    def find(self, kind, text):
+        matches = self.find_all(text, [kind])[kind]
+        if not matches:
+            return None
+        start, end, name = max(matches, key=lambda item: (item[1] - item[0], -item[0]))
+        return name
+
+    def find_containing(self, kind, fragment):
+        key = (fragment or '').strip().lower()
+        if not key:
+            return None
+        suffixes, suffix_keys = self._get().suffixes[kind]
+        pos = bisect.bisect_left(suffix_keys, key)
+        if pos < len(suffixes) and suffix_keys[pos].startswith(key):
+            return suffixes[pos][1]
+        return None
+
+
+entity_index = EntityIndex()
+table_versions.subscribe(entity_index.on_tables_changed)
@@ -0,0 +1,125 @@
+import math
+
+from db import pool
+from search import best_match
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+EARTH_RADIUS_M = 6371008.8
+# First search radius for nearest-k; grown 4x until it holds k stops.
+NEAREST_START_RADIUS_M = 500.0
+MAX_RADIUS_M = math.pi * EARTH_RADIUS_M
+
+# (0, 0) is what stops created without coordinates get, so it is treated as
+# "no location" rather than a point in the Gulf of Guinea.
+_LOCATED = '{row}.latitude IS NOT NULL AND {row}.longitude IS NOT NULL AND NOT ({row}.latitude = 0 AND {row}.longitude = 0)'
+
+
+def has_location(latitude, longitude):
+    return latitude is not None and longitude is not None and not (latitude == 0 and longitude == 0)
+
+
+# For bulk loads that bypass the per-row triggers (see importer.py).
+def index_new_stops(conn, table, min_id):
+    if table == 'stops':
+        conn.execute(f'''INSERT OR REPLACE INTO stop_rtree (id, min_lat, max_lat, min_lng, max_lng)
+            SELECT id, latitude, latitude, longitude, longitude FROM stops s WHERE id >= ? AND {_LOCATED.format(row='s')}''',
+                     (min_id,))
+
+
+# Great-circle distance in metres from one point to many.
+def haversine_m(lat, lng, lats, lngs):
+    if numpy is not None:
+        lat1, lng1 = numpy.radians(lat), numpy.radians(lng)
+        lat2, lng2 = numpy.radians(numpy.asarray(lats, dtype=float)), numpy.radians(numpy.asarray(lngs, dtype=float))
+        a = numpy.sin((lat2 - lat1) / 2) ** 2 + numpy.cos(lat1) * numpy.cos(lat2) * numpy.sin((lng2 - lng1) / 2) ** 2
+        return (2 * EARTH_RADIUS_M * numpy.arcsin(numpy.sqrt(numpy.minimum(a, 1.0)))).tolist()
+    lat1, lng1 = math.radians(lat), math.radians(lng)
+    cos_lat1 = math.cos(lat1)
+    distances = []
+    for other_lat, other_lng in zip(lats, lngs):
+        lat2, lng2 = math.radians(other_lat), math.radians(other_lng)
+        a = math.sin((lat2 - lat1) / 2) ** 2 + cos_lat1 * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+        distances.append(2 * EARTH_RADIUS_M * math.asin(math.sqrt(min(a, 1.0))))
+    return distances
+
+
+# Distances in metres between consecutive points: len(lats) - 1 values.
+def segment_lengths_m(lats, lngs):
+    if len(lats) < 2:
+        return []
+    if numpy is not None:
+        lats, lngs = numpy.radians(numpy.asarray(lats, dtype=float)), numpy.radians(numpy.asarray(lngs, dtype=float))
+        a = (numpy.sin(numpy.diff(lats) / 2) ** 2
+             + numpy.cos(lats[:-1]) * numpy.cos(lats[1:]) * numpy.sin(numpy.diff(lngs) / 2) ** 2)
+        return (2 * EARTH_RADIUS_M * numpy.arcsin(numpy.sqrt(numpy.minimum(a, 1.0)))).tolist()
+    return [haversine_m(lats[i], lngs[i], (lats[i + 1],), (lngs[i + 1],))[0] for i in range(len(lats) - 1)]
+
+
+# Lat/lng box that contains every point within radius_m; wider than the
+# circle, so candidates are filtered by exact distance afterwards.
+def bounding_box(lat, lng, radius_m):
+    delta_lat = math.degrees(radius_m / EARTH_RADIUS_M)
+    cos_lat = math.cos(math.radians(lat))
+    if radius_m >= MAX_RADIUS_M or abs(lat) + delta_lat >= 90 or cos_lat < 1e-9:
+        return (-90.0, 90.0, -180.0, 180.0)
+    delta_lng = math.degrees(math.asin(min(1.0, math.sin(radius_m / EARTH_RADIUS_M) / cos_lat)))
+    return (lat - delta_lat, lat + delta_lat, lng - delta_lng, lng + delta_lng)
+
+
+def _candidates(conn, lat, lng, radius_m, exclude_id=None):
+    min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_m)
+    boxes = [(min_lng, max_lng)]
+    # Boxes crossing the antimeridian are split in two.
+    if min_lng < -180:
+        boxes = [(-180.0, max_lng), (min_lng + 360, 180.0)]
+    elif max_lng > 180:
+        boxes = [(min_lng, 180.0), (-180.0, max_lng - 360)]
+    rows = []
+    for low, high in boxes:
+        rows.extend(conn.execute('''
+            SELECT s.id, s.name, s.latitude, s.longitude FROM stop_rtree g JOIN stops s ON s.id = g.id
+            WHERE g.max_lat >= ? AND g.min_lat <= ? AND g.max_lng >= ? AND g.min_lng <= ? AND s.id IS NOT ?
+        ''', (min_lat, max_lat, low, high, exclude_id)).fetchall())
+    distances = haversine_m(lat, lng, [row[2] for row in rows], [row[3] for row in rows])
+    return sorted(
+        ({'id': row[0], 'name': row[1], 'latitude': row[2], 'longitude': row[3], 'distance_m': round(distance, 1)}
+         for row, distance in zip(rows, distances)),
+        key=lambda stop: (stop['distance_m'], stop['id']),
+    )
+
+
+def stops_within(lat, lng, radius_m, limit=None, exclude_id=None):
+    with pool.acquire() as conn:
+        stops = [stop for stop in _candidates(conn, lat, lng, radius_m, exclude_id) if stop['distance_m'] <= radius_m]
+    return stops[:limit] if limit else stops
+
+
+# Grows the search box until it holds k stops within its radius; every stop
+# outside that radius is farther than all k, so the answer is exact.
+def nearest_stops(lat, lng, k=5, max_radius_m=None, exclude_id=None):
+    radius = NEAREST_START_RADIUS_M if max_radius_m is None else min(NEAREST_START_RADIUS_M, max_radius_m)
+    limit = MAX_RADIUS_M if max_radius_m is None else max_radius_m
+    with pool.acquire() as conn:
+        while True:
+            stops = [stop for stop in _candidates(conn, lat, lng, radius, exclude_id) if stop['distance_m'] <= radius]
+            if len(stops) >= k or radius >= limit:
+                return stops[:k]
+            radius = min(radius * 4, limit)
+
+
+# A stop name or "lat, lng" -> (lat, lng, stop or None).
+def locate(target):
+    if isinstance(target, (tuple, list)):
+        return float(target[0]), float(target[1]), None
+    match = best_match('stops', target)
+    if not match:
+        return None
+    with pool.acquire() as conn:
+        row = conn.execute('SELECT id, name, latitude, longitude FROM stops WHERE id = ?', (match['id'],)).fetchone()
+    if row is None or not has_location(row[2], row[3]):
+        return None
+    return row[2], row[3], {'id': row[0], 'name': row[1]}
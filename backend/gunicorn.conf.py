@@ -0,0 +1,24 @@
+import multiprocessing
+import os
+
+# gunicorn -c gunicorn.conf.py app:app
+# or, with the async chat entry point:
+# gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker asgi:app
+
+bind = f"{os.getenv('FLASK_HOST', '0.0.0.0')}:{os.getenv('FLASK_PORT', '5000')}"
+workers = int(os.getenv('MOVI_GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('MOVI_GUNICORN_THREADS', 4))
+timeout = 120
+
+# Each worker opens its own SQLite connections after the fork.
+preload_app = False
+
+# Sessions, agent checkpoints, optimizer plans and cache invalidation live in
+# SQLite so any worker can serve any turn. Workers inherit this on fork.
+os.environ.setdefault('MOVI_SHARED_STATE', 'True')
+
+
+def on_starting(server):
+    from tools import init_database
+    print("Initializing database (migrations will run automatically)...")
+    init_database()
@@ -0,0 +1,163 @@
+import base64
+import binascii
+import hashlib
+import io
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import NamedTuple
+
+from PIL import Image, ImageOps
+
+from api_cache import VersionedCache
+from config import config
+
+try:
+    import pytesseract
+except Exception:
+    pytesseract = None
+
+# Pixels this far from the dominant (background) grey count as content when
+# cropping screenshot margins away before OCR.
+CONTENT_THRESHOLD = 32
+CROP_MARGIN = 8
+
+
+# What OCR needs from an upload, computed once per distinct image: raw
+# grayscale pixels (cheap to pickle to a worker) of the cropped, downscaled
+# content region, plus the original size for the chat metadata.
+class PreparedImage(NamedTuple):
+    digest: str
+    width: int
+    height: int
+    mode: str
+    size: tuple
+    pixels: bytes
+
+
+_prepared = VersionedCache(config.IMAGE_CACHE_SIZE)
+_ocr_results = VersionedCache(config.IMAGE_CACHE_SIZE)
+_stats_lock = threading.Lock()
+_stats = {'timeouts': 0, 'errors': 0}
+_executor_lock = threading.Lock()
+_executor = None
+
+
+def strip_data_url(image_data):
+    if config.API_BASE64_DELIMITER in image_data:
+        return image_data.split(config.API_BASE64_DELIMITER, 1)[1]
+    return image_data
+
+
+def crop_to_content(image):
+    histogram = image.histogram()
+    background = max(range(256), key=histogram.__getitem__)
+    mask = image.point(lambda value: 255 if abs(value - background) > CONTENT_THRESHOLD else 0)
+    box = mask.getbbox()
+    if not box:
+        return image
+    left, top, right, bottom = box
+    return image.crop((
+        max(0, left - CROP_MARGIN), max(0, top - CROP_MARGIN),
+        min(image.width, right + CROP_MARGIN), min(image.height, bottom + CROP_MARGIN),
+    ))
+
+
+def prepare(image_data):
+    if not image_data:
+        return None
+    if isinstance(image_data, PreparedImage):
+        return image_data
+    try:
+        image_bytes = base64.b64decode(strip_data_url(image_data))
+    except (binascii.Error, ValueError):
+        return None
+    digest = hashlib.blake2b(image_bytes, digest_size=16).hexdigest()
+    prepared = _prepared.lookup(digest, ())
+    if prepared is not None:
+        return prepared
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            width, height = image.size
+            # draft() lets JPEG decode straight at a reduced scale.
+            image.draft('L', (config.IMAGE_OCR_MAX_SIDE, config.IMAGE_OCR_MAX_SIDE))
+            gray = ImageOps.exif_transpose(image).convert('L')
+    except Exception:
+        return None
+    gray = crop_to_content(gray)
+    if max(gray.size) > config.IMAGE_OCR_MAX_SIDE:
+        gray.thumbnail((config.IMAGE_OCR_MAX_SIDE, config.IMAGE_OCR_MAX_SIDE), Image.LANCZOS)
+    prepared = PreparedImage(digest, width, height, gray.mode, gray.size, gray.tobytes())
+    return _prepared.store(digest, (), prepared)
+
+
+# Runs in a worker process. pytesseract kills tesseract itself once `timeout`
+# passes, so a stuck page frees its worker rather than holding it.
+def _run_ocr(mode, size, pixels, timeout):
+    return pytesseract.image_to_string(Image.frombytes(mode, size, pixels), timeout=timeout)
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn: forking a threaded server can copy held locks into the child.
+            _executor = ProcessPoolExecutor(
+                max_workers=config.IMAGE_OCR_WORKERS, mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _executor
+
+
+def _reset_pool():
+    global _executor
+    with _executor_lock:
+        broken, _executor = _executor, None
+    if broken is not None:
+        broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _count(key):
+    with _stats_lock:
+        _stats[key] += 1
+
+
+# OCR text for an upload, or '' when OCR is unavailable, fails or times out.
+# Results are cached by content hash, so re-sending a screenshot is free.
+def ocr_text(image_data, timeout=None):
+    prepared = prepare(image_data)
+    if prepared is None or pytesseract is None:
+        return ''
+    text = _ocr_results.lookup(prepared.digest, ())
+    if text is not None:
+        return text
+    timeout = config.IMAGE_OCR_TIMEOUT if timeout is None else timeout
+    args = (prepared.mode, prepared.size, prepared.pixels, timeout)
+    try:
+        if config.IMAGE_OCR_WORKERS > 0:
+            # A little slack past tesseract's own timeout for pickling and start-up.
+            text = _pool().submit(_run_ocr, *args).result(timeout=timeout + 5)
+        else:
+            text = _run_ocr(*args)
+    except (FutureTimeout, RuntimeError):
+        # pytesseract signals its own timeout with RuntimeError.
+        _count('timeouts')
+        return ''
+    except BrokenProcessPool:
+        _count('errors')
+        _reset_pool()
+        return ''
+    except Exception:
+        _count('errors')
+        return ''
+    return _ocr_results.store(prepared.digest, (), text)
+
+
+def stats():
+    with _stats_lock:
+        counters = dict(_stats)
+    return dict(counters, prepared=_prepared.stats(), ocr=_ocr_results.stats(), ocr_available=pytesseract is not None)
+
+
+def shutdown():
+    _reset_pool()
@@ -0,0 +1,406 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+from conflicts import index_new_deployments
+from consequences import count_new_dependents
+from db import bump_tables, pool
+from geo import index_new_stops
+from migrations import run_migrations
+from search import index_new_rows
+from views import refresh_new_rows
+
+# Load order: every entity only references entities earlier in the list.
+ENTITIES = ('stops', 'paths', 'path_stops', 'routes', 'vehicles', 'drivers', 'daily_trips', 'deployments')
+ENTITY_ALIASES = {'trips': 'daily_trips'}
+FILE_EXTENSIONS = ('.csv', '.jsonl', '.ndjson', '.json')
+# Per-row triggers whose work import_records redoes once per batch load.
+REPLAYED_TRIGGERS = ('trg_search_', 'trg_counter_', 'trg_deps_', 'trg_geo_', 'trg_window_', 'trg_view_')
+MAX_REPORTED_ERRORS = 100
+
+INSERTS = {
+    'stops': 'INSERT INTO stops (id, name, latitude, longitude) VALUES (?, ?, ?, ?)',
+    'paths': 'INSERT INTO paths (id, name) VALUES (?, ?)',
+    'path_stops': 'INSERT INTO path_stops (id, path_id, stop_id, order_index) VALUES (?, ?, ?, ?)',
+    'routes': '''INSERT INTO routes (id, path_id, route_display_name, shift_time, direction, start_point, end_point, status)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+    'vehicles': 'INSERT INTO vehicles (id, license_plate, type, capacity, model) VALUES (?, ?, ?, ?, ?)',
+    'drivers': 'INSERT INTO drivers (id, name, license_number, phone) VALUES (?, ?, ?, ?)',
+    'daily_trips': '''INSERT INTO daily_trips (id, route_id, display_name, booking_status_percentage, live_status, date)
+        VALUES (?, ?, ?, ?, ?, ?)''',
+    'deployments': 'INSERT INTO deployments (id, trip_id, vehicle_id, driver_id) VALUES (?, ?, ?, ?)',
+}
+
+
+def _text(record, *fields):
+    for field in fields:
+        value = record.get(field)
+        if value is not None and str(value).strip() != '':
+            return str(value).strip()
+    return None
+
+
+def _number(record, field, kind=float, default=None):
+    value = _text(record, field)
+    if value is None:
+        return default
+    try:
+        return kind(value)
+    except ValueError:
+        raise ValueError(f"'{field}' must be a number, got {value!r}")
+
+
+def read_records(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        with open(path, newline='', encoding='utf-8') as handle:
+            yield from csv.DictReader(handle)
+    elif extension in ('.jsonl', '.ndjson'):
+        with open(path, encoding='utf-8') as handle:
+            for line in handle:
+                if line.strip():
+                    yield json.loads(line)
+    elif extension == '.json':
+        with open(path, encoding='utf-8') as handle:
+            data = json.load(handle)
+        yield from (data if isinstance(data, list) else [data])
+    else:
+        raise ValueError(f"Unsupported file type '{extension}' (expected one of {', '.join(FILE_EXTENSIONS)})")
+
+
+@contextmanager
+def bulk_load_pragmas(conn):
+    synchronous = conn.execute('PRAGMA synchronous').fetchone()[0]
+    foreign_keys = conn.execute('PRAGMA foreign_keys').fetchone()[0]
+    cache_size = conn.execute('PRAGMA cache_size').fetchone()[0]
+    # Foreign keys are resolved by the importer itself; durability is only
+    # needed once the load commits.
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('PRAGMA foreign_keys = OFF')
+    conn.execute('PRAGMA cache_size = -262144')
+    try:
+        yield
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        conn.execute(f'PRAGMA synchronous = {int(synchronous)}')
+        conn.execute(f'PRAGMA foreign_keys = {int(foreign_keys)}')
+        conn.execute(f'PRAGMA cache_size = {int(cache_size)}')
+
+
+# Search-index and change-counter triggers cost more than the insert itself,
+# so they are dropped for the load and recreated before it commits; DDL is
+# transactional, so other connections never see the table without them.
+@contextmanager
+def replayed_triggers(conn, table):
+    triggers = [
+        (name, sql) for name, sql in conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = ?", (table,))
+        if name.startswith(REPLAYED_TRIGGERS)
+    ]
+    for name, _ in triggers:
+        conn.execute(f'DROP TRIGGER {name}')
+    yield
+    for _, sql in triggers:
+        conn.execute(sql)
+
+
+# Natural keys and foreign keys are resolved against dictionaries loaded once
+# per import; new rows get explicit ids so the dictionaries stay current
+# without reading anything back. Rows whose natural key already exists are
+# skipped, so importing the same file twice is a no-op.
+class Importer:
+    def __init__(self, conn, batch_size=5000):
+        self.conn = conn
+        self.batch_size = batch_size
+        self._maps = {}
+        self._next_ids = {}
+        self._path_positions = {}
+
+    def _next_id(self, table):
+        if table not in self._next_ids:
+            self._next_ids[table] = (self.conn.execute(f'SELECT COALESCE(MAX(id), 0) FROM {table}').fetchone()[0]) + 1
+        value = self._next_ids[table]
+        self._next_ids[table] = value + 1
+        return value
+
+    def _map(self, name):
+        mapping = self._maps.get(name)
+        if mapping is not None:
+            return mapping
+        conn = self.conn
+        if name == 'stops':
+            rows = conn.execute('SELECT name, id FROM stops ORDER BY id DESC')
+        elif name == 'paths':
+            rows = conn.execute('SELECT name, id FROM paths ORDER BY id DESC')
+        elif name == 'path_stops':
+            rows = conn.execute('SELECT path_id, order_index, id FROM path_stops ORDER BY id DESC')
+            rows = (((path_id, order_index), row_id) for path_id, order_index, row_id in rows)
+        elif name == 'routes':
+            rows = conn.execute('SELECT route_display_name, id FROM routes ORDER BY id DESC')
+        elif name == 'route_names':
+            rows = conn.execute('SELECT id, route_display_name FROM routes')
+        elif name == 'vehicles':
+            rows = conn.execute('SELECT license_plate, id FROM vehicles ORDER BY id DESC')
+        elif name == 'drivers':
+            rows = conn.execute('SELECT COALESCE(license_number, name), id FROM drivers ORDER BY id DESC')
+        elif name == 'driver_names':
+            rows = conn.execute('SELECT name, id FROM drivers ORDER BY id DESC')
+        elif name == 'daily_trips':
+            rows = conn.execute('SELECT display_name, date, id FROM daily_trips ORDER BY id DESC')
+            rows = (((display_name, date or None), row_id) for display_name, date, row_id in rows)
+        elif name == 'trip_names':
+            rows = conn.execute('SELECT display_name, id FROM daily_trips ORDER BY id DESC')
+        elif name == 'deployments':
+            rows = conn.execute('SELECT trip_id, id FROM deployments')
+        elif name.endswith('_ids'):
+            rows = ((row_id, row_id) for (row_id,) in conn.execute(f'SELECT id FROM {name[:-4]}'))
+        else:
+            raise KeyError(name)
+        # Descending ids, so on duplicate names the oldest row wins.
+        mapping = self._maps[name] = dict(rows)
+        return mapping
+
+    def _reference(self, record, id_field, name_fields, mapping, table, label):
+        raw_id = _text(record, id_field)
+        if raw_id is not None:
+            row_id = _number(record, id_field, int)
+            if row_id not in self._map(f'{table}_ids'):
+                raise ValueError(f'{label} id {row_id} not found')
+            return row_id
+        name = _text(record, *name_fields)
+        if name is None:
+            raise ValueError(f"one of '{id_field}' or '{name_fields[0]}' is required")
+        row_id = self._map(mapping).get(name)
+        if row_id is None:
+            raise ValueError(f"{label} '{name}' not found")
+        return row_id
+
+    def _remember(self, table, key_map, key, row_id, *extra):
+        self._map(key_map)[key] = row_id
+        ids = self._maps.get(f'{table}_ids')
+        if ids is not None:
+            ids[row_id] = row_id
+        for name, extra_key in extra:
+            self._map(name).setdefault(extra_key, row_id)
+
+    # Each returns the row tuple to insert, or None if it already exists.
+    def _stops(self, record):
+        name = _text(record, 'name')
+        if name is None:
+            raise ValueError("'name' is required")
+        if name in self._map('stops'):
+            return None
+        row_id = self._next_id('stops')
+        self._remember('stops', 'stops', name, row_id)
+        return (row_id, name, _number(record, 'latitude'), _number(record, 'longitude'))
+
+    def _paths(self, record):
+        name = _text(record, 'name')
+        if name is None:
+            raise ValueError("'name' is required")
+        if name in self._map('paths'):
+            return None
+        row_id = self._next_id('paths')
+        self._remember('paths', 'paths', name, row_id)
+        return (row_id, name)
+
+    def _path_stops(self, record):
+        path_id = self._reference(record, 'path_id', ('path', 'path_name'), 'paths', 'paths', 'Path')
+        stop_id = self._reference(record, 'stop_id', ('stop', 'stop_name'), 'stops', 'stops', 'Stop')
+        # Without an explicit order_index, stops are numbered in file order.
+        order_index = _number(record, 'order_index', int, self._path_positions.get(path_id, 0))
+        self._path_positions[path_id] = order_index + 1
+        if (path_id, order_index) in self._map('path_stops'):
+            return None
+        row_id = self._next_id('path_stops')
+        self._remember('path_stops', 'path_stops', (path_id, order_index), row_id)
+        return (row_id, path_id, stop_id, order_index)
+
+    def _routes(self, record):
+        name = _text(record, 'route_display_name', 'name')
+        if name is None:
+            raise ValueError("'route_display_name' is required")
+        if name in self._map('routes'):
+            return None
+        path_id = self._reference(record, 'path_id', ('path', 'path_name'), 'paths', 'paths', 'Path')
+        row_id = self._next_id('routes')
+        self._remember('routes', 'routes', name, row_id)
+        self._map('route_names')[row_id] = name
+        return (
+            row_id, path_id, name, _text(record, 'shift_time'), _text(record, 'direction'),
+            _text(record, 'start_point'), _text(record, 'end_point'), _text(record, 'status') or 'active',
+        )
+
+    def _vehicles(self, record):
+        plate = _text(record, 'license_plate')
+        if plate is None:
+            raise ValueError("'license_plate' is required")
+        if plate in self._map('vehicles'):
+            return None
+        row_id = self._next_id('vehicles')
+        self._remember('vehicles', 'vehicles', plate, row_id)
+        return (row_id, plate, _text(record, 'type'), _number(record, 'capacity', int), _text(record, 'model'))
+
+    def _drivers(self, record):
+        name = _text(record, 'name')
+        if name is None:
+            raise ValueError("'name' is required")
+        license_number = _text(record, 'license_number')
+        key = license_number or name
+        if key in self._map('drivers'):
+            return None
+        row_id = self._next_id('drivers')
+        self._remember('drivers', 'drivers', key, row_id, ('driver_names', name))
+        return (row_id, name, license_number, _text(record, 'phone'))
+
+    def _daily_trips(self, record):
+        route_id = self._reference(record, 'route_id', ('route', 'route_display_name'), 'routes', 'routes', 'Route')
+        display_name = _text(record, 'display_name', 'name')
+        if display_name is None:
+            display_name = self._map('route_names')[route_id]
+        date = _text(record, 'date')
+        if (display_name, date) in self._map('daily_trips'):
+            return None
+        row_id = self._next_id('daily_trips')
+        self._remember('daily_trips', 'daily_trips', (display_name, date), row_id, ('trip_names', display_name))
+        return (
+            row_id, route_id, display_name, _number(record, 'booking_status_percentage', float, 0.0),
+            _text(record, 'live_status') or '', date or '',
+        )
+
+    def _deployments(self, record):
+        date = _text(record, 'date')
+        trip_name = _text(record, 'trip', 'trip_display_name')
+        if _text(record, 'trip_id') is None and trip_name is not None and date is not None:
+            trip_id = self._map('daily_trips').get((trip_name, date))
+            if trip_id is None:
+                raise ValueError(f"Trip '{trip_name}' on {date} not found")
+        else:
+            trip_id = self._reference(record, 'trip_id', ('trip', 'trip_display_name'), 'trip_names', 'daily_trips', 'Trip')
+        vehicle_id = self._reference(record, 'vehicle_id', ('vehicle', 'license_plate'), 'vehicles', 'vehicles', 'Vehicle')
+        driver_id = self._reference(record, 'driver_id', ('driver', 'driver_name'), 'driver_names', 'drivers', 'Driver')
+        if trip_id in self._map('deployments'):
+            return None
+        row_id = self._next_id('deployments')
+        self._remember('deployments', 'deployments', trip_id, row_id)
+        return (row_id, trip_id, vehicle_id, driver_id)
+
+    def import_records(self, entity, records):
+        entity = ENTITY_ALIASES.get(entity, entity)
+        if entity not in INSERTS:
+            raise ValueError(f"Unknown entity '{entity}'")
+        convert = getattr(self, '_' + entity)
+        report = {'entity': entity, 'read': 0, 'inserted': 0, 'skipped': 0, 'failed': 0, 'errors': []}
+        started = time.perf_counter()
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            first_id = self.conn.execute(f'SELECT COALESCE(MAX(id), 0) + 1 FROM {entity}').fetchone()[0]
+            with replayed_triggers(self.conn, entity):
+                self._load(entity, convert, records, report)
+            if report['inserted']:
+                index_new_rows(self.conn, entity, first_id)
+                count_new_dependents(self.conn, entity, first_id)
+                index_new_stops(self.conn, entity, first_id)
+                index_new_deployments(self.conn, entity, first_id)
+                refresh_new_rows(self.conn, entity, first_id)
+                self.conn.execute('UPDATE change_counters SET version = version + 1 WHERE table_name = ?', (entity,))
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            # Ids and keys handed out for rolled-back rows are no longer valid.
+            self._maps.clear()
+            self._next_ids.clear()
+            raise
+        elapsed = time.perf_counter() - started
+        report['seconds'] = round(elapsed, 4)
+        report['rows_per_sec'] = round(report['read'] / elapsed, 1) if elapsed else None
+        if report['inserted']:
+            bump_tables(entity)
+        return report
+
+    def _load(self, entity, convert, records, report):
+        batch = []
+        for number, record in enumerate(records, 1):
+            report['read'] += 1
+            try:
+                row = convert(record)
+            except (ValueError, TypeError, AttributeError) as exc:
+                report['failed'] += 1
+                if len(report['errors']) < MAX_REPORTED_ERRORS:
+                    report['errors'].append({'record': number, 'error': str(exc)})
+                continue
+            if row is None:
+                report['skipped'] += 1
+                continue
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                self.conn.executemany(INSERTS[entity], batch)
+                report['inserted'] += len(batch)
+                batch = []
+        if batch:
+            self.conn.executemany(INSERTS[entity], batch)
+            report['inserted'] += len(batch)
+
+    def import_all(self, sources):
+        reports = []
+        started = time.perf_counter()
+        with bulk_load_pragmas(self.conn):
+            for entity in ENTITIES:
+                for name, records in sources.items():
+                    if ENTITY_ALIASES.get(name, name) == entity:
+                        reports.append(self.import_records(entity, records))
+            if any(report['inserted'] for report in reports):
+                self.conn.execute('PRAGMA optimize')
+        elapsed = time.perf_counter() - started
+        total = sum(report['read'] for report in reports)
+        return {
+            'entities': reports,
+            'read': total,
+            'inserted': sum(report['inserted'] for report in reports),
+            'seconds': round(elapsed, 4),
+            'rows_per_sec': round(total / elapsed, 1) if elapsed else None,
+        }
+
+
+def find_files(directory):
+    files = {}
+    for filename in sorted(os.listdir(directory)):
+        stem, extension = os.path.splitext(filename)
+        entity = ENTITY_ALIASES.get(stem, stem)
+        if entity in INSERTS and extension.lower() in FILE_EXTENSIONS:
+            files[entity] = os.path.join(directory, filename)
+    return files
+
+
+def import_files(files, batch_size=5000):
+    with pool.acquire() as conn:
+        run_migrations(conn)
+        sources = {entity: read_records(path) for entity, path in files.items()}
+        return Importer(conn, batch_size=batch_size).import_all(sources)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Bulk import master data from CSV, JSON or JSONL files.')
+    parser.add_argument('directory', nargs='?', help='Directory of <entity>.csv/.json/.jsonl files (e.g. stops.csv, trips.jsonl).')
+    for entity in ENTITIES:
+        parser.add_argument(f"--{entity.replace('_', '-')}", dest=entity, metavar='FILE')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    files = find_files(args.directory) if args.directory else {}
+    files.update({entity: getattr(args, entity) for entity in ENTITIES if getattr(args, entity)})
+    if not files:
+        parser.error('nothing to import: pass a directory or at least one --<entity> FILE')
+    result = import_files(files, batch_size=args.batch_size)
+    for report in result['entities']:
+        print(f"[OK] {report['entity']}: {report['inserted']} inserted, {report['skipped']} skipped, "
+              f"{report['failed']} failed ({report['rows_per_sec']} rows/s)")
+        for error in report['errors']:
+            print(f"     record {error['record']}: {error['error']}")
+    print(f"[OK] Imported {result['inserted']} of {result['read']} rows in {result['seconds']}s ({result['rows_per_sec']} rows/s)")
+    sys.exit(1 if any(report['failed'] for report in result['entities']) else 0)
@@ -0,0 +1,241 @@
+import contextvars
+import functools
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from config import config
+
+# Lists longer than this have their encoded size extrapolated from an evenly
+# spaced sample, so measuring a large result never costs more than making it.
+SIZE_SAMPLE = 64
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# kind -> (metric prefix, label name)
+SPAN_KINDS = {
+    'node': ('movi_agent_node', 'node'),
+    'db': ('movi_db_function', 'function'),
+}
+
+_current = contextvars.ContextVar('movi_span', default=None)
+_timings = contextvars.ContextVar('movi_timings', default=None)
+
+
+class Span:
+    __slots__ = ('kind', 'name', 'parent', 'statements', 'rows', 'bytes')
+
+    def __init__(self, kind, name, parent):
+        self.kind = kind
+        self.name = name
+        self.parent = parent
+        self.statements = 0
+        self.rows = 0
+        self.bytes = 0
+
+
+class Metrics:
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, kind, name, seconds, statements, rows, size, error=False):
+        with self._lock:
+            series = self._series.get((kind, name))
+            if series is None:
+                series = self._series[(kind, name)] = {
+                    'count': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'statements': 0,
+                    'rows': 0, 'bytes': 0, 'errors': 0, 'buckets': [0] * len(self.buckets),
+                }
+            series['count'] += 1
+            series['seconds'] += seconds
+            series['max_seconds'] = max(series['max_seconds'], seconds)
+            series['statements'] += statements
+            series['rows'] += rows
+            series['bytes'] += size
+            series['errors'] += int(error)
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series['buckets'][index] += 1
+                    break
+
+    def snapshot(self):
+        with self._lock:
+            return {key: dict(series, buckets=list(series['buckets'])) for key, series in self._series.items()}
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        series = self.snapshot()
+        lines = []
+        for kind, (prefix, label) in SPAN_KINDS.items():
+            items = sorted((name, values) for (k, name), values in series.items() if k == kind)
+            if not items:
+                continue
+            lines.append(f'# HELP {prefix}_duration_seconds Wall time per call.')
+            lines.append(f'# TYPE {prefix}_duration_seconds histogram')
+            for name, values in items:
+                labels = f'{label}="{_escape(name)}"'
+                cumulative = 0
+                for bound, count in zip(self.buckets, values['buckets']):
+                    cumulative += count
+                    lines.append(f'{prefix}_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}_duration_seconds_bucket{{{labels},le="+Inf"}} {values["count"]}')
+                lines.append(f'{prefix}_duration_seconds_sum{{{labels}}} {values["seconds"]:.6f}')
+                lines.append(f'{prefix}_duration_seconds_count{{{labels}}} {values["count"]}')
+            for metric, key, kind_name, help_text in (
+                ('duration_seconds_max', 'max_seconds', 'gauge', 'Slowest call since start.'),
+                ('sql_statements_total', 'statements', 'counter', 'SQL statements executed.'),
+                ('rows_total', 'rows', 'counter', 'Rows fetched from SQLite.'),
+                ('output_bytes_total', 'bytes', 'counter', 'Bytes of output produced.'),
+                ('errors_total', 'errors', 'counter', 'Calls that raised.'),
+            ):
+                lines.append(f'# HELP {prefix}_{metric} {help_text}')
+                lines.append(f'# TYPE {prefix}_{metric} {kind_name}')
+                for name, values in items:
+                    value = values[key]
+                    value = f'{value:.6f}' if isinstance(value, float) else value
+                    lines.append(f'{prefix}_{metric}{{{label}="{_escape(name)}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+metrics = Metrics()
+
+
+def _on_statement(sql):
+    span = _current.get()
+    if span is not None:
+        span.statements += 1
+
+
+def _counting_row(cursor, row):
+    span = _current.get()
+    if span is not None:
+        span.rows += 1
+    return sqlite3.Row(cursor, row)
+
+
+# For cursors that fetch plain tuples (row_factory = None) on hot paths.
+def record_rows(count):
+    span = _current.get()
+    if span is not None:
+        span.rows += count
+
+
+# Called for every pooled connection: statements and fetched rows are charged
+# to whichever span is active on the executing thread.
+def attach_connection(conn):
+    if config.METRICS_ENABLED:
+        conn.set_trace_callback(_on_statement)
+        conn.row_factory = _counting_row
+
+
+def output_size(value):
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    if isinstance(value, list) and len(value) > SIZE_SAMPLE:
+        sample = value[::len(value) // SIZE_SAMPLE][:SIZE_SAMPLE]
+        return int(output_size(sample) * len(value) / len(sample))
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return len(str(value))
+
+
+@contextmanager
+def span(kind, name):
+    parent = _current.get()
+    current = Span(kind, name, parent)
+    token = _current.set(current)
+    started = time.perf_counter()
+    error = False
+    try:
+        yield current
+    except BaseException:
+        error = True
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        _current.reset(token)
+        # Nested spans roll their counts up, so a node includes its DB calls.
+        if parent is not None:
+            parent.statements += current.statements
+            parent.rows += current.rows
+        metrics.observe(kind, name, elapsed, current.statements, current.rows, current.bytes, error)
+        collected = _timings.get()
+        if collected is not None:
+            collected.append({
+                'kind': kind,
+                'name': name,
+                'ms': round(elapsed * 1000, 3),
+                'statements': current.statements,
+                'rows': current.rows,
+                'bytes': current.bytes,
+                'error': error,
+            })
+
+
+def instrument(kind, name, func, size=output_size):
+    if not config.METRICS_ENABLED:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with span(kind, name) as current:
+            result = func(*args, **kwargs)
+            current.bytes = size(result)
+            return result
+
+    wrapper._instrumented = True
+    return wrapper
+
+
+def instrument_module(namespace, kind='db', exclude=()):
+    module = namespace['__name__']
+    for name, value in list(namespace.items()):
+        if (name.startswith('_') or name in exclude or not callable(value)
+                or getattr(value, '__module__', None) != module or getattr(value, '_instrumented', False)
+                or isinstance(value, type)):
+            continue
+        namespace[name] = instrument(kind, name, value)
+
+
+# Graph nodes take and return the state; their output is the reply text they
+# appended.
+def instrument_node(name, func):
+    if not config.METRICS_ENABLED:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(state):
+        before = len(state.get('messages') or [])
+        with span('node', name) as current:
+            result = func(state)
+            added = (result or {}).get('messages', [])[before:]
+            current.bytes = sum(output_size(m.get('content')) for m in added if isinstance(m, dict))
+            return result
+
+    return wrapper
+
+
+@contextmanager
+def collect_timings():
+    collected = []
+    token = _timings.set(collected)
+    started = time.perf_counter()
+    timings = {'spans': collected}
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+        timings['total_ms'] = round((time.perf_counter() - started) * 1000, 3)
@@ -0,0 +1,430 @@
+import datetime
+import re
+from functools import lru_cache
+from typing import Callable, Dict, FrozenSet, List, NamedTuple, Optional, Tuple, Any
+
+from entity_index import entity_index
+from tools import get_all_vehicles
+
+_QUOTED_PATTERNS = [
+    re.compile(r"['\"]([^'\"]+)['\"]"),
+    re.compile(r"\[([^\]]+)\]"),
+]
+
+_PLATE_PATTERNS = [
+    re.compile(r"['\"]([A-Z]{2}-\d{2}-[A-Z]{0,2}-?\d{4})['\"]", re.IGNORECASE),
+    re.compile(r"([A-Z]{2}-\d{2}-[A-Z]{0,2}-?\d{4})", re.IGNORECASE),
+    re.compile(r"vehicle\s+['\"]?([^'\"]+?)['\"]?(?:\s+(?:and|or|to|with|driver)|$)", re.IGNORECASE),
+    re.compile(r"['\"]([^'\"]+)['\"]", re.IGNORECASE),
+]
+
+_DRIVER_PATTERNS = [
+    re.compile(r"driver\s+['\"]?([^'\"]+?)['\"]?(?:\s+(?:to|from|for|with|and)|$)", re.IGNORECASE),
+    re.compile(r"['\"]([^'\"]+)['\"]", re.IGNORECASE),
+]
+
+_TRIP_PATTERNS = [
+    re.compile(r"trip\s+['\"]?([^'\"\s]+(?:\s+[^'\"\s]+)*)['\"]?", re.IGNORECASE),
+    re.compile(r"['\"]([^'\"]+)['\"]", re.IGNORECASE),
+    re.compile(r"from\s+['\"]?([^'\"]+?)['\"]?(?:\s+(?:trip|route)|$)", re.IGNORECASE),
+]
+
+_PATH_PATTERNS = [
+    re.compile(r"['\"]([^'\"]+)['\"]", re.IGNORECASE),
+    re.compile(r"path\s+['\"]?([^'\"\s]+(?:\s+[^'\"\s]+)*)['\"]?(?:\s+(?:to|has|contains|with)|$)", re.IGNORECASE),
+    re.compile(r"(?:for|using|on|in)\s+(?:the\s+)?path\s+['\"]?([^'\"]+?)['\"]?(?:\s+|$)", re.IGNORECASE),
+]
+
+_ROUTE_PATTERNS = [
+    re.compile(r"route\s+['\"]?([^'\"]+?(?:\s+-\s+\d{1,2}:\d{2})?)['\"]?(?:\s+|$)", re.IGNORECASE),
+    re.compile(r"['\"]([^'\"]+)['\"]", re.IGNORECASE),
+]
+
+_TRIP_DATE_PATTERN = re.compile(r'(?:\b(?:on|for)\s+)?\b(\d{4}-\d{2}-\d{2}|today|tomorrow|yesterday)\b', re.IGNORECASE)
+_RELATIVE_DAYS = {'yesterday': -1, 'today': 0, 'tomorrow': 1}
+
+_STOPS_LIST_PATTERN = re.compile(r"(?:using|with)\s+(?:stops?|the following)(?:\s+[:=])?\s*['\"]?([^'\"]+)['\"]?", re.IGNORECASE)
+_STOPS_BRACKET_PATTERN = re.compile(r"\[([^\]]+)\]")
+_STOPS_SPLIT = re.compile(r'[,;]|,\s+and\s+')
+_STOPS_BRACKET_SPLIT = re.compile(r'[,;]')
+
+ACTION_VERBS = ('show', 'list', 'display', 'get', 'check', 'find', 'remove', 'delete', 'unassign', 'assign', 'allocate', 'add', 'create', 'update', 'optimize')
+_VERB_PATTERN = re.compile(r'\b(' + '|'.join(ACTION_VERBS) + r')\b')
+
+@lru_cache(maxsize=64)
+def _keyword_value_pattern(keyword: str):
+    return re.compile(rf"{keyword}\s+['\"]?(\w[\w\s\-\.]*?)['\"]?(?:\s+(?:from|to|at|in|for|with|and|or)|$)", re.IGNORECASE)
+
+def extract_quoted_string(text: str, after_keywords: List[str] = None) -> Optional[str]:
+    for pattern in _QUOTED_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            return match.group(1).strip()
+
+    if after_keywords:
+        for keyword in after_keywords:
+            match = _keyword_value_pattern(keyword).search(text)
+            if match:
+                value = match.group(1).strip()
+                if value and len(value) > 1:
+                    return value
+
+    keywords = {k.lower() for k in (after_keywords or [])}
+    words = text.split()
+    for i, word in enumerate(words):
+        if word.lower() in keywords:
+            if i + 1 < len(words):
+                potential_value = ' '.join(words[i+1:i+4]).strip()
+                if potential_value and len(potential_value) > 1:
+                    return potential_value.rstrip('.,;')
+    return None
+
+def extract_license_plate(text: str) -> Optional[str]:
+    for pattern in _PLATE_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            plate = match.group(1).strip().upper()
+            if plate and len(plate) > 3:
+                return plate
+
+    plate = entity_index.find('vehicles', text)
+    return plate.upper() if plate else None
+
+def extract_driver_name(text: str) -> Optional[str]:
+    for pattern in _DRIVER_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            name = match.group(1).strip()
+            if name and len(name) > 1:
+                return name
+
+    extracted = extract_quoted_string(text, ["named", "driver"])
+    if extracted:
+        return extracted
+
+    return entity_index.find('drivers', text) or entity_index.find_containing('drivers', text)
+
+def extract_trip_identifier(text: str) -> Optional[str]:
+    for pattern in _TRIP_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            return match.group(1).strip()
+
+    return entity_index.find('trips', text)
+
+# "... on 2025-11-16", "... tomorrow": the day a trip runs, and the text with
+# that phrase cut out so it is not read as part of the trip's name.
+def extract_trip_date(text: str) -> Tuple[Optional[str], str]:
+    match = _TRIP_DATE_PATTERN.search(text)
+    if not match:
+        return None, text
+    day = match.group(1).lower()
+    if day in _RELATIVE_DAYS:
+        day = (datetime.date.today() + datetime.timedelta(days=_RELATIVE_DAYS[day])).isoformat()
+    return day, f"{text[:match.start()].rstrip()} {text[match.end():].lstrip()}".strip()
+
+def extract_path_name(text: str) -> Optional[str]:
+    for pattern in _PATH_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            result = match.group(1).strip()
+            if result:
+                return result
+
+    return entity_index.find('paths', text)
+
+def extract_stops_list(text: str) -> Optional[List[str]]:
+    match = _STOPS_LIST_PATTERN.search(text)
+    if match:
+        stops_str = match.group(1)
+        return [s.strip() for s in _STOPS_SPLIT.split(stops_str) if s.strip()]
+
+    match = _STOPS_BRACKET_PATTERN.search(text)
+    if match:
+        stops_str = match.group(1)
+        return [s.strip() for s in _STOPS_BRACKET_SPLIT.split(stops_str) if s.strip()]
+
+    return None
+
+def extract_route_name(text: str) -> Optional[str]:
+    for pattern in _ROUTE_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            route_name = match.group(1).strip()
+            if route_name:
+                return route_name
+
+    return entity_index.find('routes', text)
+
+def get_sample_vehicle_config() -> Dict[str, Any]:
+    vehicles = get_all_vehicles()
+    if vehicles:
+        try:
+            capacity = int(vehicles[0]['capacity']) if 'capacity' in vehicles[0] else 50
+        except (KeyError, TypeError, ValueError):
+            capacity = 50
+        try:
+            model = vehicles[0]['model']
+        except (KeyError, TypeError):
+            model = 'Standard Bus'
+        return {
+            'capacity': capacity,
+            'model': model
+        }
+    return {'capacity': 50, 'model': 'Standard Bus'}
+
+# Slot fillers run only for the rule that matched. Returning None lets the
+# classifier fall through to the next rule.
+
+# Wraps a trip slot filler: the date, if any, is taken out of the text first
+# and passed along as params['date'].
+def _dated(slots):
+    def fill(text):
+        day, rest = extract_trip_date(text)
+        params = slots(rest)
+        return dict(params, date=day) if params is not None and day else params
+    return fill
+
+def _remove_vehicle_slots(text):
+    trip_name = extract_trip_identifier(text)
+    return {'trip_name': trip_name} if trip_name else None
+
+def _delete_stop_slots(text):
+    name = extract_quoted_string(text, ["stop", "called", "named"])
+    return {'name': name} if name else None
+
+# "remove stop X from path Y" edits a path rather than deleting it.
+def _delete_path_slots(text):
+    if 'stop' in text.lower():
+        return None
+    name = extract_path_name(text)
+    return {'name': name} if name else None
+
+# "delete the vehicle from trip X" is an unassignment, not a deletion.
+def _delete_vehicle_slots(text):
+    if 'trip' in text.lower():
+        return None
+    license_plate = extract_license_plate(text)
+    return {'license_plate': license_plate} if license_plate else None
+
+def _delete_driver_slots(text):
+    if 'trip' in text.lower():
+        return None
+    name = extract_driver_name(text)
+    return {'name': name} if name else None
+
+_RADIUS_PATTERN = re.compile(r'\b(?:within|in|under)\s+(\d+(?:\.\d+)?)\s*(km|kilomet(?:er|re)s?|m|met(?:er|re)s?)\b', re.IGNORECASE)
+_COORDINATES_PATTERN = re.compile(r'(-?\d{1,2}\.\d+)\s*,\s*(-?\d{1,3}\.\d+)')
+# "3 nearest" or "nearest 3"; a number that is the start of a coordinate
+# ("nearest 12.97, 77.59") is not a count.
+_NEAREST_PATTERN = re.compile(r'\b(?:(\d{1,2})\s+)?(?:nearest|closest)\b(?:\s+(\d{1,2})\b(?!\.\d|,\s*-?\d))?', re.IGNORECASE)
+
+# Where a geo query is centred: "12.97, 77.59" or a stop name.
+def _geo_origin(text):
+    match = _COORDINATES_PATTERN.search(text)
+    if match:
+        return {'lat': float(match.group(1)), 'lng': float(match.group(2))}
+    stop = entity_index.find('stops', text) or extract_quoted_string(text, ['of', 'to', 'near'])
+    return {'stop': stop.rstrip('?!. ')} if stop else None
+
+def _stops_within_slots(text):
+    match = _RADIUS_PATTERN.search(text)
+    origin = _geo_origin(text) if match else None
+    if not origin:
+        return None
+    radius = float(match.group(1)) * (1000 if match.group(2).lower().startswith('k') else 1)
+    return dict(origin, radius_m=radius)
+
+def _nearest_stops_slots(text):
+    match = _NEAREST_PATTERN.search(text)
+    origin = _geo_origin(text) if match else None
+    if not origin:
+        return None
+    count = match.group(1) or match.group(2)
+    return dict(origin, k=int(count) if count else (5 if 'stops' in text.lower() else 1))
+
+def _assign_slots(text):
+    vehicle = extract_license_plate(text)
+    driver = extract_driver_name(text)
+    trip = extract_trip_identifier(text)
+    if vehicle or driver or trip:
+        return {'vehicle': vehicle, 'driver': driver, 'trip': trip}
+    return None
+
+_CLAUSE_SPLIT = re.compile(r'[;\n]+')
+
+# "assign trip A to vehicle X and driver Y; trip B to ..." -- one clause per
+# trip, resolved through the entity index so names need no quoting.
+def _bulk_assign_slots(text):
+    clauses = [clause.strip() for clause in _CLAUSE_SPLIT.split(text) if clause.strip()]
+    if len(clauses) < 2:
+        return None
+    assignments = []
+    for clause in clauses:
+        day, rest = extract_trip_date(clause)
+        assignments.append({
+            'clause': clause,
+            'trip': entity_index.find('trips', rest),
+            'date': day,
+            'vehicle': entity_index.find('vehicles', clause),
+            'driver': entity_index.find('drivers', clause),
+        })
+    if sum(1 for item in assignments if item['trip']) < 2:
+        return None
+    return {'assignments': assignments}
+
+_DATE_PATTERN = re.compile(r'\b(\d{4}-\d{2}-\d{2})\b')
+
+def _optimize_slots(text):
+    match = _DATE_PATTERN.search(text)
+    return {'date': match.group(1) if match else None}
+
+def _create_stop_slots(text):
+    stop_name = extract_quoted_string(text, ["called", "named", "stop"])
+    return {"name": stop_name or "New Stop", "lat": 0.0, "lng": 0.0}
+
+def _create_path_slots(text):
+    path_name = extract_quoted_string(text, ["called", "named", "path"])
+    return {"name": path_name or "New Path"}
+
+def _create_vehicle_slots(text):
+    license_plate = extract_license_plate(text)
+    vehicle_config = get_sample_vehicle_config()
+    return {"license_plate": license_plate or "XX-XX-XXXX", "capacity": vehicle_config['capacity'], "model": vehicle_config['model']}
+
+def _create_driver_slots(text):
+    driver_name = extract_driver_name(text)
+    return {"name": driver_name or "New Driver", "license": "DL0000000", "phone": "9000000000"}
+
+def _path_name_slots(text):
+    path_name = extract_path_name(text)
+    return {'path_name': path_name} if path_name else None
+
+def _route_name_slots(text):
+    route_name = entity_index.find('routes', text) or extract_route_name(text)
+    return {'route_name': route_name} if route_name else None
+
+def _trip_status_slots(text):
+    trip_name = entity_index.find('trips', text) or extract_quoted_string(text)
+    return {'trip_name': trip_name} if trip_name else None
+
+def _no_slots(text):
+    return {}
+
+
+class IntentRule(NamedTuple):
+    action: str
+    verbs: Optional[FrozenSet[str]]
+    all_of: FrozenSet[str] = frozenset()
+    any_of: FrozenSet[str] = frozenset()
+    entity: Optional[str] = None
+    slots: Callable[[str], Optional[dict]] = _no_slots
+
+
+class Intent(NamedTuple):
+    action: Optional[str]
+    params: dict
+    verb: str
+    entity: Optional[str]
+
+
+REMOVE_VERBS = frozenset({'remove', 'delete', 'unassign'})
+DELETE_VERBS = frozenset({'remove', 'delete'})
+ASSIGN_VERBS = frozenset({'assign', 'allocate'})
+CREATE_VERBS = frozenset({'create', 'add'})
+VIEW_VERBS = frozenset({'list', 'show', 'display', 'get'})
+STATUS_VERBS = VIEW_VERBS | {'check', 'find'}
+
+# (keyword, entity) in detection priority order; the first keyword present is the entity.
+ENTITY_KEYWORDS = (
+    ('vehicle', 'vehicles'),
+    ('driver', 'drivers'),
+    ('trip', 'trips'),
+    ('route', 'routes'),
+    ('path', 'paths'),
+    ('stop', 'stops'),
+    ('deployment', 'deployments'),
+    ('assignment', 'deployments'),
+)
+
+KEYWORDS = frozenset(keyword for keyword, _ in ENTITY_KEYWORDS) | {'unassigned', 'available', 'free', 'status'}
+
+_AVAILABILITY = frozenset({'unassigned', 'available', 'free'})
+
+# Evaluated top to bottom; the first rule whose verb/keyword conditions hold
+# and whose slot filler succeeds wins.
+INTENT_RULES = (
+    # "remove" on a vehicle or driver usually means unassigning it, so only
+    # an explicit "delete" deletes them.
+    IntentRule('delete_vehicle', frozenset({'delete'}), all_of=frozenset({'vehicle'}), entity='vehicles', slots=_delete_vehicle_slots),
+    IntentRule('delete_driver', frozenset({'delete'}), all_of=frozenset({'driver'}), entity='drivers', slots=_delete_driver_slots),
+    IntentRule('delete_path', DELETE_VERBS, all_of=frozenset({'path'}), entity='paths', slots=_delete_path_slots),
+    IntentRule('delete_stop', DELETE_VERBS, all_of=frozenset({'stop'}), entity='stops', slots=_delete_stop_slots),
+    IntentRule('remove_vehicle_from_trip_by_name', REMOVE_VERBS, all_of=frozenset({'vehicle'}), slots=_dated(_remove_vehicle_slots)),
+    IntentRule('optimize_assignments', frozenset({'optimize'}), slots=_optimize_slots),
+    IntentRule('optimize_assignments', ASSIGN_VERBS, all_of=frozenset({'trip', 'unassigned'}), slots=_optimize_slots),
+    IntentRule('bulk_assign_vehicle_driver', ASSIGN_VERBS, all_of=frozenset({'trip'}), slots=_bulk_assign_slots),
+    IntentRule('assign_vehicle_driver', ASSIGN_VERBS, all_of=frozenset({'trip'}), any_of=frozenset({'vehicle', 'driver'}), slots=_dated(_assign_slots)),
+    IntentRule('create_stop', CREATE_VERBS, all_of=frozenset({'stop'}), slots=_create_stop_slots),
+    IntentRule('create_path', CREATE_VERBS, all_of=frozenset({'path'}), slots=_create_path_slots),
+    IntentRule('create_vehicle', CREATE_VERBS, all_of=frozenset({'vehicle'}), slots=_create_vehicle_slots),
+    IntentRule('create_driver', CREATE_VERBS, all_of=frozenset({'driver'}), slots=_create_driver_slots),
+    IntentRule('get_unassigned_vehicles', None, all_of=frozenset({'vehicle'}), any_of=_AVAILABILITY),
+    IntentRule('get_unassigned_drivers', None, all_of=frozenset({'driver'}), any_of=_AVAILABILITY),
+    IntentRule('get_trip_status_by_name', STATUS_VERBS, all_of=frozenset({'status', 'trip'}), slots=_dated(_trip_status_slots)),
+    IntentRule('list_stops_for_route', VIEW_VERBS, all_of=frozenset({'stop', 'route'}), slots=_route_name_slots),
+    IntentRule('list_stops_for_path', VIEW_VERBS, all_of=frozenset({'stop', 'path'}), slots=_path_name_slots),
+    IntentRule('stops_within_radius', STATUS_VERBS, all_of=frozenset({'stop'}), entity='stops', slots=_stops_within_slots),
+    IntentRule('nearest_stops', STATUS_VERBS, all_of=frozenset({'stop'}), entity='stops', slots=_nearest_stops_slots),
+    IntentRule('list_all_vehicles', VIEW_VERBS, entity='vehicles'),
+    IntentRule('list_all_drivers', VIEW_VERBS, entity='drivers'),
+    IntentRule('list_all_trips', VIEW_VERBS, entity='trips'),
+    IntentRule('list_all_stops', VIEW_VERBS, entity='stops'),
+    IntentRule('list_routes_using_path', VIEW_VERBS, all_of=frozenset({'path'}), entity='routes', slots=_path_name_slots),
+    IntentRule('list_all_routes', VIEW_VERBS, entity='routes'),
+    IntentRule('list_all_paths', VIEW_VERBS, entity='paths'),
+    IntentRule('list_all_deployments', VIEW_VERBS, entity='deployments'),
+)
+
+_KEYWORD_PATTERN = re.compile('|'.join(sorted(KEYWORDS, key=len, reverse=True)))
+_ENTITIES = (None,) + tuple(dict.fromkeys(name for _, name in ENTITY_KEYWORDS))
+
+# Rules are compiled into a (verb, entity) dispatch table of plain tuples so
+# a message only tests the handful of rules that can apply to it.
+def compile_rules(rules):
+    table = {}
+    for verb in ACTION_VERBS:
+        for entity in _ENTITIES:
+            table[(verb, entity)] = tuple(
+                (rule.all_of, rule.any_of, rule.slots, rule.action)
+                for rule in rules
+                if (rule.verbs is None or verb in rule.verbs)
+                and (rule.entity is None or rule.entity == entity)
+            )
+    return table
+
+_COMPILED_RULES = compile_rules(INTENT_RULES)
+
+def classify_intent(text: str, compiled=None) -> Intent:
+    text_lower = text.lower()
+    verb_match = _VERB_PATTERN.search(text_lower)
+    verb = verb_match.group(1) if verb_match else 'show'
+    present = frozenset(_KEYWORD_PATTERN.findall(text_lower))
+    entity = None
+    if present:
+        for keyword, name in ENTITY_KEYWORDS:
+            if keyword in present:
+                entity = name
+                break
+
+    for all_of, any_of, slots, action in (compiled or _COMPILED_RULES)[(verb, entity)]:
+        if all_of <= present and (not any_of or not any_of.isdisjoint(present)):
+            params = slots(text)
+            if params is not None:
+                return Intent(action, params, verb, entity)
+
+    return Intent(None, {}, verb, entity)
+
+def detect_action_intent(text: str) -> tuple:
+    intent = classify_intent(text)
+    return (intent.action, intent.params)
@@ -0,0 +1,330 @@
+import base64
+import json
+from typing import Dict, NamedTuple, Tuple
+
+from config import config
+from db import pool
+from instrumentation import record_rows
+from path_geometry import annotate, arrival_time, cached_totals
+
+
+class Listing(NamedTuple):
+    source: str
+    columns: Dict[str, str]
+    keyset: Tuple[str, ...]
+    filters: Dict[str, str]
+
+
+# Each listing maps request filters to SQL predicates (one '?' each, or none
+# for boolean flags) and pages over a unique keyset ending in the primary key.
+LISTINGS = {
+    'vehicles': Listing(
+        source='FROM vehicles v',
+        columns={
+            'id': 'v.id', 'license_plate': 'v.license_plate', 'type': 'v.type',
+            'capacity': 'v.capacity', 'model': 'v.model',
+        },
+        keyset=('v.id',),
+        filters={
+            'type': 'v.type = ?',
+            'unassigned': 'NOT EXISTS (SELECT 1 FROM deployments d WHERE d.vehicle_id = v.id)',
+        },
+    ),
+    'drivers': Listing(
+        source='FROM drivers dr',
+        columns={
+            'id': 'dr.id', 'name': 'dr.name', 'license_number': 'dr.license_number', 'phone': 'dr.phone',
+        },
+        keyset=('dr.id',),
+        filters={
+            'unassigned': 'NOT EXISTS (SELECT 1 FROM deployments d WHERE d.driver_id = dr.id)',
+        },
+    ),
+    'stops': Listing(
+        source='FROM stops s',
+        columns={'id': 's.id', 'name': 's.name', 'latitude': 's.latitude', 'longitude': 's.longitude'},
+        keyset=('s.id',),
+        filters={'name': 's.name = ?'},
+    ),
+    'paths': Listing(
+        source='FROM paths p',
+        columns={'id': 'p.id', 'name': 'p.name'},
+        keyset=('p.id',),
+        filters={'name': 'p.name = ?'},
+    ),
+    'routes': Listing(
+        source='FROM routes r JOIN paths p ON r.path_id = p.id',
+        columns={
+            'id': 'r.id', 'path_id': 'r.path_id', 'route_display_name': 'r.route_display_name',
+            'shift_time': 'r.shift_time', 'direction': 'r.direction', 'start_point': 'r.start_point',
+            'end_point': 'r.end_point', 'status': 'r.status', 'path_name': 'p.name',
+        },
+        keyset=("COALESCE(r.shift_time, '')", 'r.id'),
+        filters={
+            'status': 'r.status = ?',
+            'path_id': 'r.path_id = ?',
+            'path': 'p.name = ?',
+        },
+    ),
+    # trips and deployments page over the trigger-maintained views (views.py).
+    'trips': Listing(
+        source='FROM trip_view tv',
+        columns={
+            'id': 'tv.id', 'route_id': 'tv.route_id', 'display_name': 'tv.display_name',
+            'booking_status_percentage': 'tv.booking_status_percentage', 'live_status': 'tv.live_status',
+            'date': 'tv.date', 'route_name': 'tv.route_name', 'shift_time': 'tv.shift_time',
+            'path_name': 'tv.path_name',
+        },
+        keyset=("COALESCE(tv.date, '')", "COALESCE(tv.shift_time, '')", 'tv.id'),
+        filters={
+            'date': 'tv.date = ?',
+            'live_status': 'tv.live_status = ?',
+            'route_id': 'tv.route_id = ?',
+            'route': 'tv.route_name = ?',
+            'unassigned': 'NOT EXISTS (SELECT 1 FROM deployments d WHERE d.trip_id = tv.id)',
+        },
+    ),
+    'deployments': Listing(
+        source='FROM deployment_view dv',
+        columns={
+            'id': 'dv.id', 'trip_id': 'dv.trip_id', 'vehicle_id': 'dv.vehicle_id', 'driver_id': 'dv.driver_id',
+            'license_plate': 'dv.license_plate', 'vehicle_type': 'dv.vehicle_type', 'capacity': 'dv.capacity',
+            'model': 'dv.model', 'driver_name': 'dv.driver_name', 'license_number': 'dv.license_number',
+            'phone': 'dv.phone', 'trip_display_name': 'dv.trip_display_name',
+            'booking_status_percentage': 'dv.booking_status_percentage', 'live_status': 'dv.live_status',
+            'date': 'dv.date', 'route_name': 'dv.route_name',
+        },
+        keyset=("COALESCE(dv.date, '')", "COALESCE(dv.shift_time, '')", 'dv.id'),
+        filters={
+            'date': 'dv.date = ?',
+            'live_status': 'dv.live_status = ?',
+            'route_id': 'dv.route_id = ?',
+            'route': 'dv.route_name = ?',
+            'vehicle_type': 'dv.vehicle_type = ?',
+        },
+    ),
+}
+
+TRUE_VALUES = ('1', 'true', 'yes', 'on')
+
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError('Invalid cursor')
+    return values
+
+
+def parse_fields(listing, fields):
+    if not fields:
+        return list(listing.columns)
+    names = [name.strip() for name in fields.split(',') if name.strip()]
+    unknown = [name for name in names if name not in listing.columns]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    return names
+
+
+def build_query(name, filters=None, fields=None, limit=None, cursor=None):
+    listing = LISTINGS[name]
+    selected = parse_fields(listing, fields)
+    select = [f'{listing.columns[field]} AS {field}' for field in selected]
+    select += [f'{expr} AS _k{i}' for i, expr in enumerate(listing.keyset)]
+
+    where = []
+    params = []
+    for key, value in (filters or {}).items():
+        if value is None or value == '':
+            continue
+        if key not in listing.filters:
+            raise ValueError(f"Unknown filter '{key}' for {name}")
+        predicate = listing.filters[key]
+        if '?' in predicate:
+            where.append(predicate)
+            params.append(value)
+        elif str(value).lower() in TRUE_VALUES:
+            where.append(predicate)
+
+    if cursor:
+        values = decode_cursor(cursor, len(listing.keyset))
+        where.append(f"({', '.join(listing.keyset)}) > ({', '.join('?' for _ in values)})")
+        params.extend(values)
+
+    sql = f"SELECT {', '.join(select)} {listing.source}"
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += ' ORDER BY ' + ', '.join(listing.keyset)
+    if limit is not None:
+        sql += ' LIMIT ?'
+        params.append(limit + 1)
+    return sql, params, selected
+
+
+def parse_limit(limit):
+    if limit in (None, ''):
+        return None
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise ValueError('limit must be an integer')
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    return min(limit, config.API_MAX_PAGE_SIZE)
+
+
+def list_rows(name, filters=None, fields=None, limit=None, cursor=None):
+    limit = parse_limit(limit)
+    sql, params, selected = build_query(name, filters, fields, limit, cursor)
+    keyset_size = len(LISTINGS[name].keyset)
+    with pool.acquire() as conn:
+        rows = conn.execute(sql, params).fetchall()
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last[f'_k{i}'] for i in range(keyset_size))
+    items = [{field: row[field] for field in selected} for row in rows]
+    return items, next_cursor
+
+
+# Current rows of a listing for the given ids, in the listing's usual shape;
+# ids that no longer match are simply absent.
+def rows_by_id(name, ids):
+    listing = LISTINGS[name]
+    select = ', '.join(f'{expr} AS {field}' for field, expr in listing.columns.items())
+    sql = f"SELECT {select} {listing.source} WHERE {listing.columns['id']} IN (SELECT value FROM json_each(?))"
+    with pool.acquire() as conn:
+        items = [dict(row) for row in conn.execute(sql, (json.dumps(list(ids)),))]
+        if name == 'paths':
+            attach_stops(conn, items)
+    return items
+
+
+# rows are (path_id, stop_id, name, latitude, longitude, order_index) ordered
+# by path then order; one pass, keeping the first occurrence of each stop.
+def _group_stops(rows, by_id):
+    current = None
+    stops = seen = None
+    count = 0
+    for path_id, stop_id, name, latitude, longitude, order_index in rows:
+        count += 1
+        if path_id != current:
+            current = path_id
+            item = by_id.get(path_id)
+            stops = item['stops'] if item is not None else None
+            seen = set()
+        if stops is None or stop_id in seen:
+            continue
+        seen.add(stop_id)
+        stops.append({
+            'id': stop_id,
+            'name': name,
+            'latitude': latitude,
+            'longitude': longitude,
+            'order': order_index,
+        })
+    record_rows(count)
+
+
+def attach_stops(conn, items):
+    by_id = {item['id']: item for item in items}
+    for item in items:
+        item['stops'] = []
+    if not by_id:
+        return items
+    placeholders = ', '.join('?' for _ in by_id)
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute(f'''
+        SELECT ps.path_id, s.id, s.name, s.latitude, s.longitude, ps.order_index
+        FROM path_stops ps
+        JOIN stops s ON s.id = ps.stop_id
+        WHERE ps.path_id IN ({placeholders})
+        ORDER BY ps.path_id, ps.order_index
+    ''', list(by_id))
+    _group_stops(cursor, by_id)
+    return annotate(items)
+
+
+# Every path with its ordered stops: three sequential scans (path_stops in
+# covering-index order) joined through a stop dictionary, linear in rows.
+def paths_with_stops():
+    with pool.acquire() as conn:
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        items = [{'id': path_id, 'name': name, 'stops': []} for path_id, name in cursor.execute('SELECT id, name FROM paths ORDER BY id')]
+        stops = {row[0]: row[1:] for row in cursor.execute('SELECT id, name, latitude, longitude FROM stops')}
+        record_rows(len(items) + len(stops))
+        links = cursor.execute('SELECT path_id, stop_id, order_index FROM path_stops ORDER BY path_id, order_index')
+        _group_stops(
+            ((path_id, stop_id) + stops[stop_id] + (order_index,) for path_id, stop_id, order_index in links if stop_id in stops),
+            {item['id']: item for item in items},
+        )
+    return annotate(items)
+
+
+# Adds each route's path length, travel time and arrival (shift_time plus
+# duration). Paths not in the geometry cache have their stops loaded once.
+def attach_path_totals(conn, routes):
+    path_ids = {route['path_id'] for route in routes if route.get('path_id') is not None}
+    totals = cached_totals(path_ids)
+    missing = [{'id': path_id} for path_id in path_ids if path_id not in totals]
+    if missing:
+        for item in attach_stops(conn, missing):
+            totals[item['id']] = (item['length_m'], item['duration_s'])
+    for route in routes:
+        length, duration = totals.get(route.get('path_id'), (None, None))
+        route['path_length_m'] = length
+        route['path_duration_s'] = duration
+        route['estimated_arrival'] = arrival_time(route.get('shift_time'), duration) if duration is not None else None
+    return routes
+
+
+def count_rows(name, filters=None):
+    sql, params, _ = build_query(name, filters, fields='id')
+    with pool.acquire() as conn:
+        return conn.execute(f'SELECT COUNT(*) FROM ({sql})', params).fetchone()[0]
+
+
+# Yields lists of row dicts straight off one cursor. The pooled connection is
+# held until the generator is exhausted or closed, so consume it on a single
+# thread.
+def iter_rows(name, filters=None, fields=None, batch_size=200):
+    sql, params, selected = build_query(name, filters, fields)
+    with pool.acquire() as conn:
+        cursor = conn.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            items = [{field: row[field] for field in selected} for row in rows]
+            if name == 'paths':
+                attach_stops(conn, items)
+            yield items
+
+
+PATH_FIELDS = ('id', 'name', 'stops', 'length_m', 'duration_s')
+
+
+def list_paths(filters=None, fields=None, limit=None, cursor=None):
+    wanted = [name.strip() for name in fields.split(',') if name.strip()] if fields else None
+    if wanted is not None:
+        unknown = [name for name in wanted if name not in PATH_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    items, next_cursor = list_rows('paths', filters, 'id,name', limit, cursor)
+    if wanted is None or not {'stops', 'length_m', 'duration_s'}.isdisjoint(wanted):
+        with pool.acquire() as conn:
+            attach_stops(conn, items)
+    if wanted is not None:
+        items = [{field: item[field] for field in wanted} for item in items]
+    return items, next_cursor
@@ -0,0 +1,538 @@
+import sys
+import time
+
+from db import pool
+
+
+def _column_exists(conn, table, column):
+    return any(row[1] == column for row in conn.execute(f"PRAGMA table_info({table})"))
+
+
+def _add_missing_columns(conn, table, columns):
+    for column, definition in columns:
+        if not _column_exists(conn, table, column):
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+
+def baseline_schema(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS stops (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        latitude REAL,
+        longitude REAL
+    )''')
+
+    conn.execute('''CREATE TABLE IF NOT EXISTS paths (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL
+    )''')
+
+    conn.execute('''CREATE TABLE IF NOT EXISTS path_stops (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        path_id INTEGER,
+        stop_id INTEGER,
+        order_index INTEGER,
+        FOREIGN KEY (path_id) REFERENCES paths(id),
+        FOREIGN KEY (stop_id) REFERENCES stops(id)
+    )''')
+
+    conn.execute('''CREATE TABLE IF NOT EXISTS routes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        path_id INTEGER,
+        route_display_name TEXT,
+        shift_time TEXT,
+        direction TEXT,
+        start_point TEXT,
+        end_point TEXT,
+        status TEXT DEFAULT 'active',
+        FOREIGN KEY (path_id) REFERENCES paths(id)
+    )''')
+
+    conn.execute('''CREATE TABLE IF NOT EXISTS vehicles (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        license_plate TEXT UNIQUE,
+        type TEXT,
+        capacity INTEGER,
+        model TEXT
+    )''')
+
+    conn.execute('''CREATE TABLE IF NOT EXISTS drivers (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT,
+        license_number TEXT,
+        phone TEXT
+    )''')
+
+    conn.execute('''CREATE TABLE IF NOT EXISTS daily_trips (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        route_id INTEGER,
+        display_name TEXT,
+        booking_status_percentage REAL,
+        live_status TEXT,
+        date TEXT,
+        FOREIGN KEY (route_id) REFERENCES routes(id)
+    )''')
+
+    conn.execute('''CREATE TABLE IF NOT EXISTS deployments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        trip_id INTEGER UNIQUE,
+        vehicle_id INTEGER,
+        driver_id INTEGER,
+        FOREIGN KEY (trip_id) REFERENCES daily_trips(id),
+        FOREIGN KEY (vehicle_id) REFERENCES vehicles(id),
+        FOREIGN KEY (driver_id) REFERENCES drivers(id)
+    )''')
+
+    # Databases created before these columns existed get them once, here,
+    # instead of probing table_info on every startup.
+    _add_missing_columns(conn, 'routes', [
+        ('route_display_name', 'TEXT'),
+        ('shift_time', 'TEXT'),
+        ('direction', 'TEXT'),
+        ('start_point', 'TEXT'),
+        ('end_point', 'TEXT'),
+        ('status', "TEXT DEFAULT 'active'"),
+    ])
+    _add_missing_columns(conn, 'vehicles', [('type', 'TEXT')])
+    _add_missing_columns(conn, 'daily_trips', [
+        ('display_name', 'TEXT'),
+        ('booking_status_percentage', 'REAL'),
+        ('live_status', 'TEXT'),
+    ])
+
+
+def lookup_indexes(conn):
+    # Name lookups: equality and case-insensitive prefix LIKE can use these.
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_stops_name ON stops(name)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_paths_name ON paths(name)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_drivers_name ON drivers(name COLLATE NOCASE)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_vehicles_plate_nocase ON vehicles(license_plate COLLATE NOCASE)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_trips_display_name ON daily_trips(display_name COLLATE NOCASE)')
+    # Path -> stops in order, covering the stop id so the join never touches the table.
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_path_stops_path_order ON path_stops(path_id, order_index, stop_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_path_stops_stop ON path_stops(stop_id, path_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_routes_path ON routes(path_id, shift_time)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_trips_route ON daily_trips(route_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_trips_date_status ON daily_trips(date, live_status)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_deployments_vehicle ON deployments(vehicle_id, trip_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_deployments_driver ON deployments(driver_id, trip_id)')
+    conn.execute('ANALYZE')
+
+
+# Steps 3 and later carry their own copies of the tables, columns and SQL
+# they were written against, so editing a runtime module never changes what
+# an old migration builds. Change the schema with a new migration instead.
+
+# kind -> (table, name column, rowid tag), as in search.SEARCH_SOURCES.
+_V3_SEARCH_SOURCES = (
+    ('trips', 'daily_trips', 'display_name', 1),
+    ('routes', 'routes', 'route_display_name', 2),
+    ('vehicles', 'vehicles', 'license_plate', 3),
+    ('drivers', 'drivers', 'name', 4),
+    ('paths', 'paths', 'name', 5),
+    ('stops', 'stops', 'name', 6),
+)
+# Trip, vehicle and driver names already have NOCASE indexes (step 2).
+_V3_NOCASE_INDEXED = ('routes', 'paths', 'stops')
+
+
+def search_index(conn):
+    conn.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+        name, kind UNINDEXED, entity_id UNINDEXED, tokenize = 'trigram'
+    )''')
+    conn.execute('DELETE FROM search_index')
+    for kind, table, column, tag in _V3_SEARCH_SOURCES:
+        if kind in _V3_NOCASE_INDEXED:
+            conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_{column}_nocase ON {table}({column} COLLATE NOCASE)')
+        conn.execute(f'''INSERT INTO search_index (rowid, name, kind, entity_id)
+            SELECT id * 8 + {tag}, {column}, '{kind}', id FROM {table}''')
+        conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_search_{table}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO search_index (rowid, name, kind, entity_id) VALUES (new.id * 8 + {tag}, new.{column}, '{kind}', new.id);
+        END''')
+        conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_search_{table}_ad AFTER DELETE ON {table} BEGIN
+            DELETE FROM search_index WHERE rowid = old.id * 8 + {tag};
+        END''')
+        conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_search_{table}_au AFTER UPDATE OF id, {column} ON {table} BEGIN
+            DELETE FROM search_index WHERE rowid = old.id * 8 + {tag};
+            INSERT INTO search_index (rowid, name, kind, entity_id) VALUES (new.id * 8 + {tag}, new.{column}, '{kind}', new.id);
+        END''')
+
+
+_V4_TABLES = ('stops', 'paths', 'path_stops', 'routes', 'vehicles', 'drivers', 'daily_trips', 'deployments')
+
+
+def change_counters(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS change_counters (
+        table_name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    )''')
+    conn.executemany('INSERT OR IGNORE INTO change_counters (table_name) VALUES (?)', [(table,) for table in _V4_TABLES])
+    for table in _V4_TABLES:
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_counter_{table}_{event.lower()} AFTER {event} ON {table} BEGIN
+                UPDATE change_counters SET version = version + 1 WHERE table_name = '{table}';
+            END''')
+
+
+def optimizer_plans(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS optimizer_plans (
+        plan_id TEXT PRIMARY KEY,
+        versions TEXT NOT NULL,
+        plan TEXT NOT NULL,
+        created_at REAL NOT NULL
+    )''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_optimizer_plans_created ON optimizer_plans(created_at)')
+
+
+# entity -> (dependent table, referencing column), as in consequences.DEPENDENCIES.
+_V6_DEPENDENCIES = (
+    ('stop', 'path_stops', 'stop_id'),
+    ('path', 'routes', 'path_id'),
+    ('route', 'daily_trips', 'route_id'),
+    ('trip', 'deployments', 'trip_id'),
+    ('vehicle', 'deployments', 'vehicle_id'),
+    ('driver', 'deployments', 'driver_id'),
+)
+
+
+def dependency_counts(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS dependency_counts (
+        entity TEXT NOT NULL,
+        entity_id INTEGER NOT NULL,
+        dependents INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (entity, entity_id)
+    ) WITHOUT ROWID''')
+    conn.execute('DELETE FROM dependency_counts')
+    for entity, table, column in _V6_DEPENDENCIES:
+        conn.execute(f'''INSERT INTO dependency_counts (entity, entity_id, dependents)
+            SELECT '{entity}', {column}, COUNT(*) FROM {table} WHERE {column} IS NOT NULL GROUP BY {column}''')
+        increment = f'''INSERT INTO dependency_counts (entity, entity_id, dependents)
+                SELECT '{entity}', new.{column}, 1 WHERE new.{column} IS NOT NULL
+                ON CONFLICT (entity, entity_id) DO UPDATE SET dependents = dependents + 1;'''
+        decrement = f'''UPDATE dependency_counts SET dependents = dependents - 1
+                WHERE entity = '{entity}' AND entity_id = old.{column};
+            DELETE FROM dependency_counts WHERE entity = '{entity}' AND entity_id = old.{column} AND dependents <= 0;'''
+        conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_deps_{table}_{column}_ai AFTER INSERT ON {table} BEGIN
+            {increment}
+        END''')
+        conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_deps_{table}_{column}_ad AFTER DELETE ON {table} BEGIN
+            {decrement}
+        END''')
+        conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_deps_{table}_{column}_au AFTER UPDATE OF {column} ON {table}
+            WHEN old.{column} IS NOT new.{column} BEGIN
+            {decrement}
+            {increment}
+        END''')
+
+
+# (0, 0) marks a stop without a location, as in geo.has_location.
+_V7_LOCATED = '{row}.latitude IS NOT NULL AND {row}.longitude IS NOT NULL AND NOT ({row}.latitude = 0 AND {row}.longitude = 0)'
+
+
+def stop_index(conn):
+    conn.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS stop_rtree USING rtree(
+        id, min_lat, max_lat, min_lng, max_lng
+    )''')
+    conn.execute('DELETE FROM stop_rtree')
+    conn.execute(f'''INSERT INTO stop_rtree (id, min_lat, max_lat, min_lng, max_lng)
+        SELECT id, latitude, latitude, longitude, longitude FROM stops s WHERE {_V7_LOCATED.format(row='s')}''')
+    insert = '''INSERT OR REPLACE INTO stop_rtree (id, min_lat, max_lat, min_lng, max_lng)
+                SELECT new.id, new.latitude, new.latitude, new.longitude, new.longitude WHERE ''' + _V7_LOCATED.format(row='new') + ';'
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_geo_stops_ai AFTER INSERT ON stops BEGIN
+        {insert}
+    END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS trg_geo_stops_ad AFTER DELETE ON stops BEGIN
+        DELETE FROM stop_rtree WHERE id = old.id;
+    END''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_geo_stops_au AFTER UPDATE OF id, latitude, longitude ON stops BEGIN
+        DELETE FROM stop_rtree WHERE id = old.id;
+        {insert}
+    END''')
+
+
+# conflicts.start_sql(): minutes after midnight of an 'HH:MM' shift, else NULL.
+def _v8_start(column):
+    value = f'trim({column})'
+    return f'''(CASE WHEN {value} GLOB '[0-9]:[0-9][0-9]*' OR {value} GLOB '[0-9][0-9]:[0-9][0-9]*'
+        THEN CAST(substr({value}, 1, instr({value}, ':') - 1) AS INTEGER) * 60
+             + CAST(substr({value}, instr({value}, ':') + 1, 2) AS INTEGER) END)'''
+
+
+_V8_WINDOW_SELECT = f'''SELECT d.id, d.trip_id, d.vehicle_id, d.driver_id, dt.date, {_v8_start('r.shift_time')}
+    FROM deployments d JOIN daily_trips dt ON dt.id = d.trip_id LEFT JOIN routes r ON r.id = dt.route_id'''
+
+
+def deployment_windows(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS deployment_windows (
+        deployment_id INTEGER PRIMARY KEY,
+        trip_id INTEGER NOT NULL,
+        vehicle_id INTEGER,
+        driver_id INTEGER,
+        date TEXT,
+        start_min INTEGER
+    )''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_deployment_windows_vehicle ON deployment_windows(vehicle_id, date, start_min)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_deployment_windows_driver ON deployment_windows(driver_id, date, start_min)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_deployment_windows_date ON deployment_windows(date, start_min)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_deployment_windows_trip ON deployment_windows(trip_id)')
+    conn.execute('DELETE FROM deployment_windows')
+    conn.execute(f'INSERT INTO deployment_windows {_V8_WINDOW_SELECT}')
+    insert = f'INSERT OR REPLACE INTO deployment_windows {_V8_WINDOW_SELECT} WHERE d.id = new.id;'
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_window_deployments_ai AFTER INSERT ON deployments BEGIN
+        {insert}
+    END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS trg_window_deployments_ad AFTER DELETE ON deployments BEGIN
+        DELETE FROM deployment_windows WHERE deployment_id = old.id;
+    END''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_window_deployments_au AFTER UPDATE ON deployments BEGIN
+        DELETE FROM deployment_windows WHERE deployment_id = old.id;
+        {insert}
+    END''')
+    # A trip's window moves with its date, its route and that route's shift.
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_window_daily_trips_au AFTER UPDATE OF id, route_id, date ON daily_trips BEGIN
+        DELETE FROM deployment_windows WHERE trip_id = old.id;
+        INSERT OR REPLACE INTO deployment_windows {_V8_WINDOW_SELECT} WHERE d.trip_id = new.id;
+    END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS trg_window_daily_trips_ad AFTER DELETE ON daily_trips BEGIN
+        DELETE FROM deployment_windows WHERE trip_id = old.id;
+    END''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_window_routes_au AFTER UPDATE OF id, shift_time ON routes BEGIN
+        UPDATE deployment_windows SET start_min = {_v8_start('new.shift_time')}
+        WHERE trip_id IN (SELECT id FROM daily_trips WHERE route_id = new.id);
+    END''')
+
+
+# name -> (select, {base table: (view column, join expression)}, indexes),
+# as in views.VIEWS.
+_V9_VIEWS = {
+    'trip_view': (
+        '''SELECT dt.id, dt.route_id, dt.display_name, dt.booking_status_percentage, dt.live_status, dt.date,
+                r.route_display_name AS route_name, r.shift_time, r.path_id, p.name AS path_name
+            FROM daily_trips dt JOIN routes r ON dt.route_id = r.id JOIN paths p ON r.path_id = p.id''',
+        {
+            'daily_trips': ('id', 'dt.id'),
+            'routes': ('route_id', 'dt.route_id'),
+            'paths': ('path_id', 'r.path_id'),
+        },
+        (
+            "(COALESCE(date, ''), COALESCE(shift_time, ''), id)",
+            '(date, live_status)',
+            '(route_id)',
+            '(path_id)',
+        ),
+    ),
+    'deployment_view': (
+        '''SELECT d.id, d.trip_id, d.vehicle_id, d.driver_id, v.license_plate, v.type AS vehicle_type, v.capacity,
+                v.model, dr.name AS driver_name, dr.license_number, dr.phone, dt.display_name AS trip_display_name,
+                dt.booking_status_percentage, dt.live_status, dt.date, dt.route_id,
+                r.route_display_name AS route_name, r.shift_time
+            FROM deployments d
+            JOIN vehicles v ON d.vehicle_id = v.id
+            JOIN drivers dr ON d.driver_id = dr.id
+            JOIN daily_trips dt ON d.trip_id = dt.id
+            JOIN routes r ON dt.route_id = r.id''',
+        {
+            'deployments': ('id', 'd.id'),
+            'vehicles': ('vehicle_id', 'd.vehicle_id'),
+            'drivers': ('driver_id', 'd.driver_id'),
+            'daily_trips': ('trip_id', 'd.trip_id'),
+            'routes': ('route_id', 'dt.route_id'),
+        },
+        (
+            "(COALESCE(date, ''), COALESCE(shift_time, ''), id)",
+            '(date, live_status)',
+            '(trip_id)',
+            '(vehicle_id)',
+            '(driver_id)',
+            '(route_id)',
+        ),
+    ),
+}
+
+
+def materialized_views(conn):
+    for name, (select, sources, indexes) in _V9_VIEWS.items():
+        conn.execute(f'CREATE TABLE IF NOT EXISTS {name} AS {select} LIMIT 0')
+        conn.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS idx_{name}_id ON {name}(id)')
+        for position, columns in enumerate(indexes):
+            conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{name}_{position} ON {name}{columns}')
+        conn.execute(f'DELETE FROM {name}')
+        conn.execute(f'INSERT INTO {name} {select}')
+        for table, (column, expression) in sources.items():
+            refresh = f'INSERT OR REPLACE INTO {name} {select} WHERE {expression} = new.id;'
+            conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_view_{name}_{table}_ai AFTER INSERT ON {table} BEGIN
+                {refresh}
+            END''')
+            conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_view_{name}_{table}_ad AFTER DELETE ON {table} BEGIN
+                DELETE FROM {name} WHERE {column} = old.id;
+            END''')
+            conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_view_{name}_{table}_au AFTER UPDATE ON {table} BEGIN
+                DELETE FROM {name} WHERE {column} = old.id;
+                {refresh}
+            END''')
+
+
+# (collection, table, key), as in changes.CHANGE_SOURCES.
+_V10_CHANGE_SOURCES = (
+    ('vehicles', 'vehicles', 'id'),
+    ('drivers', 'drivers', 'id'),
+    ('stops', 'stops', 'id'),
+    ('paths', 'paths', 'id'),
+    ('paths', 'path_stops', 'path_id'),
+    ('routes', 'routes', 'id'),
+    ('trips', 'trip_view', 'id'),
+    ('deployments', 'deployment_view', 'id'),
+)
+
+
+def change_log(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS change_log (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        collection TEXT NOT NULL,
+        row_id INTEGER,
+        op TEXT NOT NULL
+    )''')
+    for collection, table, key in _V10_CHANGE_SOURCES:
+        log = "INSERT INTO change_log (collection, row_id, op) VALUES ('{collection}', {row}.{key}, '{op}');"
+        conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_changes_{table}_ai AFTER INSERT ON {table} BEGIN
+            {log.format(collection=collection, row='new', key=key, op='insert')}
+        END''')
+        conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_changes_{table}_ad AFTER DELETE ON {table} BEGIN
+            {log.format(collection=collection, row='old', key=key, op='delete')}
+        END''')
+        conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_changes_{table}_au AFTER UPDATE ON {table} BEGIN
+            INSERT INTO change_log (collection, row_id, op) SELECT '{collection}', old.{key}, 'update' WHERE old.{key} IS NOT new.{key};
+            {log.format(collection=collection, row='new', key=key, op='update')}
+        END''')
+    # Routes show their path's name.
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS trg_changes_paths_routes_au AFTER UPDATE OF name ON paths BEGIN
+        INSERT INTO change_log (collection, row_id, op) SELECT 'routes', id, 'update' FROM routes WHERE path_id = new.id;
+    END''')
+
+
+# Step 3 used to repeat the NOCASE name indexes step 2 already built.
+def drop_duplicate_name_indexes(conn):
+    conn.execute('DROP INDEX IF EXISTS idx_daily_trips_display_name_nocase')
+    conn.execute('DROP INDEX IF EXISTS idx_vehicles_license_plate_nocase')
+    conn.execute('DROP INDEX IF EXISTS idx_drivers_name_nocase')
+
+
+# (version, description, step). Steps must be idempotent; append only.
+MIGRATIONS = [
+    (1, 'baseline schema', baseline_schema),
+    (2, 'lookup and join indexes', lookup_indexes),
+    (3, 'trigram search index', search_index),
+    (4, 'cross-process change counters', change_counters),
+    (5, 'persisted optimizer plans', optimizer_plans),
+    (6, 'dependency counts', dependency_counts),
+    (7, 'stop spatial index', stop_index),
+    (8, 'deployment shift windows', deployment_windows),
+    (9, 'materialized trip and deployment views', materialized_views),
+    (10, 'change log', change_log),
+    (11, 'drop duplicate name indexes', drop_duplicate_name_indexes),
+]
+
+
+def current_version(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        description TEXT,
+        applied_at REAL
+    )''')
+    row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    return row[0] or 0
+
+
+def run_migrations(conn=None):
+    if conn is None:
+        with pool.acquire() as conn:
+            return run_migrations(conn)
+    if conn.in_transaction:
+        conn.commit()
+    applied = []
+    if current_version(conn) >= MIGRATIONS[-1][0]:
+        return applied
+    for version, description, step in MIGRATIONS:
+        # BEGIN IMMEDIATE serialises concurrent workers; re-check under the lock.
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if current_version(conn) >= version:
+                conn.rollback()
+                continue
+            step(conn)
+            conn.execute(
+                'INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)',
+                (version, description, time.time()),
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+        print(f"[OK] Applied migration {version}: {description}")
+    return applied
+
+
+# Query shapes from tools.py that must be answered from an index, never a
+# full table scan.
+PLAN_CHECKS = [
+    ('SELECT id FROM daily_trips WHERE display_name = ?', ('x',)),
+    ('SELECT id, display_name, date FROM daily_trips WHERE display_name = ? COLLATE NOCASE AND date = ?', ('x', 'y')),
+    ('SELECT id FROM vehicles WHERE license_plate = ?', ('x',)),
+    ('SELECT id FROM drivers WHERE name = ? COLLATE NOCASE', ('x',)),
+    ('SELECT id FROM stops WHERE name = ?', ('x',)),
+    ('SELECT booking_status_percentage FROM daily_trips WHERE id = ?', (1,)),
+    ('''SELECT s.name FROM stops s
+        JOIN path_stops ps ON s.id = ps.stop_id
+        JOIN paths p ON ps.path_id = p.id
+        WHERE p.name = ?
+        ORDER BY ps.order_index''', ('x',)),
+    ('''SELECT r.route_display_name, r.shift_time, r.status FROM routes r
+        JOIN paths p ON r.path_id = p.id
+        WHERE p.name = ?''', ('x',)),
+    ('''SELECT COUNT(*) FROM path_stops ps
+        JOIN stops s ON ps.stop_id = s.id
+        WHERE s.name = ?''', ('x',)),
+    ('SELECT id FROM daily_trips WHERE date = ? AND live_status = ?', ('x', 'y')),
+    ('SELECT id FROM daily_trips WHERE route_id = ?', (1,)),
+    ('SELECT trip_id FROM deployments WHERE vehicle_id = ?', (1,)),
+    ('SELECT trip_id FROM deployments WHERE driver_id = ?', (1,)),
+    ('DELETE FROM deployments WHERE trip_id = ?', (1,)),
+    ("SELECT id, display_name FROM daily_trips WHERE display_name LIKE ? ESCAPE '\\' ORDER BY display_name COLLATE NOCASE", ('x%',)),
+    ("SELECT id, license_plate FROM vehicles WHERE license_plate LIKE ? ESCAPE '\\' ORDER BY license_plate COLLATE NOCASE", ('x%',)),
+    ("SELECT id, name FROM drivers WHERE name LIKE ? ESCAPE '\\' ORDER BY name COLLATE NOCASE", ('x%',)),
+    ("SELECT id FROM trip_view ORDER BY COALESCE(date, ''), COALESCE(shift_time, ''), id", ()),
+    ("SELECT id FROM deployment_view ORDER BY COALESCE(date, ''), COALESCE(shift_time, ''), id", ()),
+]
+
+
+def full_scans(conn, checks=PLAN_CHECKS):
+    offenders = []
+    for sql, params in checks:
+        for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params):
+            detail = row[3]
+            if detail.startswith('SCAN ') and ' USING ' not in detail:
+                offenders.append((' '.join(sql.split()), detail))
+    return offenders
+
+
+def assert_no_full_scans(conn=None, checks=PLAN_CHECKS):
+    if conn is None:
+        with pool.acquire() as conn:
+            return assert_no_full_scans(conn, checks)
+    offenders = full_scans(conn, checks)
+    if offenders:
+        lines = '\n'.join(f'  {detail}: {sql}' for sql, detail in offenders)
+        raise AssertionError(f'Full table scans in query plans:\n{lines}')
+
+
+if __name__ == '__main__':
+    run_migrations()
+    with pool.acquire() as conn:
+        print(f"[OK] Schema version {current_version(conn)}")
+        try:
+            assert_no_full_scans(conn)
+            print(f"[OK] {len(PLAN_CHECKS)} query plans use indexes")
+        except AssertionError as exc:
+            print(exc)
+            sys.exit(1)
@@ -0,0 +1,290 @@
+import json
+import time
+import uuid
+from collections import defaultdict
+
+from config import config
+from conflicts import parse_shift
+from db import pool, stored_versions
+from tools import bulk_assign_deployments
+
+# Cost units are seats. An undersized vehicle costs SHORTFALL_PENALTY per
+# missing seat, an oversized one costs one per empty seat, and leaving a trip
+# unfilled always costs more than the worst undersized assignment.
+SHORTFALL_PENALTY = 10
+UNASSIGNED_PENALTY = 100000
+
+PLAN_TABLES = ('daily_trips', 'routes', 'vehicles', 'drivers', 'deployments')
+MAX_PLANS = 32
+
+
+class StalePlanError(Exception):
+    pass
+
+
+class MinCostFlow:
+    def __init__(self, size):
+        self.graph = [[] for _ in range(size)]
+
+    def add_edge(self, u, v, capacity, cost):
+        self.graph[u].append([v, capacity, cost, len(self.graph[v])])
+        self.graph[v].append([u, 0, -cost, len(self.graph[u]) - 1])
+        return self.graph[u][-1]
+
+    # Successive shortest paths (Bellman-Ford on the residual graph),
+    # augmenting by the bottleneck so grouped nodes move many units at once.
+    def solve(self, source, sink):
+        size = len(self.graph)
+        total_flow = total_cost = 0
+        while True:
+            dist = [None] * size
+            previous = [None] * size
+            dist[source] = 0
+            queue = [source]
+            queued = [False] * size
+            queued[source] = True
+            while queue:
+                u = queue.pop()
+                queued[u] = False
+                for index, (v, capacity, cost, _) in enumerate(self.graph[u]):
+                    if capacity > 0 and (dist[v] is None or dist[u] + cost < dist[v]):
+                        dist[v] = dist[u] + cost
+                        previous[v] = (u, index)
+                        if not queued[v]:
+                            queued[v] = True
+                            queue.append(v)
+            if dist[sink] is None:
+                return total_flow, total_cost
+            push = None
+            v = sink
+            while v != source:
+                u, index = previous[v]
+                capacity = self.graph[u][index][1]
+                push = capacity if push is None else min(push, capacity)
+                v = u
+            v = sink
+            while v != source:
+                u, index = previous[v]
+                edge = self.graph[u][index]
+                edge[1] -= push
+                self.graph[v][edge[3]][1] += push
+                v = u
+            total_flow += push
+            total_cost += push * dist[sink]
+
+
+def expected_riders(booking_percentage):
+    return int(round((booking_percentage or 0.0) * config.OPTIMIZER_TRIP_SEATS))
+
+
+def assignment_cost(riders, capacity):
+    capacity = capacity or 0
+    if capacity >= riders:
+        return capacity - riders
+    return SHORTFALL_PENALTY * (riders - capacity)
+
+
+def _overlaps(intervals, start, end):
+    return any(s < end and start < e for s, e in intervals)
+
+
+def _load(date):
+    with pool.acquire() as conn:
+        trip_sql = '''
+            SELECT dt.id, dt.display_name, dt.date, dt.booking_status_percentage, r.shift_time
+            FROM daily_trips dt
+            JOIN routes r ON dt.route_id = r.id
+            WHERE NOT EXISTS (SELECT 1 FROM deployments d WHERE d.trip_id = dt.id)
+        '''
+        params = ()
+        if date:
+            trip_sql += ' AND dt.date = ?'
+            params = (date,)
+        trips = [dict(row) for row in conn.execute(trip_sql, params)]
+        busy = conn.execute('''
+            SELECT dt.date, r.shift_time, d.vehicle_id, d.driver_id
+            FROM deployments d
+            JOIN daily_trips dt ON d.trip_id = dt.id
+            JOIN routes r ON dt.route_id = r.id
+        ''').fetchall()
+        vehicles = [dict(row) for row in conn.execute('SELECT id, license_plate, capacity FROM vehicles ORDER BY id')]
+        drivers = [dict(row) for row in conn.execute('SELECT id, name FROM drivers ORDER BY id')]
+    return trips, busy, vehicles, drivers
+
+
+def _waves(trips):
+    trips = sorted(trips, key=lambda trip: (trip['start'], trip['id']))
+    wave = []
+    for trip in trips:
+        # Every trip in a wave starts before the first one ends, so they all
+        # overlap pairwise and no resource can serve two of them.
+        if wave and trip['start'] >= wave[0]['end']:
+            yield wave
+            wave = []
+        wave.append(trip)
+    if wave:
+        yield wave
+
+
+def _solve_wave(wave, free_vehicles, free_drivers):
+    groups = defaultdict(list)
+    for trip in sorted(wave, key=lambda trip: trip['id']):
+        groups[trip['riders']].append(trip)
+    classes = defaultdict(list)
+    for vehicle in free_vehicles:
+        classes[vehicle['capacity'] or 0].append(vehicle)
+    group_keys = sorted(groups)
+    class_keys = sorted(classes)
+
+    # source -> rider groups -> capacity classes -> driver bottleneck -> sink,
+    # with an unassigned edge from every group straight to the sink.
+    source, bottleneck, sink = 0, 1, 2
+    offset = 3 + len(group_keys)
+    flow = MinCostFlow(offset + len(class_keys))
+    edges = []
+    for gi, riders in enumerate(group_keys):
+        flow.add_edge(source, 3 + gi, len(groups[riders]), 0)
+        flow.add_edge(3 + gi, sink, len(groups[riders]), UNASSIGNED_PENALTY + SHORTFALL_PENALTY * riders)
+        for ci, capacity in enumerate(class_keys):
+            edge = flow.add_edge(3 + gi, offset + ci, len(groups[riders]), assignment_cost(riders, capacity))
+            edges.append((riders, capacity, edge, len(groups[riders])))
+    for ci, capacity in enumerate(class_keys):
+        flow.add_edge(offset + ci, bottleneck, len(classes[capacity]), 0)
+    flow.add_edge(bottleneck, sink, len(free_drivers), 0)
+    flow.solve(source, sink)
+
+    matched = []
+    for riders, capacity, edge, limit in edges:
+        used = limit - edge[1]
+        for _ in range(used):
+            matched.append((groups[riders].pop(0), classes[capacity].pop(0)))
+    # Busiest trips get the least-loaded drivers first.
+    matched.sort(key=lambda pair: (-pair[0]['riders'], pair[0]['id']))
+    pairs = [(trip, vehicle, driver) for (trip, vehicle), driver in zip(matched, free_drivers)]
+    leftover = [trip for riders in group_keys for trip in groups[riders]]
+    return pairs, leftover
+
+
+def build_plan(date=None):
+    started = time.perf_counter()
+    with pool.acquire() as conn:
+        versions = stored_versions(conn, PLAN_TABLES)
+    trips, busy, vehicles, drivers = _load(date)
+
+    vehicle_busy = defaultdict(list)
+    driver_busy = defaultdict(list)
+    for row in busy:
+        interval = parse_shift(row['shift_time'])
+        vehicle_busy[(row['date'], row['vehicle_id'])].append(interval)
+        driver_busy[(row['date'], row['driver_id'])].append(interval)
+    driver_load = defaultdict(int)
+    for row in busy:
+        driver_load[(row['date'], row['driver_id'])] += 1
+
+    by_date = defaultdict(list)
+    for trip in trips:
+        trip['start'], trip['end'] = parse_shift(trip['shift_time'])
+        trip['riders'] = expected_riders(trip['booking_status_percentage'])
+        by_date[trip['date']].append(trip)
+
+    assignments = []
+    unassigned = []
+    total_cost = 0
+    for day in sorted(by_date, key=lambda value: value or ''):
+        for wave in _waves(by_date[day]):
+            start = wave[0]['start']
+            end = max(trip['end'] for trip in wave)
+            free_vehicles = [v for v in vehicles if not _overlaps(vehicle_busy[(day, v['id'])], start, end)]
+            free_drivers = sorted(
+                (d for d in drivers if not _overlaps(driver_busy[(day, d['id'])], start, end)),
+                key=lambda d: (driver_load[(day, d['id'])], d['id']),
+            )
+            pairs, leftover = _solve_wave(wave, free_vehicles, free_drivers)
+            for trip, vehicle, driver in pairs:
+                cost = assignment_cost(trip['riders'], vehicle['capacity'])
+                total_cost += cost
+                vehicle_busy[(day, vehicle['id'])].append((trip['start'], trip['end']))
+                driver_busy[(day, driver['id'])].append((trip['start'], trip['end']))
+                driver_load[(day, driver['id'])] += 1
+                assignments.append({
+                    'trip_id': trip['id'],
+                    'trip': trip['display_name'],
+                    'date': day,
+                    'shift_time': trip['shift_time'],
+                    'expected_riders': trip['riders'],
+                    'vehicle_id': vehicle['id'],
+                    'license_plate': vehicle['license_plate'],
+                    'capacity': vehicle['capacity'],
+                    'driver_id': driver['id'],
+                    'driver': driver['name'],
+                    'cost': cost,
+                })
+            for trip in leftover:
+                unassigned.append({
+                    'trip_id': trip['id'],
+                    'trip': trip['display_name'],
+                    'date': day,
+                    'shift_time': trip['shift_time'],
+                    'reason': 'no vehicle and driver free for this shift',
+                })
+
+    plan = {
+        'plan_id': uuid.uuid4().hex,
+        'date': date,
+        'assignments': assignments,
+        'unassigned': unassigned,
+        'total_cost': total_cost,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 3),
+    }
+    _remember(plan, versions)
+    return plan
+
+
+# Plans live in the database so a preview built by one worker process can be
+# applied by another; `versions` are the change_counters values it was built
+# against, which every process sees alike.
+def _remember(plan, versions):
+    with pool.acquire() as conn:
+        conn.execute(
+            'INSERT INTO optimizer_plans (plan_id, versions, plan, created_at) VALUES (?, ?, ?, ?)',
+            (plan['plan_id'], json.dumps(list(versions)), json.dumps(plan), time.time()),
+        )
+        conn.execute('''DELETE FROM optimizer_plans WHERE plan_id IN (
+            SELECT plan_id FROM optimizer_plans ORDER BY created_at DESC LIMIT -1 OFFSET ?
+        )''', (MAX_PLANS,))
+        conn.commit()
+
+
+def _load_plan(plan_id):
+    with pool.acquire() as conn:
+        row = conn.execute('SELECT versions, plan FROM optimizer_plans WHERE plan_id = ?', (plan_id,)).fetchone()
+    if row is None:
+        return None
+    return tuple(json.loads(row[0])), json.loads(row[1])
+
+
+def get_plan(plan_id):
+    entry = _load_plan(plan_id)
+    return entry[1] if entry else None
+
+
+def apply_plan(plan_id):
+    entry = _load_plan(plan_id)
+    if entry is None:
+        raise KeyError(plan_id)
+    versions, plan = entry
+
+    # Checked under the bulk write lock, so no write can slip in between.
+    def unchanged(conn):
+        if stored_versions(conn, PLAN_TABLES) != versions:
+            raise StalePlanError('Trips, vehicles, drivers or deployments changed since this plan was built; preview it again.')
+
+    result = bulk_assign_deployments(
+        [(item['trip_id'], item['vehicle_id'], item['driver_id']) for item in plan['assignments']],
+        atomic=True,
+        precondition=unchanged,
+    )
+    with pool.acquire() as conn:
+        conn.execute('DELETE FROM optimizer_plans WHERE plan_id = ?', (plan_id,))
+        conn.commit()
+    return dict(result, plan_id=plan_id, unassigned=len(plan['unassigned']))
@@ -0,0 +1,112 @@
+from api_cache import VersionedCache
+from config import config
+from db import table_versions
+from geo import has_location, numpy, segment_lengths_m
+
+# A path's geometry only depends on its ordered stops and their coordinates.
+GEOMETRY_TABLES = ('path_stops', 'stops')
+
+path_geometry_cache = VersionedCache(config.PATH_GEOMETRY_CACHE_SIZE)
+
+
+# Cumulative distance and ETA at each located stop, restarting at 0 wherever
+# the owning path changes.
+def _cumulative(owners, lats, lngs):
+    segments = segment_lengths_m(lats, lngs)
+    metres_per_second = config.PATH_AVERAGE_SPEED_KMH / 3.6
+    detour, dwell = config.PATH_DETOUR_FACTOR, config.PATH_STOP_DWELL_SECONDS
+    if numpy is not None and owners:
+        owners = numpy.asarray(owners)
+        same = numpy.concatenate(([False], owners[1:] == owners[:-1]))
+        steps = numpy.concatenate(([0.0], segments)) * same
+        total = numpy.cumsum(steps)
+        starts = numpy.maximum.accumulate(numpy.where(same, 0, numpy.arange(len(owners))))
+        distance = total - total[starts]
+        # Dwell at every stop already passed except the first.
+        passed = numpy.arange(len(owners)) - starts
+        eta = numpy.rint(distance * detour / metres_per_second + dwell * numpy.maximum(passed - 1, 0))
+        return numpy.round(distance, 1).tolist(), eta.astype(int).tolist()
+    distances, etas = [], []
+    distance = passed = 0
+    for index, owner in enumerate(owners):
+        if index and owner == owners[index - 1]:
+            distance += segments[index - 1]
+            passed += 1
+        else:
+            distance = passed = 0
+        distances.append(round(distance, 1))
+        etas.append(round(distance * detour / metres_per_second + dwell * max(passed - 1, 0)))
+    return distances, etas
+
+
+# Vectorized over the located stops of every path at once. Stops without
+# coordinates inherit the figures of the stop before them. Returns, per item,
+# (length_m, duration_s, [(distance_m, eta_s) per stop]).
+def compute(items):
+    owners, lats, lngs = [], [], []
+    for index, item in enumerate(items):
+        for stop in item['stops']:
+            if has_location(stop['latitude'], stop['longitude']):
+                owners.append(index)
+                lats.append(stop['latitude'])
+                lngs.append(stop['longitude'])
+    distances, etas = _cumulative(owners, lats, lngs)
+    position = 0
+    results = []
+    for item in items:
+        figures = (0.0, 0)
+        per_stop = []
+        for stop in item['stops']:
+            if has_location(stop['latitude'], stop['longitude']):
+                figures = (distances[position], etas[position])
+                position += 1
+            per_stop.append(figures)
+        results.append(figures + (per_stop,))
+    return results
+
+
+def _apply(item, geometry):
+    item['length_m'], item['duration_s'], per_stop = geometry
+    for stop, (distance, eta) in zip(item['stops'], per_stop):
+        stop['distance_m'] = distance
+        stop['eta_s'] = eta
+
+
+# Adds length_m/duration_s to each path and distance_m/eta_s to its stops,
+# from the cache where the path is unchanged since it was last computed.
+def annotate(items):
+    versions = table_versions.get(*GEOMETRY_TABLES)
+    missing = []
+    for item in items:
+        geometry = path_geometry_cache.lookup(item['id'], versions)
+        # A stop count mismatch means the entry was built from other stops.
+        if geometry is None or len(geometry[2]) != len(item['stops']):
+            missing.append(item)
+        else:
+            _apply(item, geometry)
+    if missing:
+        for item, geometry in zip(missing, compute(missing)):
+            path_geometry_cache.store(item['id'], versions, geometry)
+            _apply(item, geometry)
+    return items
+
+
+# Cached (length_m, duration_s) for the given paths; ids not cached are
+# left out.
+def cached_totals(path_ids):
+    versions = table_versions.get(*GEOMETRY_TABLES)
+    totals = {}
+    for path_id in path_ids:
+        geometry = path_geometry_cache.lookup(path_id, versions)
+        if geometry is not None:
+            totals[path_id] = geometry[:2]
+    return totals
+
+
+def arrival_time(shift_time, duration_s):
+    try:
+        hours, minutes = (int(part) for part in str(shift_time).split(':')[:2])
+    except (TypeError, ValueError):
+        return None
+    total = (hours * 60 + minutes + round(duration_s / 60)) % (24 * 60)
+    return f'{total // 60:02d}:{total % 60:02d}'
@@ -3,7 +3,10 @@ import sys
 import shutil
 import glob
 
-db_path = os.path.join(os.path.dirname(__file__), '..', 'moveinsync.db')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from config import config
+
+db_path = config.DB_PATH
 
 if os.path.exists(db_path):
     try:
@@ -11,6 +14,12 @@ if os.path.exists(db_path):
         print(f"Deleted old database: {db_path}")
     except Exception as e:
         print(f"Error deleting database: {e}")
+for suffix in ('-wal', '-shm'):
+    if os.path.exists(db_path + suffix):
+        try:
+            os.remove(db_path + suffix)
+        except Exception:
+            pass
 
 cache_dirs = glob.glob(os.path.join(os.path.dirname(__file__), '**', '__pycache__'), recursive=True)
 for cache_dir in cache_dirs:
@@ -4,10 +4,15 @@ import sys
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, os.getcwd())
 
-db_path = os.path.join(os.path.dirname(__file__), '..', 'moveinsync.db')
+from config import config
+
+db_path = config.DB_PATH
 if os.path.exists(db_path):
     os.remove(db_path)
     print("[OK] Old database deleted - will recreate with fresh data")
+for suffix in ('-wal', '-shm'):
+    if os.path.exists(db_path + suffix):
+        os.remove(db_path + suffix)
 
 # Clear bytecode cache
 import shutil
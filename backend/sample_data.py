@@ -53,3 +53,26 @@ SAMPLE_DEPLOYMENTS = [
     ('Central Bangalore - Morning 09:00', 'KA-01-EF-9012', 'Priya Sharma'),
     ('Central Bangalore - Evening 17:00', 'KA-01-GH-3456', 'Suresh Patel')
 ]
+
+# The same data as importer records (see importer.py), keyed by entity.
+SAMPLE_RECORDS = {
+    'stops': [{'name': name, 'latitude': lat, 'longitude': lng} for name, lat, lng in SAMPLE_STOPS],
+    'paths': [{'name': name} for name, status in SAMPLE_PATHS],
+    'path_stops': [{'path_id': path_id, 'stop_id': stop_id, 'order_index': order} for path_id, stop_id, order in SAMPLE_PATH_STOPS],
+    'routes': [
+        {'path_id': path_id, 'route_display_name': name, 'shift_time': shift, 'direction': direction,
+         'start_point': start, 'end_point': end, 'status': 'active'}
+        for path_id, name, shift, direction, start, end in SAMPLE_ROUTES
+    ],
+    'vehicles': [
+        {'license_plate': plate, 'type': vtype, 'capacity': capacity, 'model': model}
+        for plate, vtype, capacity, model in SAMPLE_VEHICLES
+    ],
+    'drivers': [{'name': name, 'license_number': number, 'phone': phone} for name, number, phone in SAMPLE_DRIVERS],
+    'daily_trips': [
+        {'route_id': route_id, 'display_name': name, 'booking_status_percentage': booking,
+         'live_status': status, 'date': date}
+        for route_id, name, booking, status, date in SAMPLE_TRIPS
+    ],
+    'deployments': [{'trip': trip, 'vehicle': plate, 'driver': driver} for trip, plate, driver in SAMPLE_DEPLOYMENTS],
+}
@@ -0,0 +1,165 @@
+import datetime
+
+from db import pool
+
+# kind -> (table, name column, rowid tag). The FTS rowid is id * 8 + tag so
+# triggers can address an entity's row directly. The index and its triggers
+# are built by migration 3; a new source needs a new migration too.
+SEARCH_SOURCES = {
+    'trips': ('daily_trips', 'display_name', 1),
+    'routes': ('routes', 'route_display_name', 2),
+    'vehicles': ('vehicles', 'license_plate', 3),
+    'drivers': ('drivers', 'name', 4),
+    'paths': ('paths', 'name', 5),
+    'stops': ('stops', 'name', 6),
+}
+
+FUZZY_MIN_SCORE = 0.3
+CANDIDATE_LIMIT = 200
+
+
+# For bulk loads that bypass the per-row triggers (see importer.py).
+def index_new_rows(conn, table, min_id):
+    for kind, (source, column, tag) in SEARCH_SOURCES.items():
+        if source == table:
+            conn.execute(f'''INSERT INTO search_index (rowid, name, kind, entity_id)
+                SELECT id * 8 + {tag}, {column}, '{kind}', id FROM {table} WHERE id >= ?''', (min_id,))
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _quote(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _escape_like(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _kind_filter(kinds):
+    if not kinds:
+        return '', []
+    return f" AND kind IN ({', '.join('?' for _ in kinds)})", list(kinds)
+
+
+def search_entities(query, kinds=None, limit=10, fuzzy=True):
+    text = (query or '').strip()
+    if not text:
+        return []
+    lowered = text.lower()
+    kind_sql, kind_params = _kind_filter(kinds)
+    candidates = {}
+
+    with pool.acquire() as conn:
+        # Exact and prefix hits come straight from the NOCASE indexes, in index
+        # order, so broad prefixes never materialise every match.
+        pattern = _escape_like(text) + '%'
+        for kind in kinds or SEARCH_SOURCES:
+            table, column, _ = SEARCH_SOURCES[kind]
+            rows = conn.execute(
+                f"SELECT id, {column} FROM {table} WHERE {column} LIKE ? ESCAPE '\\' ORDER BY {column} COLLATE NOCASE LIMIT ?",
+                (pattern, limit),
+            ).fetchall()
+            for entity_id, name in rows:
+                exact = name.lower() == lowered
+                candidates[(kind, entity_id)] = {
+                    'kind': kind, 'id': entity_id, 'name': name,
+                    'score': 4.0 if exact else 3.0 + len(text) / len(name),
+                }
+
+        if len(candidates) < limit:
+            if len(text) >= 3:
+                rows = conn.execute(
+                    f'SELECT kind, entity_id, name FROM search_index WHERE search_index MATCH ?{kind_sql} LIMIT ?',
+                    [_quote(text)] + kind_params + [CANDIDATE_LIMIT],
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    f"SELECT kind, entity_id, name FROM search_index WHERE name LIKE ? ESCAPE '\\'{kind_sql} LIMIT ?",
+                    ['%' + pattern] + kind_params + [CANDIDATE_LIMIT],
+                ).fetchall()
+            for kind, entity_id, name in rows:
+                if (kind, entity_id) in candidates or name is None:
+                    continue
+                # Substring matches rank below prefixes; the closest length wins.
+                candidates[(kind, entity_id)] = {
+                    'kind': kind, 'id': entity_id, 'name': name,
+                    'score': 2.0 + len(text) / max(len(name), 1),
+                }
+
+        if not candidates and fuzzy and len(text) >= 6:
+            # A single typo breaks at most one half of the query, so the other
+            # half still matches as an exact substring; candidates are then
+            # scored by trigram overlap with the whole query.
+            grams = _trigrams(lowered)
+            middle = len(text) // 2
+            for part in {text[:middle].strip(), text[middle:].strip()}:
+                if len(part) < 3:
+                    continue
+                rows = conn.execute(
+                    f'SELECT kind, entity_id, name FROM search_index WHERE search_index MATCH ?{kind_sql} LIMIT ?',
+                    [_quote(part)] + kind_params + [CANDIDATE_LIMIT],
+                ).fetchall()
+                for kind, entity_id, name in rows:
+                    if name is None:
+                        continue
+                    other = _trigrams(name.lower())
+                    score = len(grams & other) / len(grams | other)
+                    if score >= FUZZY_MIN_SCORE:
+                        candidates[(kind, entity_id)] = {'kind': kind, 'id': entity_id, 'name': name, 'score': score}
+
+    ranked = sorted(candidates.values(), key=lambda item: (-item['score'], item['kind'], item['id']))
+    for item in ranked:
+        item['score'] = round(item['score'], 4)
+    return ranked[:limit]
+
+
+# Rows named exactly `name`, ignoring case, straight from the NOCASE index.
+def exact_matches(kind, name, limit=2):
+    text = (name or '').strip()
+    if not text:
+        return []
+    table, column, _ = SEARCH_SOURCES[kind]
+    with pool.acquire() as conn:
+        rows = conn.execute(f'SELECT id, {column} FROM {table} WHERE {column} = ? COLLATE NOCASE ORDER BY id LIMIT ?',
+                            (text, limit)).fetchall()
+    return [{'kind': kind, 'id': entity_id, 'name': value} for entity_id, value in rows]
+
+
+# Trips repeat their display name on every date they run. Without a date a
+# name means today's trip, or every trip so named when none runs today.
+def trip_matches(name, date=None):
+    text = (name or '').strip()
+    if not text:
+        return []
+    sql = 'SELECT id, display_name, date FROM daily_trips WHERE display_name = ? COLLATE NOCASE'
+    params = [text]
+    if date:
+        sql += ' AND date = ?'
+        params.append(date)
+    with pool.acquire() as conn:
+        rows = conn.execute(sql + ' ORDER BY date, id', params).fetchall()
+    matches = [{'kind': 'trips', 'id': trip_id, 'name': value, 'date': day} for trip_id, value, day in rows]
+    if not date:
+        today = datetime.date.today().isoformat()
+        matches = [match for match in matches if match['date'] == today] or matches
+    return matches
+
+
+# For lookups that write or report status: the single row with exactly this
+# name (on `date`, for trips), or None when there is none or more than one.
+# Never fuzzy.
+def unique_match(kind, name, date=None):
+    matches = trip_matches(name, date) if kind == 'trips' else exact_matches(kind, name)
+    return matches[0] if len(matches) == 1 else None
+
+
+def suggestions(kind, query, limit=3):
+    return [item['name'] for item in search_entities(query, (kind,), limit=limit)]
+
+
+def best_match(kind, query, fuzzy=True):
+    results = search_entities(query, (kind,), limit=1, fuzzy=fuzzy)
+    return results[0] if results else None
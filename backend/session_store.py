@@ -0,0 +1,402 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from config import config
+
+try:
+    import redis
+except Exception:
+    redis = None
+
+
+def truncate_history(state, max_history):
+    messages = state.get('messages') or []
+    if not max_history or len(messages) <= max_history:
+        return state
+    dropped = messages[:len(messages) - max_history + 1]
+    previous = 0
+    if dropped and isinstance(dropped[0], dict) and dropped[0].get('role') == 'system' and dropped[0].get('truncated'):
+        previous = dropped[0].get('truncated', 0)
+        dropped = dropped[1:]
+    summary = {
+        'role': 'system',
+        'content': f"[{previous + len(dropped)} earlier messages truncated]",
+        'truncated': previous + len(dropped),
+    }
+    state = dict(state)
+    state['messages'] = [summary] + messages[len(messages) - max_history + 1:]
+    return state
+
+
+def _encode(state):
+    return json.dumps(state, default=str)
+
+
+class SessionStore(ABC):
+    def __init__(self, max_entries=10000, ttl_seconds=3600.0, max_history=50, lock_timeout=30.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_history = max_history
+        self.lock_timeout = lock_timeout
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'lock_waits': 0, 'lock_timeouts': 0}
+        self._counter_lock = threading.Lock()
+        self._session_locks = {}
+
+    def _count(self, name, amount=1):
+        with self._counter_lock:
+            self._counters[name] += amount
+
+    # Serialises turns of one session within this process. Backends shared by
+    # several processes extend it with a cross-process lease.
+    @contextmanager
+    def lock(self, session_id):
+        with self._counter_lock:
+            entry = self._session_locks.setdefault(session_id, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            if not entry[0].acquire(blocking=False):
+                self._count('lock_waits')
+                if not entry[0].acquire(timeout=self.lock_timeout):
+                    self._count('lock_timeouts')
+                    raise TimeoutError(f"Session {session_id} is busy with another request")
+            try:
+                with self._lease(session_id):
+                    yield
+            finally:
+                entry[0].release()
+        finally:
+            with self._counter_lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    self._session_locks.pop(session_id, None)
+
+    @contextmanager
+    def _lease(self, session_id):
+        yield
+
+    @abstractmethod
+    def get(self, session_id):
+        pass
+
+    @abstractmethod
+    def set(self, session_id, state):
+        pass
+
+    @abstractmethod
+    def delete(self, session_id):
+        pass
+
+    @abstractmethod
+    def purge_expired(self):
+        pass
+
+    @abstractmethod
+    def entry_count(self):
+        pass
+
+    @abstractmethod
+    def total_bytes(self):
+        pass
+
+    def metrics(self):
+        with self._counter_lock:
+            counters = dict(self._counters)
+        return dict(
+            counters,
+            backend=self.backend,
+            entries=self.entry_count(),
+            bytes=self.total_bytes(),
+            max_entries=self.max_entries,
+            ttl_seconds=self.ttl_seconds,
+            max_history=self.max_history,
+            lock_timeout=self.lock_timeout,
+        )
+
+    def __len__(self):
+        return self.entry_count()
+
+
+class MemorySessionStore(SessionStore):
+    backend = 'memory'
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+
+    def _drop(self, session_id):
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def get(self, session_id):
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                self._count('misses')
+                return None
+            if self.ttl_seconds and time.monotonic() - entry[1] > self.ttl_seconds:
+                self._drop(session_id)
+                self._count('expirations')
+                self._count('misses')
+                return None
+            self._entries.move_to_end(session_id)
+            self._count('hits')
+            return entry[0]
+
+    def set(self, session_id, state):
+        state = truncate_history(state, self.max_history)
+        size = len(_encode(state))
+        with self._lock:
+            self._drop(session_id)
+            self._entries[session_id] = (state, time.monotonic(), size)
+            self._bytes += size
+            while self.max_entries and len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self._count('evictions')
+
+    def delete(self, session_id):
+        with self._lock:
+            self._drop(session_id)
+
+    def purge_expired(self):
+        if not self.ttl_seconds:
+            return 0
+        cutoff = time.monotonic() - self.ttl_seconds
+        with self._lock:
+            expired = [sid for sid, entry in self._entries.items() if entry[1] < cutoff]
+            for sid in expired:
+                self._drop(sid)
+        self._count('expirations', len(expired))
+        return len(expired)
+
+    def entry_count(self):
+        return len(self._entries)
+
+    def total_bytes(self):
+        return self._bytes
+
+
+class SQLiteSessionStore(SessionStore):
+    backend = 'sqlite'
+
+    def __init__(self, db_path, **kwargs):
+        super().__init__(**kwargs)
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                bytes INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            )''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_sessions_updated_at ON sessions(updated_at)')
+            conn.execute('''CREATE TABLE IF NOT EXISTS session_leases (
+                session_id TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )''')
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30.0)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+            self._local.conn = conn
+        return conn
+
+    # A lease row per busy session; it expires after twice lock_timeout so a
+    # worker that dies mid-turn cannot wedge the session, while a waiter that
+    # gives up after lock_timeout never takes over a turn still running.
+    @contextmanager
+    def _lease(self, session_id):
+        conn = self._conn()
+        owner = uuid.uuid4().hex
+        deadline = time.monotonic() + self.lock_timeout
+        delay = 0.005
+        while True:
+            now = time.time()
+            with conn:
+                acquired = conn.execute('''
+                    INSERT INTO session_leases (session_id, owner, expires_at) VALUES (?, ?, ?)
+                    ON CONFLICT(session_id) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+                    WHERE session_leases.expires_at < ?
+                ''', (session_id, owner, now + 2 * self.lock_timeout, now)).rowcount
+            if acquired:
+                break
+            if time.monotonic() >= deadline:
+                self._count('lock_timeouts')
+                raise TimeoutError(f"Session {session_id} is busy with another request")
+            self._count('lock_waits')
+            time.sleep(delay)
+            delay = min(delay * 2, 0.1)
+        try:
+            yield
+        finally:
+            with conn:
+                conn.execute('DELETE FROM session_leases WHERE session_id = ? AND owner = ?', (session_id, owner))
+
+    def get(self, session_id):
+        conn = self._conn()
+        row = conn.execute('SELECT state, updated_at FROM sessions WHERE session_id = ?', (session_id,)).fetchone()
+        if row is None:
+            self._count('misses')
+            return None
+        now = time.time()
+        if self.ttl_seconds and now - row[1] > self.ttl_seconds:
+            with conn:
+                conn.execute('DELETE FROM sessions WHERE session_id = ?', (session_id,))
+            self._count('expirations')
+            self._count('misses')
+            return None
+        with conn:
+            conn.execute('UPDATE sessions SET updated_at = ? WHERE session_id = ?', (now, session_id))
+        self._count('hits')
+        return json.loads(row[0])
+
+    def set(self, session_id, state):
+        payload = _encode(truncate_history(state, self.max_history))
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO sessions (session_id, state, bytes, updated_at) VALUES (?, ?, ?, ?)',
+                (session_id, payload, len(payload), time.time()),
+            )
+            if self.max_entries:
+                evicted = conn.execute('''
+                    DELETE FROM sessions WHERE session_id IN (
+                        SELECT session_id FROM sessions ORDER BY updated_at DESC LIMIT -1 OFFSET ?
+                    )
+                ''', (self.max_entries,)).rowcount
+                if evicted > 0:
+                    self._count('evictions', evicted)
+
+    def delete(self, session_id):
+        conn = self._conn()
+        with conn:
+            conn.execute('DELETE FROM sessions WHERE session_id = ?', (session_id,))
+
+    def purge_expired(self):
+        if not self.ttl_seconds:
+            return 0
+        conn = self._conn()
+        with conn:
+            expired = conn.execute('DELETE FROM sessions WHERE updated_at < ?', (time.time() - self.ttl_seconds,)).rowcount
+        self._count('expirations', expired)
+        return expired
+
+    def entry_count(self):
+        return self._conn().execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+
+    def total_bytes(self):
+        return self._conn().execute('SELECT COALESCE(SUM(bytes), 0) FROM sessions').fetchone()[0]
+
+
+class RedisSessionStore(SessionStore):
+    backend = 'redis'
+
+    def __init__(self, url, prefix='movi:session:', **kwargs):
+        super().__init__(**kwargs)
+        if redis is None:
+            raise RuntimeError("The 'redis' package is required for SESSION_BACKEND=redis")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._lru_key = prefix + 'lru'
+        self._bytes_key = prefix + 'bytes'
+
+    def _key(self, session_id):
+        return self.prefix + 'state:' + session_id
+
+    @contextmanager
+    def _lease(self, session_id):
+        lease = self.client.lock(self.prefix + 'lock:' + session_id, timeout=self.lock_timeout, blocking_timeout=self.lock_timeout)
+        if not lease.acquire():
+            self._count('lock_timeouts')
+            raise TimeoutError(f"Session {session_id} is busy with another request")
+        try:
+            yield
+        finally:
+            try:
+                lease.release()
+            except redis.exceptions.LockError:
+                pass
+
+    def _forget(self, pipe, session_ids):
+        if session_ids:
+            pipe.delete(*[self._key(sid) for sid in session_ids])
+            pipe.zrem(self._lru_key, *session_ids)
+            pipe.hdel(self._bytes_key, *session_ids)
+
+    def get(self, session_id):
+        payload = self.client.get(self._key(session_id))
+        if payload is None:
+            pipe = self.client.pipeline()
+            self._forget(pipe, [session_id])
+            pipe.execute()
+            self._count('misses')
+            return None
+        self.client.zadd(self._lru_key, {session_id: time.time()})
+        self._count('hits')
+        return json.loads(payload)
+
+    def set(self, session_id, state):
+        payload = _encode(truncate_history(state, self.max_history))
+        pipe = self.client.pipeline()
+        pipe.set(self._key(session_id), payload, ex=int(self.ttl_seconds) if self.ttl_seconds else None)
+        pipe.zadd(self._lru_key, {session_id: time.time()})
+        pipe.hset(self._bytes_key, session_id, len(payload))
+        pipe.execute()
+        if self.max_entries:
+            overflow = self.client.zcard(self._lru_key) - self.max_entries
+            if overflow > 0:
+                oldest = [sid.decode() for sid in self.client.zrange(self._lru_key, 0, overflow - 1)]
+                pipe = self.client.pipeline()
+                self._forget(pipe, oldest)
+                pipe.execute()
+                self._count('evictions', len(oldest))
+
+    def delete(self, session_id):
+        pipe = self.client.pipeline()
+        self._forget(pipe, [session_id])
+        pipe.execute()
+
+    def purge_expired(self):
+        if not self.ttl_seconds:
+            return 0
+        stale = [sid.decode() for sid in self.client.zrangebyscore(self._lru_key, 0, time.time() - self.ttl_seconds)]
+        pipe = self.client.pipeline()
+        self._forget(pipe, stale)
+        pipe.execute()
+        self._count('expirations', len(stale))
+        return len(stale)
+
+    def entry_count(self):
+        return self.client.zcard(self._lru_key)
+
+    def total_bytes(self):
+        return sum(int(size) for size in self.client.hvals(self._bytes_key))
+
+
+def create_session_store(backend=None):
+    backend = (backend or config.SESSION_BACKEND).lower()
+    options = {
+        'max_entries': config.SESSION_MAX_ENTRIES,
+        'ttl_seconds': config.SESSION_TTL_SECONDS,
+        'max_history': config.SESSION_MAX_HISTORY,
+        'lock_timeout': config.SESSION_LOCK_TIMEOUT,
+    }
+    if backend == 'sqlite':
+        return SQLiteSessionStore(config.SESSION_DB_PATH, **options)
+    if backend == 'redis':
+        return RedisSessionStore(config.SESSION_REDIS_URL, **options)
+    return MemorySessionStore(**options)
@@ -0,0 +1,64 @@
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+# config is read at import time, so the suite's databases and timings are
+# fixed here, before any backend module loads.
+DATA_DIR = tempfile.mkdtemp(prefix='movi-tests-')
+os.environ['MOVI_DB_PATH'] = os.path.join(DATA_DIR, 'moveinsync.db')
+os.environ['MOVI_SESSION_DB_PATH'] = os.path.join(DATA_DIR, 'sessions.db')
+os.environ['MOVI_CHECKPOINT_DB_PATH'] = os.path.join(DATA_DIR, 'checkpoints.db')
+os.environ['MOVI_CHANGE_FEED_POLL_SECONDS'] = '0.05'
+os.environ['MOVI_CHANGE_STREAM_HEARTBEAT_SECONDS'] = '0.5'
+
+
+@pytest.fixture(scope='session')
+def database():
+    from tools import init_database
+    init_database()
+
+
+# The sample data, reloaded for every test that writes.
+@pytest.fixture
+def sample_db(database):
+    from benchmarks.synthetic import _wipe
+    from db import TABLES, bump_tables, pool
+    from importer import Importer
+    from sample_data import SAMPLE_RECORDS
+    with pool.acquire() as conn:
+        _wipe(conn)
+        conn.commit()
+        Importer(conn).import_all(SAMPLE_RECORDS)
+    bump_tables(*TABLES)
+    return pool
+
+
+# Sends messages through one fresh chat session; returns the full replies.
+@pytest.fixture
+def chat():
+    from app import handle_chat
+    session_id = uuid.uuid4().hex
+
+    def send(message, **extra):
+        return handle_chat(dict(extra, message=message, sessionId=session_id))[0]
+    return send
+
+
+@pytest.fixture
+def client(database):
+    from app import app
+    return app.test_client()
+
+
+# A deterministic synthetic dataset several pages deep, over several dates.
+@pytest.fixture
+def synthetic_db(database):
+    from benchmarks.synthetic import populate
+    return populate('tiny', seed=7)
@@ -0,0 +1,31 @@
+from agent import action_cache
+from tools import create_driver, create_vehicle
+
+
+def test_repeat_listing_is_answered_from_the_cache(sample_db, chat):
+    first = chat('list all vehicles')['response']
+    hits = action_cache.stats()['hits']
+    assert chat('list all vehicles')['response'] == first
+    assert action_cache.stats()['hits'] == hits + 1
+
+
+def test_write_to_a_read_table_invalidates_the_reply(sample_db, chat):
+    chat('list all vehicles')
+    create_vehicle('KA-99-ZZ-0003', 'Cab', 4, 'Swift Sedan')
+    hits = action_cache.stats()['hits']
+    assert 'KA-99-ZZ-0003' in chat('list all vehicles')['response']
+    assert action_cache.stats()['hits'] == hits
+
+
+def test_write_to_another_table_keeps_the_reply(sample_db, chat):
+    chat('list all vehicles')
+    create_driver('Kavya Iyer', 'DL999000', '9000000002')
+    hits = action_cache.stats()['hits']
+    chat('list all vehicles')
+    assert action_cache.stats()['hits'] == hits + 1
+
+
+def test_mutations_are_never_cached(sample_db, chat):
+    entries = action_cache.stats()['entries']
+    chat("create stop called 'Cache Stop'")
+    assert action_cache.stats()['entries'] == entries
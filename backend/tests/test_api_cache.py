@@ -0,0 +1,37 @@
+from api_cache import response_cache
+from tools import create_vehicle
+
+
+def test_unchanged_listing_answers_304(sample_db, client):
+    first = client.get('/api/vehicles')
+    assert first.status_code == 200 and first.headers['ETag']
+    again = client.get('/api/vehicles', headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+    assert again.headers['ETag'] == first.headers['ETag']
+
+
+def test_repeat_reads_are_served_from_the_cache(sample_db, client):
+    client.get('/api/drivers')
+    hits = response_cache.stats()['hits']
+    assert client.get('/api/drivers').status_code == 200
+    assert response_cache.stats()['hits'] == hits + 1
+
+
+def test_write_invalidates_cached_listing(sample_db, client):
+    first = client.get('/api/vehicles')
+    create_vehicle('KA-99-ZZ-0001', 'Cab', 4, 'Swift Sedan')
+    after = client.get('/api/vehicles', headers={'If-None-Match': first.headers['ETag']})
+    assert after.status_code == 200
+    assert after.headers['ETag'] != first.headers['ETag']
+    assert 'KA-99-ZZ-0001' in [item['license_plate'] for item in after.get_json()['vehicles']]
+
+
+def test_query_string_is_part_of_the_key(sample_db, client):
+    everything = client.get('/api/vehicles').get_json()['vehicles']
+    page = client.get('/api/vehicles?limit=2').get_json()['vehicles']
+    assert len(page) == 2 and len(everything) > 2
+
+
+def test_errors_are_not_cached(sample_db, client):
+    assert client.get('/api/vehicles?limit=oops').status_code == 400
+    assert client.get('/api/vehicles?limit=oops').status_code == 400
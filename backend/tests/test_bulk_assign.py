@@ -0,0 +1,47 @@
+from tools import bulk_assign_deployments
+
+# Sample data: trips 1 and 2 both run at 08:00 on route 1 and hold vehicles
+# and drivers 1 and 2; vehicle 5 and driver 5 are free.
+
+
+def deployments(pool):
+    with pool.acquire() as conn:
+        return {row[0]: (row[1], row[2]) for row in conn.execute('SELECT trip_id, vehicle_id, driver_id FROM deployments')}
+
+
+def rejected(result):
+    return {conflict['index']: conflict['reasons'] for conflict in result['conflicts']}
+
+
+def test_rejected_row_does_not_block_a_later_row_on_its_vehicle(sample_db):
+    result = bulk_assign_deployments([(1, 5, 999), (2, 5, 2)])
+    assert rejected(result) == {0: ['driver not found']}
+    assert result['updated'] == 1
+    assert deployments(sample_db)[2] == (5, 2)
+    assert deployments(sample_db)[1] == (1, 1)
+
+
+def test_rejected_row_keeps_its_trip_window(sample_db):
+    result = bulk_assign_deployments([(1, 5, 999), (2, 1, 2)])
+    assert rejected(result) == {0: ['driver not found'], 1: ['vehicle already deployed in an overlapping shift']}
+    assert deployments(sample_db)[2] == (2, 2)
+
+
+def test_accepted_row_frees_its_trip_window(sample_db):
+    result = bulk_assign_deployments([(1, 5, 5), (2, 1, 2)])
+    assert result['conflicts'] == []
+    assert deployments(sample_db)[1] == (5, 5)
+    assert deployments(sample_db)[2] == (1, 2)
+
+
+def test_accepted_rows_clash_with_each_other(sample_db):
+    result = bulk_assign_deployments([(1, 5, 5), (2, 5, 2)])
+    assert rejected(result) == {1: ['vehicle already deployed in an overlapping shift']}
+    assert deployments(sample_db)[2] == (2, 2)
+
+
+def test_atomic_batch_rolls_back_on_any_conflict(sample_db):
+    before = deployments(sample_db)
+    result = bulk_assign_deployments([(1, 5, 5), (2, 5, 2)], atomic=True)
+    assert result['created'] == result['updated'] == 0
+    assert deployments(sample_db) == before
@@ -0,0 +1,81 @@
+import asyncio
+
+from tools import create_stop
+
+
+async def subscribe(app, query_string=b'', headers=()):
+    frames = asyncio.Queue()
+    disconnect = asyncio.Event()
+    requests = [{'type': 'http.request', 'body': b''}]
+
+    async def receive():
+        if requests:
+            return requests.pop()
+        await disconnect.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        await frames.put(message)
+
+    scope = {'type': 'http', 'method': 'GET', 'path': '/api/changes/stream',
+             'query_string': query_string, 'headers': list(headers)}
+    task = asyncio.ensure_future(app(scope, receive, send))
+    return task, frames, disconnect
+
+
+async def next_event(frames, name, timeout=5):
+    while True:
+        message = await asyncio.wait_for(frames.get(), timeout)
+        if f'event: {name}'.encode() in message.get('body', b''):
+            return message
+
+
+def test_changes_are_pushed_while_the_stream_is_open(sample_db):
+    from asgi import app
+
+    async def scenario():
+        task, frames, disconnect = await subscribe(app)
+        start = await asyncio.wait_for(frames.get(), 5)
+        assert start['status'] == 200
+        await next_event(frames, 'ready')
+        # An idle subscriber holds neither a concurrency slot nor a thread.
+        assert app.stats()['subscribers'] == 1
+        assert app.stats()['in_flight'] == 0
+        await asyncio.get_running_loop().run_in_executor(None, create_stop, 'Streamed Stop', 12.9, 77.6)
+        message = await next_event(frames, 'changes')
+        assert message['more_body'] and not task.done()
+        assert b'Streamed Stop' in message['body']
+        disconnect.set()
+        await asyncio.wait_for(task, 5)
+        assert app.stats()['subscribers'] == 0
+
+    asyncio.run(scenario())
+
+
+def test_stream_resumes_from_last_event_id(sample_db):
+    from asgi import app
+    from changes import latest_seq
+
+    cursor = latest_seq()
+    create_stop('Missed Stop', 12.9, 77.6)
+
+    async def scenario():
+        task, frames, disconnect = await subscribe(app, headers=[(b'last-event-id', str(cursor).encode())])
+        message = await next_event(frames, 'changes')
+        assert b'Missed Stop' in message['body']
+        disconnect.set()
+        await asyncio.wait_for(task, 5)
+
+    asyncio.run(scenario())
+
+
+def test_bad_cursor_is_rejected(database):
+    from asgi import app
+
+    async def scenario():
+        task, frames, disconnect = await subscribe(app, query_string=b'since=soon')
+        await asyncio.wait_for(task, 5)
+        start = await frames.get()
+        assert start['status'] == 400
+
+    asyncio.run(scenario())
@@ -0,0 +1,42 @@
+import pytest
+
+from consequences import StaleImpactError, dependents
+from tools import create_stop, delete_stop
+
+
+def stop_ids(pool, name):
+    with pool.acquire() as conn:
+        return [row[0] for row in conn.execute('SELECT id FROM stops WHERE name = ? ORDER BY id', (name,))]
+
+
+def test_delete_by_id_leaves_same_named_rows(sample_db):
+    create_stop('Twin Stop', 12.9, 77.6)
+    create_stop('Twin Stop', 13.0, 77.7)
+    first, second = stop_ids(sample_db, 'Twin Stop')
+    assert delete_stop(first, expected=('Twin Stop', dependents('stop', first)))
+    assert stop_ids(sample_db, 'Twin Stop') == [second]
+
+
+def test_delete_refuses_a_row_changed_since_preview(sample_db):
+    stop_id = stop_ids(sample_db, 'MG Road Station')[0]
+    with pytest.raises(StaleImpactError):
+        delete_stop(stop_id, expected=('MG Road Station', dependents('stop', stop_id) + 1))
+    assert stop_ids(sample_db, 'MG Road Station') == [stop_id]
+
+
+def test_confirmed_delete_checks_the_previewed_row(sample_db, chat):
+    assert chat("delete stop 'MG Road Station'")['awaitingConfirmation']
+    with sample_db.acquire() as conn:
+        conn.execute("UPDATE stops SET name = 'MG Road Metro' WHERE name = 'MG Road Station'")
+        conn.commit()
+    assert 'changed since it was checked' in chat('yes')['response']
+    assert stop_ids(sample_db, 'MG Road Metro')
+
+
+def test_confirmed_delete_removes_exactly_one_row(sample_db, chat):
+    stop_id = stop_ids(sample_db, 'MG Road Station')[0]
+    chat("delete stop 'MG Road Station'")
+    assert chat('yes')['response'] == "Deleted stop 'MG Road Station'."
+    assert stop_ids(sample_db, 'MG Road Station') == []
+    with sample_db.acquire() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM path_stops WHERE stop_id = ?', (stop_id,)).fetchone()[0] == 0
@@ -0,0 +1,76 @@
+import datetime
+
+from tools import create_stop, find_driver_by_name, find_trip_by_display_name, find_vehicle_by_plate, unresolved_message
+
+
+def deployment(pool, trip_id):
+    with pool.acquire() as conn:
+        row = conn.execute('SELECT vehicle_id, driver_id FROM deployments WHERE trip_id = ?', (trip_id,)).fetchone()
+    return tuple(row) if row else None
+
+
+def test_finders_resolve_exact_names_only(sample_db):
+    assert find_trip_by_display_name('South Bangalore - Morning 08:00') == 1
+    assert find_trip_by_display_name('south bangalore - morning 08:00') == 1
+    assert find_trip_by_display_name('South Bangalore - Morning 08:30') is None
+    assert find_vehicle_by_plate('KA-01-IJ-7890') == 5
+    assert find_vehicle_by_plate('KA-01-IJ-7891') is None
+    assert find_driver_by_name('Amit Kumar') == 1
+    assert find_driver_by_name('Amit Kumaar') is None
+
+
+def test_near_miss_suggests_instead_of_mutating(sample_db, chat):
+    before = deployment(sample_db, 1)
+    reply = chat('remove vehicle from trip South Bangalore - Morning 08:30')['response']
+    assert "not found" in reply and "Did you mean 'South Bangalore - Morning 08:00'" in reply
+    assert deployment(sample_db, 1) == before
+
+
+def test_ambiguous_name_is_not_resolved(sample_db, chat):
+    create_stop('Twin Stop', 12.9, 77.6)
+    create_stop('Twin Stop', 13.0, 77.7)
+    reply = chat("delete stop 'Twin Stop'")['response']
+    assert reply == unresolved_message('Stop', 'stops', 'Twin Stop')
+    assert 'More than one stop' in reply
+    with sample_db.acquire() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM stops WHERE name = 'Twin Stop'").fetchone()[0] == 2
+
+
+def add_trip(pool, name, date, route_id=1):
+    with pool.acquire() as conn:
+        trip_id = conn.execute('INSERT INTO daily_trips (route_id, display_name, booking_status_percentage, live_status, date) '
+                               "VALUES (?, ?, 0.0, 'scheduled', ?)", (route_id, name, date)).lastrowid
+        conn.commit()
+    return trip_id
+
+
+def test_trip_names_repeat_across_dates(sample_db, chat):
+    name = 'South Bangalore - Morning 08:00'
+    next_day = add_trip(sample_db, name, '2025-11-16')
+    assert find_trip_by_display_name(name) is None
+    assert find_trip_by_display_name(name, '2025-11-15') == 1
+    assert find_trip_by_display_name(name, '2025-11-16') == next_day
+    assert unresolved_message('Trip', 'trips', name) == f"Trip '{name}' runs on 2025-11-15, 2025-11-16. Which date do you mean?"
+    assert 'does not run on 2025-11-17' in unresolved_message('Trip', 'trips', name, '2025-11-17')
+
+    assert chat(f'remove vehicle from trip {name}')['response'].endswith('Which date do you mean?')
+    assert deployment(sample_db, 1) == (1, 1)
+    assert chat(f'remove vehicle from trip {name} on 2025-11-15')['response'] == f"Removed vehicle assignment from trip '{name}'"
+    assert deployment(sample_db, 1) is None
+
+    reply = chat(f"assign vehicle KA-01-IJ-7890 and driver Deepak Verma to trip '{name}' on 2025-11-16")['response']
+    assert reply.startswith('Assigned vehicle KA-01-IJ-7890')
+    assert deployment(sample_db, next_day) == (5, 5)
+
+
+def test_todays_trip_wins_and_same_day_duplicates_stay_ambiguous(sample_db, chat):
+    name = 'South Bangalore - Morning 08:00'
+    today = datetime.date.today().isoformat()
+    todays = add_trip(sample_db, name, today)
+    assert find_trip_by_display_name(name) == todays
+    assert f"Date: {today}" in chat(f'check status of trip {name}')['response']
+    assert "Date: 2025-11-15" in chat(f'check status of trip {name} on 2025-11-15')['response']
+    add_trip(sample_db, name, today)
+    assert find_trip_by_display_name(name) is None
+    assert chat(f'check status of trip {name} today')['response'] == (
+        f"More than one trip is named '{name}' on {today}. Please be more specific.")
@@ -0,0 +1,75 @@
+import json
+
+from consequences import DEPENDENCIES
+from db import pool
+from importer import find_files, import_files
+from search import SEARCH_SOURCES, search_entities
+from views import check_views
+
+FILES = {
+    'stops.csv': 'name,latitude,longitude\nHebbal Circle,13.0358,77.5970\nYelahanka Gate,13.1007,77.5963\nNo Fix Stop,,\n',
+    'paths.csv': 'name\nNorth - Hebbal to Yelahanka\n',
+    'path_stops.csv': 'path,stop,order_index\nNorth - Hebbal to Yelahanka,Hebbal Circle,0\nNorth - Hebbal to Yelahanka,Yelahanka Gate,1\n',
+    'routes.csv': 'path,route_display_name,shift_time\nNorth - Hebbal to Yelahanka,North - Morning 07:00,07:00\n',
+    'vehicles.csv': 'license_plate,type,capacity,model\nKA-05-NN-0001,Bus,40,Tata Bus\n',
+    'drivers.csv': 'name,license_number,phone\nNisha Rao,DL000111,9000000001\n',
+    'trips.jsonl': json.dumps({'route': 'North - Morning 07:00', 'display_name': 'North - Morning 07:00',
+                               'booking_status_percentage': 0.5, 'live_status': 'Scheduled', 'date': '2025-11-15'}) + '\n',
+    'deployments.csv': 'trip,date,vehicle,driver\nNorth - Morning 07:00,2025-11-15,KA-05-NN-0001,Nisha Rao\n',
+}
+
+
+def write_files(directory):
+    for name, content in FILES.items():
+        (directory / name).write_text(content)
+    return find_files(str(directory))
+
+
+def rows(conn, sql, params=()):
+    return {tuple(row) for row in conn.execute(sql, params)}
+
+
+def triggers(conn):
+    return rows(conn, "SELECT name, sql FROM sqlite_master WHERE type = 'trigger'")
+
+
+def test_bulk_load_leaves_derived_tables_as_the_triggers_would(sample_db, tmp_path):
+    with pool.acquire() as conn:
+        before_triggers = triggers(conn)
+        before_counters = dict(conn.execute('SELECT table_name, version FROM change_counters').fetchall())
+    result = import_files(write_files(tmp_path))
+    assert result['inserted'] == 11 and not any(report['failed'] for report in result['entities'])
+
+    with pool.acquire() as conn:
+        assert triggers(conn) == before_triggers
+        counters = dict(conn.execute('SELECT table_name, version FROM change_counters').fetchall())
+        assert all(counters[table] > before_counters[table] for table in ('stops', 'paths', 'daily_trips', 'deployments'))
+
+        for kind, (table, column, tag) in SEARCH_SOURCES.items():
+            expected = rows(conn, f'SELECT id * 8 + {tag}, {column} FROM {table}')
+            actual = rows(conn, 'SELECT rowid, name FROM search_index WHERE kind = ?', (kind,))
+            assert actual == expected, kind
+
+        for entity, (table, column) in DEPENDENCIES.items():
+            expected = rows(conn, f'SELECT {column}, COUNT(*) FROM {table} WHERE {column} IS NOT NULL GROUP BY {column}')
+            actual = rows(conn, 'SELECT entity_id, dependents FROM dependency_counts WHERE entity = ?', (entity,))
+            assert actual == expected, entity
+
+        located = {row[0] for row in conn.execute('SELECT id FROM stops WHERE latitude IS NOT NULL')}
+        assert {row[0] for row in conn.execute('SELECT id FROM stop_rtree')} == located
+
+        deployments = {row[0] for row in conn.execute('SELECT id FROM deployments')}
+        windows = {row[0]: row[1] for row in conn.execute('SELECT deployment_id, start_min FROM deployment_windows')}
+        assert set(windows) == deployments
+        new_trip = conn.execute("SELECT id FROM daily_trips WHERE display_name = 'North - Morning 07:00'").fetchone()[0]
+        assert conn.execute('SELECT start_min FROM deployment_windows WHERE trip_id = ?', (new_trip,)).fetchone()[0] == 7 * 60
+
+    assert all(not report['missing'] and not report['stale'] for report in check_views().values())
+    assert [item['name'] for item in search_entities('Hebbal Circle', ('stops',))][0] == 'Hebbal Circle'
+
+
+def test_importing_the_same_files_twice_is_a_no_op(sample_db, tmp_path):
+    files = write_files(tmp_path)
+    import_files(files)
+    again = import_files(files)
+    assert again['inserted'] == 0
@@ -0,0 +1,31 @@
+import pytest
+
+from intent import _nearest_stops_slots, classify_intent
+from tools import create_stop
+
+
+@pytest.mark.parametrize('text, k', [
+    ('3 nearest stops to 12.97, 77.59', 3),
+    ('nearest 3 stops to 12.97, 77.59', 3),
+    ('closest 2 stops to 12.97, 77.59', 2),
+    ('2 closest stops to 12.97, 77.59', 2),
+    ('nearest stops to 12.97, 77.59', 5),
+    ('nearest stop to 12.97, 77.59', 1),
+    ('nearest 12.97, 77.59', 1),
+])
+def test_nearest_count_in_either_order(database, text, k):
+    assert _nearest_stops_slots(text) == {'lat': 12.97, 'lng': 77.59, 'k': k}
+
+
+@pytest.mark.parametrize('text, params', [
+    ('find stops within 2 km Koramangala Center', {'stop': 'Koramangala Center', 'radius_m': 2000.0}),
+    ('show stops within 500 m MG Road Station', {'stop': 'MG Road Station', 'radius_m': 500.0}),
+    ('find 2 nearest stops Indiranagar Junction', {'stop': 'Indiranagar Junction', 'k': 2}),
+])
+def test_stop_named_without_a_preposition(sample_db, text, params):
+    assert classify_intent(text).params == params
+
+
+def test_new_stops_are_recognised(sample_db):
+    create_stop('Silk Board Junction', 12.917, 77.623)
+    assert classify_intent('find stops within 1 km Silk Board Junction').params == {'stop': 'Silk Board Junction', 'radius_m': 1000.0}
@@ -0,0 +1,37 @@
+from benchmarks.path_scaling import legacy_get_paths_with_stops, without_geometry
+from db import pool
+from tools import get_deployments_detailed, get_paths_with_stops, get_routes_with_paths, get_trips_with_routes
+
+
+def test_paths_with_stops_match_the_row_at_a_time_version(synthetic_db):
+    assert without_geometry(get_paths_with_stops()) == legacy_get_paths_with_stops()
+
+
+def test_a_stop_listed_twice_on_a_path_is_kept_once(sample_db):
+    with sample_db.acquire() as conn:
+        conn.execute('INSERT INTO path_stops (path_id, stop_id, order_index) VALUES (1, 1, 99)')
+        conn.commit()
+    path = next(path for path in get_paths_with_stops() if path['id'] == 1)
+    ids = [stop['id'] for stop in path['stops']]
+    assert len(ids) == len(set(ids))
+    assert without_geometry(get_paths_with_stops()) == legacy_get_paths_with_stops()
+
+
+def test_routes_carry_their_path(synthetic_db):
+    with pool.acquire() as conn:
+        expected = {row[0]: row[1] for row in conn.execute('SELECT r.id, p.name FROM routes r JOIN paths p ON p.id = r.path_id')}
+    routes = get_routes_with_paths()
+    assert {route['id']: route['path_name'] for route in routes} == expected
+    assert all(route['path_length_m'] is not None for route in routes)
+
+
+def test_trips_and_deployments_match_their_joins(synthetic_db):
+    with pool.acquire() as conn:
+        trips = {row[0]: row[1] for row in conn.execute(
+            'SELECT dt.id, r.route_display_name FROM daily_trips dt JOIN routes r ON r.id = dt.route_id JOIN paths p ON p.id = r.path_id')}
+        deployments = {row[0]: (row[1], row[2]) for row in conn.execute(
+            'SELECT d.id, v.license_plate, dr.name FROM deployments d JOIN vehicles v ON v.id = d.vehicle_id '
+            'JOIN drivers dr ON dr.id = d.driver_id JOIN daily_trips dt ON dt.id = d.trip_id JOIN routes r ON r.id = dt.route_id')}
+    assert {trip['id']: trip['route_name'] for trip in get_trips_with_routes()} == trips
+    assert {item['id']: (item['license_plate'], item['driver_name']) for item in get_deployments_detailed()} == deployments
+
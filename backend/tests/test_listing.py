@@ -0,0 +1,46 @@
+import pytest
+
+from listing import list_rows
+
+
+def walk(client, url, key):
+    items, cursor = [], None
+    while True:
+        page = client.get(url + (f'&cursor={cursor}' if cursor else '')).get_json()
+        items += page[key]
+        cursor = page['next_cursor']
+        if not cursor:
+            return items
+
+
+@pytest.mark.parametrize('name', ['trips', 'deployments', 'routes', 'vehicles'])
+def test_keyset_pages_cover_the_listing_once_in_order(synthetic_db, client, name):
+    everything = client.get(f'/api/{name}').get_json()[name]
+    assert len(everything) > 7
+    assert walk(client, f'/api/{name}?limit=7', name) == everything
+
+
+def test_pages_respect_filters(synthetic_db, client):
+    everything, _ = list_rows('trips', {'date': '2025-11-16'})
+    paged = walk(client, '/api/trips?date=2025-11-16&limit=5', 'trips')
+    assert paged == everything
+    assert {item['date'] for item in paged} == {'2025-11-16'}
+
+
+def test_unassigned_filter(synthetic_db, client):
+    unassigned = client.get('/api/trips?unassigned=true').get_json()['trips']
+    assigned = {item['trip_id'] for item in client.get('/api/deployments').get_json()['deployments']}
+    assert unassigned and not {item['id'] for item in unassigned} & assigned
+
+
+def test_fields_projection(synthetic_db, client):
+    trips = client.get('/api/trips?fields=id,display_name&limit=3').get_json()['trips']
+    assert [set(item) for item in trips] == [{'id', 'display_name'}] * 3
+    paths = client.get('/api/paths?fields=id,name').get_json()['paths']
+    assert all(set(item) == {'id', 'name'} for item in paths)
+
+
+@pytest.mark.parametrize('query', ['fields=id,password', 'cursor=not-a-cursor&limit=2', 'limit=0', 'colour=red'])
+def test_bad_listing_options_are_rejected(synthetic_db, client, query):
+    response = client.get(f'/api/trips?{query}')
+    assert response.status_code == 400 and response.get_json()['error']
@@ -0,0 +1,54 @@
+import sqlite3
+
+import pytest
+
+from config import config
+from conflicts import conflicts_for_date
+from optimizer import StalePlanError, apply_plan, build_plan, get_plan
+from tools import create_vehicle
+
+
+def deployment_count(pool):
+    with pool.acquire() as conn:
+        return conn.execute('SELECT COUNT(*) FROM deployments').fetchone()[0]
+
+
+def test_plan_fills_trips_without_clashes(synthetic_db, client):
+    from db import pool
+    before = deployment_count(pool)
+    plan = client.post('/api/optimizer/plan', json={}).get_json()
+    assert plan['assignments']
+    assert get_plan(plan['plan_id'])['assignments'] == plan['assignments']
+    response = client.post(f"/api/optimizer/plan/{plan['plan_id']}/apply")
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['created'] == len(plan['assignments'])
+    assert deployment_count(pool) == before + len(plan['assignments'])
+    planned = {item['trip_id'] for item in plan['assignments']}
+    assert [conflict for conflict in conflicts_for_date() if planned & set(conflict['trip_ids'])] == []
+
+
+def test_plan_is_stale_after_a_write(sample_db):
+    plan = build_plan()
+    create_vehicle('KA-99-ZZ-0002', 'Bus', 40, 'Tata Bus')
+    before = deployment_count(sample_db)
+    with pytest.raises(StalePlanError):
+        apply_plan(plan['plan_id'])
+    assert deployment_count(sample_db) == before
+
+
+# A write from another worker process never touches this process's
+# table_versions; the plan must still be refused.
+def test_plan_is_stale_after_a_write_from_another_process(sample_db):
+    plan = build_plan()
+    other = sqlite3.connect(config.DB_PATH)
+    try:
+        other.execute("UPDATE vehicles SET capacity = capacity + 1 WHERE id = 1")
+        other.commit()
+    finally:
+        other.close()
+    with pytest.raises(StalePlanError):
+        apply_plan(plan['plan_id'])
+
+
+def test_unknown_plan(sample_db, client):
+    assert client.post('/api/optimizer/plan/nope/apply').status_code == 404
@@ -0,0 +1,72 @@
+import pytest
+
+import path_geometry
+from config import config
+from db import bump_tables
+from geo import haversine_m
+from path_geometry import arrival_time, compute
+from tools import get_paths_with_stops, get_routes_with_paths
+
+
+def stop(lat, lng):
+    return {'latitude': lat, 'longitude': lng}
+
+
+ITEMS = [
+    {'id': 1, 'stops': [stop(12.97, 77.64), stop(12.92, 77.61), stop(None, None), stop(12.93, 77.62)]},
+    {'id': 2, 'stops': [stop(0, 0), stop(13.03, 77.64)]},
+    {'id': 3, 'stops': []},
+]
+
+
+def test_lengths_restart_per_path_and_skip_unlocated_stops():
+    first, second, third = compute(ITEMS)
+    leg1 = haversine_m(12.97, 77.64, [12.92], [77.61])[0]
+    leg2 = haversine_m(12.92, 77.61, [12.93], [77.62])[0]
+    assert first[0] == pytest.approx(leg1 + leg2, abs=0.1)
+    assert [figures[0] for figures in first[2]] == pytest.approx([0.0, leg1, leg1, leg1 + leg2], abs=0.1)
+    # The unlocated stop inherits the ETA of the stop before it.
+    assert first[2][2] == first[2][1]
+    assert second[:2] == (0.0, 0) and third[:2] == (0.0, 0)
+
+
+def test_eta_adds_detour_and_dwell():
+    length, duration, _ = compute([ITEMS[0]])[0]
+    expected = length * config.PATH_DETOUR_FACTOR / (config.PATH_AVERAGE_SPEED_KMH / 3.6) + config.PATH_STOP_DWELL_SECONDS
+    assert duration == round(expected)
+
+
+def test_pure_python_matches_numpy(monkeypatch):
+    vectorized = compute(ITEMS)
+    monkeypatch.setattr(path_geometry, 'numpy', None)
+    for plain, fast in zip(compute(ITEMS), vectorized):
+        assert plain[0] == pytest.approx(fast[0], abs=0.01)
+        assert plain[1] == fast[1]
+
+
+def test_moving_a_stop_recomputes_cached_geometry(sample_db):
+    before = {path['id']: path['length_m'] for path in get_paths_with_stops()}
+    with sample_db.acquire() as conn:
+        conn.execute("UPDATE stops SET latitude = latitude + 0.05 WHERE name = 'BTM Layout Terminal'")
+        conn.commit()
+    bump_tables('stops')
+    after = {path['id']: path['length_m'] for path in get_paths_with_stops()}
+    assert after[1] != before[1]
+    assert after[2] == before[2]
+
+
+def test_routes_carry_their_path_totals(sample_db):
+    paths = {path['id']: path for path in get_paths_with_stops()}
+    for route in get_routes_with_paths():
+        path = paths[route['path_id']]
+        assert route['path_length_m'] == path['length_m']
+        assert route['estimated_arrival'] == arrival_time(route['shift_time'], path['duration_s'])
+
+
+@pytest.mark.parametrize('shift, duration, expected', [
+    ('08:00', 1800, '08:30'),
+    ('23:50', 1200, '00:10'),
+    ('soon', 60, None),
+])
+def test_arrival_time(shift, duration, expected):
+    assert arrival_time(shift, duration) == expected
@@ -0,0 +1,78 @@
+import sqlite3
+
+from migrations import MIGRATIONS, PLAN_CHECKS, assert_no_full_scans, current_version, run_migrations
+
+
+def test_migrated_schema_serves_hot_queries_from_indexes(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'plans.db')
+    try:
+        run_migrations(conn)
+        assert current_version(conn) == MIGRATIONS[-1][0]
+        assert_no_full_scans(conn, PLAN_CHECKS)
+    finally:
+        conn.close()
+
+
+def test_migrations_are_idempotent(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'plans.db')
+    try:
+        run_migrations(conn)
+        assert run_migrations(conn) == []
+    finally:
+        conn.close()
+
+
+def index_keys(conn):
+    keys = {}
+    for name, table in conn.execute("SELECT name, tbl_name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"):
+        columns = tuple((row[2], row[4]) for row in conn.execute(f'PRAGMA index_xinfo({name})') if row[5])
+        keys.setdefault((table, columns), []).append(name)
+    return keys
+
+
+def test_no_two_indexes_cover_the_same_columns(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'plans.db')
+    try:
+        run_migrations(conn)
+        assert [names for names in index_keys(conn).values() if len(names) > 1] == []
+    finally:
+        conn.close()
+
+
+def test_upgrade_drops_the_old_duplicate_name_indexes(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'plans.db')
+    try:
+        run_migrations(conn)
+        conn.execute('CREATE INDEX idx_daily_trips_display_name_nocase ON daily_trips(display_name COLLATE NOCASE)')
+        conn.execute('CREATE INDEX idx_vehicles_license_plate_nocase ON vehicles(license_plate COLLATE NOCASE)')
+        conn.execute('CREATE INDEX idx_drivers_name_nocase ON drivers(name COLLATE NOCASE)')
+        conn.execute('DELETE FROM schema_version WHERE version = 11')
+        conn.commit()
+        assert run_migrations(conn) == [11]
+        assert [names for names in index_keys(conn).values() if len(names) > 1] == []
+        assert_no_full_scans(conn, PLAN_CHECKS)
+    finally:
+        conn.close()
+
+
+# Runtime modules keep their own copy of what the frozen steps built; a
+# source added at runtime without a migration has no triggers behind it.
+def test_migrated_triggers_cover_the_runtime_sources(tmp_path):
+    from changes import CHANGE_SOURCES
+    from consequences import DEPENDENCIES
+    from db import TABLES
+    from search import SEARCH_SOURCES
+    from views import VIEWS
+
+    conn = sqlite3.connect(tmp_path / 'plans.db')
+    try:
+        run_migrations(conn)
+        triggers = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+    finally:
+        conn.close()
+    expected = {f'trg_search_{table}_ai' for table, _, _ in SEARCH_SOURCES.values()}
+    expected |= {f'trg_counter_{table}_update' for table in TABLES}
+    expected |= {f'trg_deps_{table}_{column}_ai' for table, column in DEPENDENCIES.values()}
+    expected |= {f'trg_view_{name}_{table}_au' for name, view in VIEWS.items() for table in view.sources}
+    expected |= {f'trg_changes_{table}_ai' for _, table, _ in CHANGE_SOURCES}
+    assert expected - triggers == set()
@@ -0,0 +1,60 @@
+import pytest
+
+from session_store import MemorySessionStore, SessionStore
+
+
+def test_backend_missing_a_method_fails_at_creation():
+    class Incomplete(SessionStore):
+        backend = 'incomplete'
+
+        def get(self, session_id):
+            return None
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_memory_store_round_trip():
+    store = MemorySessionStore(max_entries=2)
+    store.set('a', {'messages': []})
+    store.set('b', {'messages': []})
+    store.set('c', {'messages': []})
+    assert store.get('a') is None
+    assert store.get('c') == {'messages': []}
+    assert store.metrics()['evictions'] == 1
+
+
+def test_sqlite_lease_serialises_turns_across_processes(tmp_path):
+    from session_store import SQLiteSessionStore
+    path = str(tmp_path / 'sessions.db')
+    # Two stores on one file stand in for two worker processes.
+    first = SQLiteSessionStore(path, lock_timeout=0.2)
+    second = SQLiteSessionStore(path, lock_timeout=0.2)
+    with first.lock('s1'):
+        with pytest.raises(TimeoutError):
+            with second.lock('s1'):
+                pass
+        with second.lock('s2'):
+            pass
+    with second.lock('s1'):
+        pass
+    assert second.metrics()['lock_timeouts'] == 1
+
+
+def test_sqlite_lease_of_a_dead_worker_expires(tmp_path):
+    import time
+
+    from session_store import SQLiteSessionStore
+    store = SQLiteSessionStore(str(tmp_path / 'sessions.db'), lock_timeout=0.5)
+    with store._conn() as conn:
+        conn.execute("INSERT INTO session_leases (session_id, owner, expires_at) VALUES ('s1', 'gone', ?)",
+                     (time.time() - 1,))
+    with store.lock('s1'):
+        pass
+
+
+def test_sqlite_sessions_are_shared(tmp_path):
+    from session_store import SQLiteSessionStore
+    path = str(tmp_path / 'sessions.db')
+    SQLiteSessionStore(path).set('s1', {'messages': [{'role': 'user', 'content': 'hi'}]})
+    assert SQLiteSessionStore(path).get('s1') == {'messages': [{'role': 'user', 'content': 'hi'}]}
@@ -0,0 +1,25 @@
+import base64
+import io
+
+from PIL import Image
+
+from tools import process_image_for_trip
+
+
+def blank_image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (40, 30), 'white').save(buffer, 'PNG')
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def test_unreadable_image_names_no_trip(database):
+    assert process_image_for_trip(blank_image()) is None
+
+
+def test_unreadable_trip_image_asks_which_trip(sample_db, chat):
+    with sample_db.acquire() as conn:
+        before = conn.execute('SELECT vehicle_id FROM deployments WHERE trip_id = 1').fetchone()[0]
+    reply = chat('remove the vehicle from this trip', image=blank_image())
+    assert reply['response'].startswith('Which trip do you mean?')
+    with sample_db.acquire() as conn:
+        assert conn.execute('SELECT vehicle_id FROM deployments WHERE trip_id = 1').fetchone()[0] == before
@@ -0,0 +1,52 @@
+from tools import get_deployments_detailed, get_trips_with_routes
+from views import check_views, rebuild_views
+
+
+def assert_consistent():
+    for name, result in check_views().items():
+        assert (name, result['missing'], result['stale']) == (name, 0, 0)
+
+
+def execute(pool, sql, params=()):
+    with pool.acquire() as conn:
+        conn.execute(sql, params)
+        conn.commit()
+
+
+def test_views_follow_base_table_writes(sample_db):
+    assert_consistent()
+    execute(sample_db, "UPDATE routes SET route_display_name = 'South Loop' WHERE id = 1")
+    execute(sample_db, "UPDATE vehicles SET license_plate = 'KA-99-ZZ-0001' WHERE id = 2")
+    execute(sample_db, 'UPDATE deployments SET vehicle_id = 5, driver_id = 5 WHERE trip_id = 3')
+    execute(sample_db, 'DELETE FROM deployments WHERE trip_id = 4')
+    execute(sample_db, 'DELETE FROM daily_trips WHERE id = 4')
+    assert_consistent()
+
+    trips = {trip['id']: trip for trip in get_trips_with_routes()}
+    assert sorted(trips) == [1, 2, 3]
+    assert trips[1]['route_name'] == trips[2]['route_name'] == 'South Loop'
+    deployments = {row['trip_id']: row for row in get_deployments_detailed()}
+    assert sorted(deployments) == [1, 2, 3]
+    assert deployments[2]['license_plate'] == 'KA-99-ZZ-0001'
+    assert (deployments[3]['vehicle_id'], deployments[3]['driver_name']) == (5, 'Deepak Verma')
+
+
+def test_rows_vanish_while_a_join_is_missing(sample_db):
+    with sample_db.acquire() as conn:
+        conn.execute('PRAGMA foreign_keys = OFF')
+        conn.execute('DELETE FROM drivers WHERE id = 1')
+        conn.commit()
+        conn.execute('PRAGMA foreign_keys = ON')
+    assert_consistent()
+    assert 1 not in {row['trip_id'] for row in get_deployments_detailed()}
+
+
+def test_rebuild_repairs_drift(sample_db):
+    execute(sample_db, 'DELETE FROM trip_view WHERE id = 1')
+    execute(sample_db, "UPDATE deployment_view SET driver_name = 'Nobody' WHERE id = 2")
+    report = check_views()
+    assert report['trip_view']['missing'] == 1
+    assert report['deployment_view']['missing'] == report['deployment_view']['stale'] == 1
+    assert rebuild_views() == {'trip_view': 4, 'deployment_view': 4}
+    assert_consistent()
+    assert 1 in {trip['id'] for trip in get_trips_with_routes()}
@@ -1,422 +1,481 @@
+import json
 import sqlite3
-import os
-import base64
-import io
-from PIL import Image
 import re
-
-try:
-    import pytesseract
-except Exception:
-    pytesseract = None
-
-DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'moveinsync.db')
+from collections import defaultdict
+from config import config
+from consequences import assert_unchanged
+from conflicts import RESOURCES, assignment_conflicts, describe as describe_conflict, overlap_sql, overlaps, start_sql
+from db import pool, bump_tables
+from image_pipeline import ocr_text, prepare
+from instrumentation import instrument_module
+from listing import attach_path_totals, list_rows, paths_with_stops
+from migrations import run_migrations
+from search import exact_matches, search_entities, suggestions, trip_matches, unique_match
+
+DB_PATH = config.DB_PATH
 
 def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    return pool.acquire()
 
 def fetch_dicts(query, params=()):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
-    conn.close()
-    return [dict(row) for row in rows]
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        return [dict(row) for row in rows]
 
 # Tools for reading
 def get_all_stops():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM stops')
-    stops = cursor.fetchall()
-    conn.close()
-    return stops
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM stops')
+        stops = cursor.fetchall()
+        return stops
 
 def get_all_paths():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM paths')
-    paths = cursor.fetchall()
-    conn.close()
-    return paths
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM paths')
+        paths = cursor.fetchall()
+        return paths
 
 def get_all_routes():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM routes')
-    routes = cursor.fetchall()
-    conn.close()
-    return routes
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM routes')
+        routes = cursor.fetchall()
+        return routes
 
 def get_all_vehicles():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM vehicles')
-    vehicles = cursor.fetchall()
-    conn.close()
-    return vehicles
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM vehicles')
+        vehicles = cursor.fetchall()
+        return vehicles
 
 def get_unassigned_vehicles():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT * FROM vehicles WHERE id NOT IN (
-            SELECT vehicle_id FROM deployments
-        )
-    ''')
-    vehicles = cursor.fetchall()
-    conn.close()
-    return vehicles
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT * FROM vehicles WHERE id NOT IN (
+                SELECT vehicle_id FROM deployments
+            )
+        ''')
+        vehicles = cursor.fetchall()
+        return vehicles
 
 def get_all_drivers():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM drivers')
-    drivers = cursor.fetchall()
-    conn.close()
-    return drivers
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM drivers')
+        drivers = cursor.fetchall()
+        return drivers
 
 def get_unassigned_drivers():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT * FROM drivers WHERE id NOT IN (
-            SELECT driver_id FROM deployments
-        )
-    ''')
-    drivers = cursor.fetchall()
-    conn.close()
-    return drivers
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT * FROM drivers WHERE id NOT IN (
+                SELECT driver_id FROM deployments
+            )
+        ''')
+        drivers = cursor.fetchall()
+        return drivers
 
 def get_all_trips():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM daily_trips')
-    trips = cursor.fetchall()
-    conn.close()
-    return trips
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM daily_trips')
+        trips = cursor.fetchall()
+        return trips
 
 def get_deployments():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT d.*, v.license_plate, dr.name as driver_name, dt.date, r.name as route_name
-        FROM deployments d
-        JOIN vehicles v ON d.vehicle_id = v.id
-        JOIN drivers dr ON d.driver_id = dr.id
-        JOIN daily_trips dt ON d.trip_id = dt.id
-        JOIN routes r ON dt.route_id = r.id
-    ''')
-    deployments = cursor.fetchall()
-    conn.close()
-    return deployments
-
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT d.*, v.license_plate, dr.name as driver_name, dt.date, r.name as route_name
+            FROM deployments d
+            JOIN vehicles v ON d.vehicle_id = v.id
+            JOIN drivers dr ON d.driver_id = dr.id
+            JOIN daily_trips dt ON d.trip_id = dt.id
+            JOIN routes r ON dt.route_id = r.id
+        ''')
+        deployments = cursor.fetchall()
+        return deployments
+
+# Already shaped by listing.py; the joins follow primary keys, so no row can
+# appear twice.
 def get_paths_with_stops():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT p.id as path_id, p.name as path_name, s.id as stop_id, s.name as stop_name, s.latitude, s.longitude, ps.order_index
-        FROM paths p
-        LEFT JOIN path_stops ps ON ps.path_id = p.id
-        LEFT JOIN stops s ON s.id = ps.stop_id
-        ORDER BY p.id, ps.order_index
-    ''')
-    rows = cursor.fetchall()
-    conn.close()
-    paths = {}
-    for row in rows:
-        path_id = row['path_id']
-        if path_id not in paths:
-            paths[path_id] = {
-                'id': path_id,
-                'name': row['path_name'],
-                'stops': []
-            }
-        if row['stop_id'] is not None:
-            stop_data = {
-                'id': row['stop_id'],
-                'name': row['stop_name'],
-                'latitude': row['latitude'],
-                'longitude': row['longitude'],
-                'order': row['order_index']
-            }
-            if not any(s['id'] == row['stop_id'] for s in paths[path_id]['stops']):
-                paths[path_id]['stops'].append(stop_data)
-    for path in paths.values():
-        path['stops'].sort(key=lambda item: item['order'] if item['order'] is not None else 0)
-    return list(paths.values())
+    return paths_with_stops()
 
 def get_routes_with_paths():
-    results = fetch_dicts('''
-        SELECT r.id, r.path_id, r.route_display_name, r.shift_time, r.direction, 
-               r.start_point, r.end_point, r.status, p.name as path_name
-        FROM routes r
-        JOIN paths p ON r.path_id = p.id
-        ORDER BY r.shift_time
-    ''')
-    seen_route_ids = set()
-    deduplicated = []
-    for route in results:
-        if route['id'] not in seen_route_ids:
-            seen_route_ids.add(route['id'])
-            deduplicated.append(route)
-    return deduplicated
+    routes = list_rows('routes')[0]
+    with get_db_connection() as conn:
+        return attach_path_totals(conn, routes)
 
 def get_trips_with_routes():
-    results = fetch_dicts('''
-        SELECT dt.id, dt.route_id, dt.display_name, dt.booking_status_percentage, 
-               dt.live_status, dt.date, r.route_display_name as route_name, 
-               r.shift_time, p.name as path_name
-        FROM daily_trips dt
-        JOIN routes r ON dt.route_id = r.id
-        JOIN paths p ON r.path_id = p.id
-        ORDER BY dt.date, r.shift_time
-    ''')
-    seen_trip_ids = set()
-    deduplicated = []
-    for trip in results:
-        if trip['id'] not in seen_trip_ids:
-            seen_trip_ids.add(trip['id'])
-            deduplicated.append(trip)
-    return deduplicated
+    return list_rows('trips')[0]
 
 def get_deployments_detailed():
-    results = fetch_dicts('''
-        SELECT d.id, d.trip_id, d.vehicle_id, d.driver_id, v.license_plate, v.type as vehicle_type,
-               v.capacity, v.model, dr.name as driver_name, dr.license_number, dr.phone, 
-               dt.display_name as trip_display_name, dt.booking_status_percentage, 
-               dt.live_status, dt.date, r.route_display_name as route_name
-        FROM deployments d
-        JOIN vehicles v ON d.vehicle_id = v.id
-        JOIN drivers dr ON d.driver_id = dr.id
-        JOIN daily_trips dt ON d.trip_id = dt.id
-        JOIN routes r ON dt.route_id = r.id
-        ORDER BY dt.date, r.shift_time
-    ''')
-    seen_trip_ids = set()
-    deduplicated = []
-    for deployment in results:
-        if deployment['trip_id'] not in seen_trip_ids:
-            seen_trip_ids.add(deployment['trip_id'])
-            deduplicated.append(deployment)
-    return deduplicated
+    return list_rows('deployments')[0]
 
 # Tools for creating
 def create_stop(name, latitude, longitude):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('INSERT INTO stops (name, latitude, longitude) VALUES (?, ?, ?)', (name, latitude, longitude))
-    conn.commit()
-    stop_id = cursor.lastrowid
-    conn.close()
-    return stop_id
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('INSERT INTO stops (name, latitude, longitude) VALUES (?, ?, ?)', (name, latitude, longitude))
+        conn.commit()
+        bump_tables('stops')
+        stop_id = cursor.lastrowid
+        return stop_id
 
 def create_path(name):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('INSERT INTO paths (name) VALUES (?)', (name,))
-    conn.commit()
-    path_id = cursor.lastrowid
-    conn.close()
-    return path_id
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('INSERT INTO paths (name) VALUES (?)', (name,))
+        conn.commit()
+        bump_tables('paths')
+        path_id = cursor.lastrowid
+        return path_id
 
 def create_route(path_id, route_display_name, shift_time, direction, start_point, end_point, status='active'):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''INSERT INTO routes (path_id, route_display_name, shift_time, direction, start_point, end_point, status) 
-                      VALUES (?, ?, ?, ?, ?, ?, ?)''', 
-                   (path_id, route_display_name, shift_time, direction, start_point, end_point, status))
-    conn.commit()
-    route_id = cursor.lastrowid
-    conn.close()
-    return route_id
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''INSERT INTO routes (path_id, route_display_name, shift_time, direction, start_point, end_point, status) 
+                          VALUES (?, ?, ?, ?, ?, ?, ?)''', 
+                       (path_id, route_display_name, shift_time, direction, start_point, end_point, status))
+        conn.commit()
+        bump_tables('routes')
+        route_id = cursor.lastrowid
+        return route_id
 
 def create_vehicle(license_plate, vtype, capacity, model):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('INSERT INTO vehicles (license_plate, type, capacity, model) VALUES (?, ?, ?, ?)', 
-                   (license_plate, vtype, capacity, model))
-    conn.commit()
-    vehicle_id = cursor.lastrowid
-    conn.close()
-    return vehicle_id
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('INSERT INTO vehicles (license_plate, type, capacity, model) VALUES (?, ?, ?, ?)', 
+                       (license_plate, vtype, capacity, model))
+        conn.commit()
+        bump_tables('vehicles')
+        vehicle_id = cursor.lastrowid
+        return vehicle_id
 
 def create_driver(name, license_number, phone):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('INSERT INTO drivers (name, license_number, phone) VALUES (?, ?, ?)', (name, license_number, phone))
-    conn.commit()
-    driver_id = cursor.lastrowid
-    conn.close()
-    return driver_id
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('INSERT INTO drivers (name, license_number, phone) VALUES (?, ?, ?)', (name, license_number, phone))
+        conn.commit()
+        bump_tables('drivers')
+        driver_id = cursor.lastrowid
+        return driver_id
 
 def create_trip(route_id, display_name, booking_status_percentage=0.0, live_status='', date=''):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''INSERT INTO daily_trips (route_id, display_name, booking_status_percentage, live_status, date) 
-                      VALUES (?, ?, ?, ?, ?)''', 
-                   (route_id, display_name, booking_status_percentage, live_status, date))
-    conn.commit()
-    trip_id = cursor.lastrowid
-    conn.close()
-    return trip_id
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''INSERT INTO daily_trips (route_id, display_name, booking_status_percentage, live_status, date) 
+                          VALUES (?, ?, ?, ?, ?)''', 
+                       (route_id, display_name, booking_status_percentage, live_status, date))
+        conn.commit()
+        bump_tables('daily_trips')
+        trip_id = cursor.lastrowid
+        return trip_id
 
 def assign_vehicle_driver(trip_id, vehicle_id, driver_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('INSERT INTO deployments (trip_id, vehicle_id, driver_id) VALUES (?, ?, ?)', (trip_id, vehicle_id, driver_id))
-    conn.commit()
-    deployment_id = cursor.lastrowid
-    conn.close()
-    return deployment_id
+    with get_db_connection() as conn:
+        conflicts = assignment_conflicts(trip_id, vehicle_id, driver_id, conn)
+        if conflicts:
+            raise ValueError('; '.join(describe_conflict(conflict) for conflict in conflicts))
+        cursor = conn.cursor()
+        cursor.execute('INSERT INTO deployments (trip_id, vehicle_id, driver_id) VALUES (?, ?, ?)', (trip_id, vehicle_id, driver_id))
+        conn.commit()
+        bump_tables('deployments')
+        deployment_id = cursor.lastrowid
+        return deployment_id
+
+def _deployment_tuple(item):
+    if isinstance(item, dict):
+        return item.get('trip_id'), item.get('vehicle_id'), item.get('driver_id')
+    trip_id, vehicle_id, driver_id = item
+    return trip_id, vehicle_id, driver_id
+
+# Validates every (trip, vehicle, driver) row with one set-based query and
+# upserts the valid ones in a single transaction. With atomic=True any
+# conflict aborts the whole batch. A vehicle or driver already deployed in an
+# overlapping shift is a conflict; within the batch the earlier row wins.
+def bulk_assign_deployments(assignments, atomic=False, precondition=None):
+    rows = [(index,) + _deployment_tuple(item) for index, item in enumerate(assignments)]
+    result = {'requested': len(rows), 'created': 0, 'updated': 0, 'conflicts': []}
+    if not rows and precondition is None:
+        return result
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            if precondition is not None:
+                precondition(conn)
+            cursor.execute('''CREATE TEMP TABLE IF NOT EXISTS bulk_deployments (
+                row_index INTEGER PRIMARY KEY,
+                trip_id INTEGER,
+                vehicle_id INTEGER,
+                driver_id INTEGER,
+                date TEXT,
+                start_min INTEGER
+            )''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS temp.idx_bulk_deployments_vehicle ON bulk_deployments(vehicle_id, date)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS temp.idx_bulk_deployments_driver ON bulk_deployments(driver_id, date)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS temp.idx_bulk_deployments_trip ON bulk_deployments(trip_id)')
+            cursor.execute('DELETE FROM temp.bulk_deployments')
+            cursor.executemany('INSERT INTO temp.bulk_deployments (row_index, trip_id, vehicle_id, driver_id) VALUES (?, ?, ?, ?)', rows)
+            cursor.execute(f'''UPDATE temp.bulk_deployments SET (date, start_min) = (
+                SELECT dt.date, {start_sql('r.shift_time')} FROM daily_trips dt LEFT JOIN routes r ON r.id = dt.route_id
+                WHERE dt.id = bulk_deployments.trip_id
+            )''')
+            # Existing windows each row overlaps, other than its own trip's.
+            windows = '''(SELECT json_group_array(w.trip_id) FROM deployment_windows w
+                WHERE w.{resource}_id = b.{resource}_id AND w.date IS b.date AND {overlap}
+                  AND w.trip_id IS NOT b.trip_id)'''
+            checked = cursor.execute(f'''
+                SELECT b.row_index, b.trip_id, b.vehicle_id, b.driver_id, b.date, b.start_min,
+                       dt.id IS NULL AS missing_trip,
+                       v.id IS NULL AS missing_vehicle,
+                       dr.id IS NULL AS missing_driver,
+                       COUNT(*) OVER (PARTITION BY b.trip_id) > 1 AS duplicate_trip,
+                       {windows.format(resource='vehicle', overlap=overlap_sql('w', 'b'))} AS vehicle_windows,
+                       {windows.format(resource='driver', overlap=overlap_sql('w', 'b'))} AS driver_windows,
+                       d.id IS NOT NULL AS existing
+                FROM temp.bulk_deployments b
+                LEFT JOIN daily_trips dt ON dt.id = b.trip_id
+                LEFT JOIN vehicles v ON v.id = b.vehicle_id
+                LEFT JOIN drivers dr ON dr.id = b.driver_id
+                LEFT JOIN deployments d ON d.trip_id = b.trip_id
+                ORDER BY b.row_index
+            ''', {'shift': config.OPTIMIZER_SHIFT_MINUTES}).fetchall()
+            cursor.execute('DELETE FROM temp.bulk_deployments')
+
+            # Rows are accepted in order. An accepted row replaces its trip's
+            # existing window, and later rows must fit around it; a rejected
+            # row changes nothing, so its trip keeps its window.
+            valid = []
+            accepted_trips = set()
+            booked = defaultdict(list)
+            for row in checked:
+                reasons = [reason for flag, reason in (
+                    ('missing_trip', 'trip not found'),
+                    ('missing_vehicle', 'vehicle not found'),
+                    ('missing_driver', 'driver not found'),
+                    ('duplicate_trip', 'trip appears more than once in batch'),
+                ) if row[flag]]
+                if not reasons:
+                    for resource in RESOURCES:
+                        key = (resource, row[f'{resource}_id'], row['date'])
+                        existing = [trip for trip in json.loads(row[f'{resource}_windows']) if trip not in accepted_trips]
+                        if existing or any(overlaps(start, row['start_min']) for start in booked[key]):
+                            reasons.append(f'{resource} already deployed in an overlapping shift')
+                if reasons:
+                    result['conflicts'].append({
+                        'index': row['row_index'],
+                        'trip_id': row['trip_id'],
+                        'vehicle_id': row['vehicle_id'],
+                        'driver_id': row['driver_id'],
+                        'reasons': reasons,
+                    })
+                else:
+                    accepted_trips.add(row['trip_id'])
+                    for resource in RESOURCES:
+                        booked[(resource, row[f'{resource}_id'], row['date'])].append(row['start_min'])
+                    valid.append((row['trip_id'], row['vehicle_id'], row['driver_id']))
+                    result['updated' if row['existing'] else 'created'] += 1
+
+            if atomic and result['conflicts']:
+                conn.rollback()
+                result['created'] = result['updated'] = 0
+                return result
+            cursor.executemany('''
+                INSERT INTO deployments (trip_id, vehicle_id, driver_id) VALUES (?, ?, ?)
+                ON CONFLICT(trip_id) DO UPDATE SET vehicle_id = excluded.vehicle_id, driver_id = excluded.driver_id
+            ''', valid)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    if valid:
+        bump_tables('deployments')
+    return result
 
 # Check consequences
 def check_trip_booked_percentage(trip_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT booking_status_percentage FROM daily_trips WHERE id = ?', (trip_id,))
-    result = cursor.fetchone()
-    conn.close()
-    return result[0] if result else 0.0
-
-def find_trip_by_display_name(display_name):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT id FROM daily_trips WHERE display_name LIKE ?', (f'%{display_name}%',))
-    result = cursor.fetchone()
-    conn.close()
-    return result[0] if result else None
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT booking_status_percentage FROM daily_trips WHERE id = ?', (trip_id,))
+        result = cursor.fetchone()
+        return result[0] if result else 0.0
+
+def find_trip_by_display_name(display_name, date=None):
+    match = unique_match('trips', display_name, date)
+    return match['id'] if match else None
 
 def get_stops_for_path(path_name):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT s.name FROM stops s
-        JOIN path_stops ps ON s.id = ps.stop_id
-        JOIN paths p ON ps.path_id = p.id
-        WHERE p.name = ?
-        ORDER BY ps.order_index
-    ''', (path_name,))
-    results = cursor.fetchall()
-    conn.close()
-    return [row[0] for row in results]
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT s.name FROM stops s
+            JOIN path_stops ps ON s.id = ps.stop_id
+            JOIN paths p ON ps.path_id = p.id
+            WHERE p.name = ?
+            ORDER BY ps.order_index
+        ''', (path_name,))
+        results = cursor.fetchall()
+        return [row[0] for row in results]
 
 def get_routes_using_path(path_name):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT r.route_display_name, r.shift_time, r.status FROM routes r
-        JOIN paths p ON r.path_id = p.id
-        WHERE p.name = ?
-    ''', (path_name,))
-    results = cursor.fetchall()
-    conn.close()
-    return [dict(row) for row in results]
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT r.route_display_name, r.shift_time, r.status FROM routes r
+            JOIN paths p ON r.path_id = p.id
+            WHERE p.name = ?
+        ''', (path_name,))
+        results = cursor.fetchall()
+        return [dict(row) for row in results]
 
 def create_path_with_stops(path_name, stop_names):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('INSERT INTO paths (name) VALUES (?)', (path_name,))
-    path_id = cursor.lastrowid
-    for idx, stop_name in enumerate(stop_names, 1):
-        cursor.execute('SELECT id FROM stops WHERE name = ?', (stop_name,))
-        stop_result = cursor.fetchone()
-        if stop_result:
-            cursor.execute('INSERT INTO path_stops (path_id, stop_id, order_index) VALUES (?, ?, ?)', 
-                          (path_id, stop_result[0], idx))
-    conn.commit()
-    conn.close()
-    return path_id
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('INSERT INTO paths (name) VALUES (?)', (path_name,))
+        path_id = cursor.lastrowid
+        for idx, stop_name in enumerate(stop_names, 1):
+            cursor.execute('SELECT id FROM stops WHERE name = ?', (stop_name,))
+            stop_result = cursor.fetchone()
+            if stop_result:
+                cursor.execute('INSERT INTO path_stops (path_id, stop_id, order_index) VALUES (?, ?, ?)', 
+                              (path_id, stop_result[0], idx))
+        conn.commit()
+        bump_tables('paths', 'path_stops')
+        return path_id
 
 # Helper functions for agent
 def find_vehicle_by_plate(license_plate):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT id FROM vehicles WHERE license_plate LIKE ?', (f'%{license_plate}%',))
-    result = cursor.fetchone()
-    conn.close()
-    return result[0] if result else None
+    match = unique_match('vehicles', license_plate)
+    return match['id'] if match else None
 
 def find_driver_by_name(name):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT id FROM drivers WHERE name LIKE ?', (f'%{name}%',))
-    result = cursor.fetchone()
-    conn.close()
-    return result[0] if result else None
+    match = unique_match('drivers', name)
+    return match['id'] if match else None
+
+def _dates_text(matches, limit=5):
+    dates = sorted({str(match['date']) for match in matches})
+    return ', '.join(dates[:limit]) + (f" and {len(dates) - limit} more" if len(dates) > limit else '')
+
+# Reply for a name the exact finders could not pin to one row. A trip name
+# is only ambiguous when several trips share it on the same date.
+def unresolved_message(label, kind, name, date=None):
+    if kind == 'trips':
+        matches = trip_matches(name, date)
+        if len({match['date'] for match in matches}) > 1:
+            return f"{label} '{name}' runs on {_dates_text(matches)}. Which date do you mean?"
+        if len(matches) > 1:
+            return f"More than one {label.lower()} is named '{name}' on {matches[0]['date']}. Please be more specific."
+        other_dates = trip_matches(name) if date else []
+        if other_dates:
+            return f"{label} '{name}' does not run on {date}. It runs on {_dates_text(other_dates)}."
+    elif len(exact_matches(kind, name)) > 1:
+        return f"More than one {label.lower()} is named '{name}'. Please be more specific."
+    close = ["'" + candidate + "'" for candidate in suggestions(kind, name) if candidate.lower() != (name or '').strip().lower()]
+    if close:
+        return f"{label} '{name}' not found. Did you mean {', '.join(close)}?"
+    return f"{label} '{name}' not found."
 
 def check_stop_in_use(stop_name):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT COUNT(*) FROM path_stops ps 
-        JOIN stops s ON ps.stop_id = s.id 
-        WHERE s.name = ?
-    ''', (stop_name,))
-    result = cursor.fetchone()
-    conn.close()
-    return result[0] > 0 if result else False
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT COUNT(*) FROM path_stops ps 
+            JOIN stops s ON ps.stop_id = s.id 
+            WHERE s.name = ?
+        ''', (stop_name,))
+        result = cursor.fetchone()
+        return result[0] > 0 if result else False
 
 def check_vehicle_exists(license_plate):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT COUNT(*) FROM vehicles WHERE license_plate = ?', (license_plate,))
-    result = cursor.fetchone()
-    conn.close()
-    return result[0] > 0 if result else False
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) FROM vehicles WHERE license_plate = ?', (license_plate,))
+        result = cursor.fetchone()
+        return result[0] > 0 if result else False
 
 def delete_stop_by_name(name):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM stops WHERE name = ?', (name,))
-    deleted = cursor.rowcount > 0
-    conn.commit()
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM path_stops WHERE stop_id IN (SELECT id FROM stops WHERE name = ?)', (name,))
+        cursor.execute('DELETE FROM stops WHERE name = ?', (name,))
+        deleted = cursor.rowcount > 0
+        conn.commit()
+        bump_tables('stops', 'path_stops')
+        return deleted
+
+# Deletes one row by id along with the rows referencing it. `expected` is
+# (name, dependents) as previewed for confirmation; the delete is refused with
+# StaleImpactError if the row no longer looks like that.
+def _delete_by_id(entity, entity_id, statements, tables, expected=None):
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            if expected is not None:
+                assert_unchanged(conn, entity, entity_id, *expected)
+            for statement in statements:
+                cursor.execute(statement, (entity_id,))
+            deleted = cursor.rowcount > 0
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    bump_tables(*tables)
     return deleted
 
+def delete_stop(stop_id, expected=None):
+    return _delete_by_id('stop', stop_id, (
+        'DELETE FROM path_stops WHERE stop_id = ?',
+        'DELETE FROM stops WHERE id = ?',
+    ), ('stops', 'path_stops'), expected)
+
+def delete_path(path_id, expected=None):
+    return _delete_by_id('path', path_id, (
+        'DELETE FROM path_stops WHERE path_id = ?',
+        'DELETE FROM paths WHERE id = ?',
+    ), ('paths', 'path_stops'), expected)
+
 def get_trip_info(trip_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM daily_trips WHERE id = ?', (trip_id,))
-    result = cursor.fetchone()
-    conn.close()
-    return dict(result) if result else None
-
-def get_trip_status_by_name(trip_display_name):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT dt.id, dt.display_name, dt.booking_status_percentage, dt.live_status, dt.date,
-               r.route_display_name, v.license_plate, d.name as driver_name
-        FROM daily_trips dt
-        JOIN routes r ON dt.route_id = r.id
-        LEFT JOIN deployments dep ON dt.id = dep.trip_id
-        LEFT JOIN vehicles v ON dep.vehicle_id = v.id
-        LEFT JOIN drivers d ON dep.driver_id = d.id
-        WHERE dt.display_name LIKE ?
-    ''', (f'%{trip_display_name}%',))
-    result = cursor.fetchone()
-    conn.close()
-    return dict(result) if result else None
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM daily_trips WHERE id = ?', (trip_id,))
+        result = cursor.fetchone()
+        return dict(result) if result else None
+
+def get_trip_status_by_name(trip_display_name, date=None):
+    trip_id = find_trip_by_display_name(trip_display_name, date)
+    if trip_id is None:
+        return None
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT dt.id, dt.display_name, dt.booking_status_percentage, dt.live_status, dt.date,
+                   r.route_display_name, v.license_plate, d.name as driver_name
+            FROM daily_trips dt
+            JOIN routes r ON dt.route_id = r.id
+            LEFT JOIN deployments dep ON dt.id = dep.trip_id
+            LEFT JOIN vehicles v ON dep.vehicle_id = v.id
+            LEFT JOIN drivers d ON dep.driver_id = d.id
+            WHERE dt.id = ?
+        ''', (trip_id,))
+        result = cursor.fetchone()
+        return dict(result) if result else None
 
 # Enhanced image processing with vision capabilities for screenshot analysis
 def process_image_for_trip(image_data):
-    if not image_data:
+    image = prepare(image_data)
+    if image is None:
         return None
-    try:
-        image_bytes = base64.b64decode(image_data)
-        image = Image.open(io.BytesIO(image_bytes))
-    except Exception:
-        return None
-    
-    text_content = ''
-    if pytesseract:
-        try:
-            text_content = pytesseract.image_to_string(image.convert('L'))
-        except Exception:
-            text_content = ''
+    text_content = ocr_text(image)
     
     if text_content:
         trip_patterns = [
@@ -435,207 +494,41 @@ def process_image_for_trip(image_data):
                 trip_id = find_trip_by_display_name(trip_display_name)
                 if trip_id:
                     return trip_id
-        
-        match = re.search(r'trip\s*#?\s*(\d+)', text_content, re.IGNORECASE)
-        if match:
-            return int(match.group(1))
-        
-        digits = re.findall(r'\b(\d{1,4})\b', text_content)
-        for value in digits:
-            try:
-                parsed = int(value)
-                if 1 <= parsed <= 100:
-                    return parsed
-            except ValueError:
-                continue
     
-    width, height = image.size
-    if width or height:
-        fallback = (width + height) % 6 + 1
-        return fallback
+    # Anything short of an exact trip name (a stray number, "trip #3") is a
+    # guess; callers ask which trip is meant instead.
     return None
 
 # Additional CRUD operations
-def delete_vehicle(vehicle_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM vehicles WHERE id = ?', (vehicle_id,))
-    conn.commit()
-    conn.close()
-    return cursor.rowcount > 0
-
-def delete_driver(driver_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM drivers WHERE id = ?', (driver_id,))
-    conn.commit()
-    conn.close()
-    return cursor.rowcount > 0
+def delete_vehicle(vehicle_id, expected=None):
+    return _delete_by_id('vehicle', vehicle_id, (
+        'DELETE FROM deployments WHERE vehicle_id = ?',
+        'DELETE FROM vehicles WHERE id = ?',
+    ), ('vehicles', 'deployments'), expected)
+
+def delete_driver(driver_id, expected=None):
+    return _delete_by_id('driver', driver_id, (
+        'DELETE FROM deployments WHERE driver_id = ?',
+        'DELETE FROM drivers WHERE id = ?',
+    ), ('drivers', 'deployments'), expected)
 
 def update_trip_status(trip_id, status):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('UPDATE daily_trips SET status = ? WHERE id = ?', (status, trip_id))
-    conn.commit()
-    conn.close()
-    return cursor.rowcount > 0
-
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('UPDATE daily_trips SET status = ? WHERE id = ?', (status, trip_id))
+        conn.commit()
+        bump_tables('daily_trips')
+        return cursor.rowcount > 0
+
+# Idempotent: sample rows that already exist (by name, plate, licence or
+# trip and date) are skipped, so restarts never duplicate them.
 def init_database():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("PRAGMA foreign_keys = OFF")
-    
-    def column_exists(table, column):
-        cursor.execute(f"PRAGMA table_info({table})")
-        return any(row[1] == column for row in cursor.fetchall())
-    
-    cursor.execute('''CREATE TABLE IF NOT EXISTS stops (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL,
-        latitude REAL,
-        longitude REAL
-    )''')
-    
-    cursor.execute('''CREATE TABLE IF NOT EXISTS paths (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL
-    )''')
-    
-    cursor.execute('''CREATE TABLE IF NOT EXISTS path_stops (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        path_id INTEGER,
-        stop_id INTEGER,
-        order_index INTEGER,
-        FOREIGN KEY (path_id) REFERENCES paths(id),
-        FOREIGN KEY (stop_id) REFERENCES stops(id)
-    )''')
-    
-    cursor.execute('''CREATE TABLE IF NOT EXISTS routes (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        path_id INTEGER,
-        route_display_name TEXT,
-        shift_time TEXT,
-        direction TEXT,
-        start_point TEXT,
-        end_point TEXT,
-        status TEXT DEFAULT 'active',
-        FOREIGN KEY (path_id) REFERENCES paths(id)
-    )''')
-    
-    if not column_exists('routes', 'route_display_name'):
-        cursor.execute('ALTER TABLE routes ADD COLUMN route_display_name TEXT')
-    if not column_exists('routes', 'shift_time'):
-        cursor.execute('ALTER TABLE routes ADD COLUMN shift_time TEXT')
-    if not column_exists('routes', 'direction'):
-        cursor.execute('ALTER TABLE routes ADD COLUMN direction TEXT')
-    if not column_exists('routes', 'start_point'):
-        cursor.execute('ALTER TABLE routes ADD COLUMN start_point TEXT')
-    if not column_exists('routes', 'end_point'):
-        cursor.execute('ALTER TABLE routes ADD COLUMN end_point TEXT')
-    
-    cursor.execute('''CREATE TABLE IF NOT EXISTS vehicles (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        license_plate TEXT UNIQUE,
-        type TEXT,
-        capacity INTEGER,
-        model TEXT
-    )''')
-    
-    if not column_exists('vehicles', 'type'):
-        cursor.execute('ALTER TABLE vehicles ADD COLUMN type TEXT')
-    
-    cursor.execute('''CREATE TABLE IF NOT EXISTS drivers (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT,
-        license_number TEXT,
-        phone TEXT
-    )''')
-    
-    cursor.execute('''CREATE TABLE IF NOT EXISTS daily_trips (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        route_id INTEGER,
-        display_name TEXT,
-        booking_status_percentage REAL,
-        live_status TEXT,
-        date TEXT,
-        FOREIGN KEY (route_id) REFERENCES routes(id)
-    )''')
-    
-    if not column_exists('daily_trips', 'display_name'):
-        cursor.execute('ALTER TABLE daily_trips ADD COLUMN display_name TEXT')
-    if not column_exists('daily_trips', 'booking_status_percentage'):
-        cursor.execute('ALTER TABLE daily_trips ADD COLUMN booking_status_percentage REAL')
-    if not column_exists('daily_trips', 'live_status'):
-        cursor.execute('ALTER TABLE daily_trips ADD COLUMN live_status TEXT')
-    
-    if not column_exists('routes', 'status'):
-        cursor.execute('ALTER TABLE routes ADD COLUMN status TEXT DEFAULT "active"')
-    
-    cursor.execute('''CREATE TABLE IF NOT EXISTS deployments (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        trip_id INTEGER UNIQUE,
-        vehicle_id INTEGER,
-        driver_id INTEGER,
-        FOREIGN KEY (trip_id) REFERENCES daily_trips(id),
-        FOREIGN KEY (vehicle_id) REFERENCES vehicles(id),
-        FOREIGN KEY (driver_id) REFERENCES drivers(id)
-    )''')
-    
-    conn.commit()
-    
-    from sample_data import SAMPLE_STOPS, SAMPLE_ROUTES, SAMPLE_VEHICLES, SAMPLE_DRIVERS, SAMPLE_TRIPS, SAMPLE_DEPLOYMENTS, SAMPLE_PATHS, SAMPLE_PATH_STOPS
-    
-    for stop in SAMPLE_STOPS:
-        cursor.execute('INSERT OR IGNORE INTO stops (name, latitude, longitude) VALUES (?, ?, ?)', stop)
-    
-    for path_name, status in SAMPLE_PATHS:
-        cursor.execute('INSERT OR IGNORE INTO paths (name) VALUES (?)', (path_name,))
-    
-    for path_id, stop_id, order_index in SAMPLE_PATH_STOPS:
-        cursor.execute('INSERT OR IGNORE INTO path_stops (path_id, stop_id, order_index) VALUES (?, ?, ?)', 
-                      (path_id, stop_id, order_index))
-    
-    for path_id, display_name, shift_time, direction, start_point, end_point in SAMPLE_ROUTES:
-        try:
-            cursor.execute('''INSERT OR IGNORE INTO routes 
-                (path_id, route_display_name, shift_time, direction, start_point, end_point, status) 
-                VALUES (?, ?, ?, ?, ?, ?, ?)''', 
-                (path_id, display_name, shift_time, direction, start_point, end_point, 'active'))
-        except sqlite3.OperationalError:
-            cursor.execute('''INSERT OR IGNORE INTO routes 
-                (path_id, route_display_name, shift_time, direction, start_point, end_point) 
-                VALUES (?, ?, ?, ?, ?, ?)''', 
-                (path_id, display_name, shift_time, direction, start_point, end_point))
-    
-    for license_plate, vtype, capacity, model in SAMPLE_VEHICLES:
-        cursor.execute('INSERT OR IGNORE INTO vehicles (license_plate, type, capacity, model) VALUES (?, ?, ?, ?)', 
-                      (license_plate, vtype, capacity, model))
-    
-    for name, license_num, phone in SAMPLE_DRIVERS:
-        cursor.execute('INSERT OR IGNORE INTO drivers (name, license_number, phone) VALUES (?, ?, ?)', 
-                      (name, license_num, phone))
-    
-    for route_id, display_name, booking_pct, live_status, date in SAMPLE_TRIPS:
-        cursor.execute('''INSERT OR IGNORE INTO daily_trips 
-            (route_id, display_name, booking_status_percentage, live_status, date) 
-            VALUES (?, ?, ?, ?, ?)''', 
-            (route_id, display_name, booking_pct, live_status, date))
-    
-    for trip_display_name, vehicle_plate, driver_name in SAMPLE_DEPLOYMENTS:
-        cursor.execute('SELECT id FROM daily_trips WHERE display_name = ?', (trip_display_name,))
-        trip_result = cursor.fetchone()
-        if trip_result:
-            trip_id = trip_result[0]
-            cursor.execute('SELECT id FROM vehicles WHERE license_plate = ?', (vehicle_plate,))
-            vehicle_result = cursor.fetchone()
-            cursor.execute('SELECT id FROM drivers WHERE name = ?', (driver_name,))
-            driver_result = cursor.fetchone()
-            if vehicle_result and driver_result:
-                cursor.execute('INSERT OR IGNORE INTO deployments (trip_id, vehicle_id, driver_id) VALUES (?, ?, ?)', 
-                              (trip_id, vehicle_result[0], driver_result[0]))
-    
-    cursor.execute("PRAGMA foreign_keys = ON")
-    conn.commit()
-    conn.close()
-    print("[OK] Database initialized with dummy data")
\ No newline at end of file
+    from importer import Importer
+    from sample_data import SAMPLE_RECORDS
+    with get_db_connection() as conn:
+        run_migrations(conn)
+        result = Importer(conn).import_all(SAMPLE_RECORDS)
+    print(f"[OK] Database initialized with dummy data ({result['inserted']} new rows)")
+
+# Every DB function above reports wall time, statements, rows and output size.
+instrument_module(globals(), exclude=('get_db_connection',))
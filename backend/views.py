@@ -0,0 +1,131 @@
+import argparse
+import sys
+from typing import Dict, NamedTuple, Tuple
+
+from db import bump_tables, pool
+
+
+class View(NamedTuple):
+    select: str
+    # base table -> (view column, join expression) identifying the view rows
+    # that a change to one base row can affect.
+    sources: Dict[str, Tuple[str, str]]
+    indexes: Tuple[str, ...]
+
+
+# Denormalized copies of the trips and deployments listings, so the
+# dashboards page through one table instead of a 4-5 table join. Inner joins
+# as in the listings: a row disappears while anything it joins is missing.
+# The tables and triggers are built by migration 9, so changing a view here
+# means adding a migration that rebuilds it.
+VIEWS = {
+    'trip_view': View(
+        select='''SELECT dt.id, dt.route_id, dt.display_name, dt.booking_status_percentage, dt.live_status, dt.date,
+                r.route_display_name AS route_name, r.shift_time, r.path_id, p.name AS path_name
+            FROM daily_trips dt JOIN routes r ON dt.route_id = r.id JOIN paths p ON r.path_id = p.id''',
+        sources={
+            'daily_trips': ('id', 'dt.id'),
+            'routes': ('route_id', 'dt.route_id'),
+            'paths': ('path_id', 'r.path_id'),
+        },
+        indexes=(
+            "(COALESCE(date, ''), COALESCE(shift_time, ''), id)",
+            '(date, live_status)',
+            '(route_id)',
+            '(path_id)',
+        ),
+    ),
+    'deployment_view': View(
+        select='''SELECT d.id, d.trip_id, d.vehicle_id, d.driver_id, v.license_plate, v.type AS vehicle_type, v.capacity,
+                v.model, dr.name AS driver_name, dr.license_number, dr.phone, dt.display_name AS trip_display_name,
+                dt.booking_status_percentage, dt.live_status, dt.date, dt.route_id,
+                r.route_display_name AS route_name, r.shift_time
+            FROM deployments d
+            JOIN vehicles v ON d.vehicle_id = v.id
+            JOIN drivers dr ON d.driver_id = dr.id
+            JOIN daily_trips dt ON d.trip_id = dt.id
+            JOIN routes r ON dt.route_id = r.id''',
+        sources={
+            'deployments': ('id', 'd.id'),
+            'vehicles': ('vehicle_id', 'd.vehicle_id'),
+            'drivers': ('driver_id', 'd.driver_id'),
+            'daily_trips': ('trip_id', 'd.trip_id'),
+            'routes': ('route_id', 'dt.route_id'),
+        },
+        indexes=(
+            "(COALESCE(date, ''), COALESCE(shift_time, ''), id)",
+            '(date, live_status)',
+            '(trip_id)',
+            '(vehicle_id)',
+            '(driver_id)',
+            '(route_id)',
+        ),
+    ),
+}
+
+# Base tables whose cached responses may have served a drifted view.
+VIEW_TABLES = ('daily_trips', 'deployments')
+
+
+# For bulk loads that bypass the per-row triggers (see importer.py). New base
+# rows have ids >= min_id, so only view rows joining them are derived.
+def refresh_new_rows(conn, table, min_id):
+    for name, view in VIEWS.items():
+        if table in view.sources:
+            conn.execute(f'INSERT OR REPLACE INTO {name} {view.select} WHERE {view.sources[table][1]} >= ?', (min_id,))
+
+
+# Rows the triggers should have produced but the view lacks (missing) and
+# rows the view holds that the base tables no longer produce (stale).
+def check_views(conn=None):
+    if conn is None:
+        with pool.acquire() as conn:
+            return check_views(conn)
+    report = {}
+    for name, view in VIEWS.items():
+        columns = ', '.join(row[1] for row in conn.execute(f'PRAGMA table_info({name})'))
+        expected = f'SELECT {columns} FROM ({view.select})'
+        actual = f'SELECT {columns} FROM {name}'
+        report[name] = {
+            'rows': conn.execute(f'SELECT COUNT(*) FROM {name}').fetchone()[0],
+            'missing': conn.execute(f'SELECT COUNT(*) FROM ({expected} EXCEPT {actual})').fetchone()[0],
+            'stale': conn.execute(f'SELECT COUNT(*) FROM ({actual} EXCEPT {expected})').fetchone()[0],
+        }
+    return report
+
+
+def rebuild_views(conn=None):
+    if conn is None:
+        with pool.acquire() as conn:
+            return rebuild_views(conn)
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        counts = {}
+        for name, view in VIEWS.items():
+            conn.execute(f'DELETE FROM {name}')
+            counts[name] = conn.execute(f'INSERT INTO {name} {view.select}').rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    bump_tables(*VIEW_TABLES)
+    return counts
+
+
+if __name__ == '__main__':
+    from migrations import run_migrations
+
+    parser = argparse.ArgumentParser(description='Check or rebuild the materialized dashboard views.')
+    parser.add_argument('command', choices=('check', 'rebuild'))
+    args = parser.parse_args()
+    run_migrations()
+    if args.command == 'rebuild':
+        for name, count in rebuild_views().items():
+            print(f"[OK] Rebuilt {name}: {count} rows")
+    else:
+        drifted = False
+        for name, result in check_views().items():
+            drifted = drifted or result['missing'] or result['stale']
+            status = 'DRIFT' if result['missing'] or result['stale'] else 'OK'
+            print(f"[{status}] {name}: {result['rows']} rows, {result['missing']} missing, {result['stale']} stale")
+        sys.exit(1 if drifted else 0)
@@ -0,0 +1,50 @@
+import axios from 'axios';
+import { ENDPOINTS } from './config';
+
+// Read the change-log cursor before loading collections, so anything that
+// changes during the load is replayed (re-applying a row is harmless).
+const fetchChangeCursor = async () => {
+  const response = await axios.get(ENDPOINTS.CHANGES);
+  return response.data.cursor;
+};
+
+// Applies one collection's {upserted, deleted} delta to a list of rows by id.
+const applyDelta = (items, delta) => {
+  if (!delta) {
+    return items;
+  }
+  const deleted = new Set(delta.deleted || []);
+  const upserted = new Map((delta.upserted || []).map(row => [row.id, row]));
+  const next = items
+    .filter(item => !deleted.has(item.id))
+    .map(item => {
+      const row = upserted.get(item.id);
+      if (!row) {
+        return item;
+      }
+      upserted.delete(item.id);
+      return { ...item, ...row };
+    });
+  return next.concat(Array.from(upserted.values()));
+};
+
+// Calls onChanges({collection: delta}) for every pushed change and onReset()
+// when the client fell too far behind and must reload. EventSource reconnects
+// on its own and resumes from the last event id. Returns an unsubscribe.
+const subscribeToChanges = (since, onChanges, onReset) => {
+  if (typeof EventSource === 'undefined') {
+    return () => {};
+  }
+  const source = new EventSource(`${ENDPOINTS.CHANGES_STREAM}?since=${since}`);
+  source.addEventListener('changes', event => {
+    const delta = JSON.parse(event.data);
+    if (delta.reset) {
+      onReset();
+    } else {
+      onChanges(delta.changes || {});
+    }
+  });
+  return () => source.close();
+};
+
+export { fetchChangeCursor, applyDelta, subscribeToChanges };
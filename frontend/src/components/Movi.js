@@ -9,6 +9,7 @@ const Movi = ({ context }) => {
   const [isListening, setIsListening] = useState(false);
   const [awaitingConfirmation, setAwaitingConfirmation] = useState(false);
   const [loading, setLoading] = useState(false);
+  const [streaming, setStreaming] = useState(false);
   const fileInputRef = useRef(null);
   const recognitionRef = useRef(null);
   const sessionIdRef = useRef('');
@@ -48,6 +49,64 @@ const Movi = ({ context }) => {
     }
   };
 
+  // Reads the /chat/stream Server-Sent Events body, passing each piece of
+  // reply text to onChunk, and resolves with the final /chat-style payload.
+  const streamChat = async (payload, onChunk) => {
+    const response = await fetch(ENDPOINTS.CHAT_STREAM, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify(payload)
+    });
+    if (!response.ok || !response.body) {
+      throw new Error(`Stream request failed (${response.status})`);
+    }
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let result = null;
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) {
+        break;
+      }
+      buffer += decoder.decode(value, { stream: true });
+      let boundary = buffer.indexOf('\n\n');
+      while (boundary !== -1) {
+        const block = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+        boundary = buffer.indexOf('\n\n');
+        let event = 'message';
+        let data = '';
+        block.split('\n').forEach(line => {
+          if (line.startsWith('event:')) {
+            event = line.slice(6).trim();
+          } else if (line.startsWith('data:')) {
+            data += line.slice(5).trim();
+          }
+        });
+        if (!data) {
+          continue;
+        }
+        const parsed = JSON.parse(data);
+        if (event === 'chunk') {
+          onChunk(parsed.text || '');
+        } else if (event === 'done' || event === 'error') {
+          result = parsed;
+        }
+      }
+    }
+    return result;
+  };
+
+  const appendToLastMessage = (text) => {
+    setMessages(prev => {
+      const next = [...prev];
+      const last = next[next.length - 1];
+      next[next.length - 1] = { ...last, text: last.text + text };
+      return next;
+    });
+  };
+
   const sendMessage = async (messageText = null, imageData = null) => {
     const textToSend = (messageText ?? input).trim();
     if (!textToSend && !imageData) {
@@ -76,20 +135,48 @@ const Movi = ({ context }) => {
         payload.image = imageData;
       }
       
-      const response = await axios.post(ENDPOINTS.CHAT, payload);
-      if (response.data.sessionId) {
-        sessionIdRef.current = response.data.sessionId;
+      let started = false;
+      let data = null;
+      try {
+        data = await streamChat(payload, (text) => {
+          if (!started) {
+            started = true;
+            setStreaming(true);
+            setMessages(prev => [...prev, {
+              role: 'assistant',
+              text,
+              timestamp: new Date().toISOString()
+            }]);
+          } else {
+            appendToLastMessage(text);
+          }
+        });
+      } catch (streamError) {
+        if (started) {
+          throw streamError;
+        }
+        // Servers or browsers without streaming support fall back to /chat.
+        data = (await axios.post(ENDPOINTS.CHAT, payload)).data;
+      }
+      data = data || {};
+      if (data.sessionId) {
+        sessionIdRef.current = data.sessionId;
       }
       
-      const assistantText = response.data.response || "I'm not sure how to help with that.";
+      const assistantText = data.response || "I'm not sure how to help with that.";
       const assistantEntry = {
         role: 'assistant',
         text: assistantText,
-        timestamp: new Date().toISOString()
+        timestamp: new Date().toISOString(),
+        isError: Boolean(data.error)
       };
       
-      setMessages(prev => [...prev, assistantEntry]);
-      setAwaitingConfirmation(Boolean(response.data.awaitingConfirmation));
+      if (started) {
+        setMessages(prev => [...prev.slice(0, -1), assistantEntry]);
+      } else {
+        setMessages(prev => [...prev, assistantEntry]);
+      }
+      setAwaitingConfirmation(Boolean(data.awaitingConfirmation));
       
       if (assistantText) {
         speakText(assistantText);
@@ -104,6 +191,7 @@ const Movi = ({ context }) => {
       setMessages(prev => [...prev, errorEntry]);
     } finally {
       setLoading(false);
+      setStreaming(false);
     }
   };
 
@@ -195,7 +283,7 @@ const Movi = ({ context }) => {
           </div>
         ))}
         
-        {loading && (
+        {loading && !streaming && (
           <div className="movi-message assistant">
             <div className="message-bubble loading">
               <span className="loading-dot"></span>
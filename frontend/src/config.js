@@ -4,6 +4,7 @@ const API_BASE_URL = `${API_HOST}:${API_PORT}`;
 
 const ENDPOINTS = {
   CHAT: `${API_BASE_URL}/chat`,
+  CHAT_STREAM: `${API_BASE_URL}/chat/stream`,
   SPEECH_TO_TEXT: `${API_BASE_URL}/speech-to-text`,
   TEXT_TO_SPEECH: `${API_BASE_URL}/text-to-speech`,
   HEALTH: `${API_BASE_URL}/health`,
@@ -13,7 +14,9 @@ const ENDPOINTS = {
   STOPS: `${API_BASE_URL}/api/stops`,
   PATHS: `${API_BASE_URL}/api/paths`,
   ROUTES: `${API_BASE_URL}/api/routes`,
-  DEPLOYMENTS: `${API_BASE_URL}/api/deployments`
+  DEPLOYMENTS: `${API_BASE_URL}/api/deployments`,
+  CHANGES: `${API_BASE_URL}/api/changes`,
+  CHANGES_STREAM: `${API_BASE_URL}/api/changes/stream`
 };
 
 const TIMEOUT = parseInt(process.env.REACT_APP_REQUEST_TIMEOUT || '30000', 10);
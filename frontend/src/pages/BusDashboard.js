@@ -1,11 +1,12 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useMemo } from 'react';
 import axios from 'axios';
 import { ENDPOINTS } from '../config';
+import { applyDelta, fetchChangeCursor, subscribeToChanges } from '../changeFeed';
 import './Dashboard.css';
 
 const BusDashboard = () => {
-  const [vehicles, setVehicles] = useState([]);
-  const [drivers, setDrivers] = useState([]);
+  const [vehicleList, setVehicleList] = useState([]);
+  const [driverList, setDriverList] = useState([]);
   const [trips, setTrips] = useState([]);
   const [deployments, setDeployments] = useState([]);
   const [loading, setLoading] = useState(true);
@@ -13,48 +14,75 @@ const BusDashboard = () => {
   const [filter, setFilter] = useState('all');
 
   useEffect(() => {
+    let cancelled = false;
+    let unsubscribe = () => {};
+
     const fetchData = async () => {
       setLoading(true);
       try {
+        const cursor = await fetchChangeCursor();
         const [vehiclesRes, driversRes, tripsRes, deploymentsRes] = await Promise.all([
           axios.get(ENDPOINTS.VEHICLES),
           axios.get(ENDPOINTS.DRIVERS),
           axios.get(ENDPOINTS.TRIPS),
           axios.get(ENDPOINTS.DEPLOYMENTS)
         ]);
-        
-        const vehicleList = vehiclesRes.data.vehicles || [];
-        const driverList = driversRes.data.drivers || [];
-        const tripList = tripsRes.data.trips || [];
-        const deploymentList = deploymentsRes.data.deployments || [];
-
-        const vehicleAssignments = new Set(deploymentList.map(item => item.vehicle_id));
-        const driverAssignments = new Set(deploymentList.map(item => item.driver_id));
 
-        setVehicles(vehicleList.map(vehicle => ({
-          ...vehicle,
-          status: vehicleAssignments.has(vehicle.id) ? 'assigned' : 'available'
-        })));
-        
-        setDrivers(driverList.map(driver => ({
-          ...driver,
-          status: driverAssignments.has(driver.id) ? 'assigned' : 'available'
-        })));
-        
-        setTrips(tripList);
-        setDeployments(deploymentList);
+        setVehicleList(vehiclesRes.data.vehicles || []);
+        setDriverList(driversRes.data.drivers || []);
+        setTrips(tripsRes.data.trips || []);
+        setDeployments(deploymentsRes.data.deployments || []);
         setError('');
+        return cursor;
       } catch (err) {
         console.error('Error fetching data:', err);
         setError('Unable to load dashboard data. Please try again later.');
+        return null;
       } finally {
         setLoading(false);
       }
     };
 
-    fetchData();
+    // After the first load only the rows that changed are pushed and merged.
+    const start = async () => {
+      const cursor = await fetchData();
+      if (cancelled || cursor === null) {
+        return;
+      }
+      unsubscribe = subscribeToChanges(cursor, changes => {
+        setVehicleList(items => applyDelta(items, changes.vehicles));
+        setDriverList(items => applyDelta(items, changes.drivers));
+        setTrips(items => applyDelta(items, changes.trips));
+        setDeployments(items => applyDelta(items, changes.deployments));
+      }, () => {
+        unsubscribe();
+        start();
+      });
+    };
+
+    start();
+    return () => {
+      cancelled = true;
+      unsubscribe();
+    };
   }, []);
 
+  const vehicles = useMemo(() => {
+    const vehicleAssignments = new Set(deployments.map(item => item.vehicle_id));
+    return vehicleList.map(vehicle => ({
+      ...vehicle,
+      status: vehicleAssignments.has(vehicle.id) ? 'assigned' : 'available'
+    }));
+  }, [vehicleList, deployments]);
+
+  const drivers = useMemo(() => {
+    const driverAssignments = new Set(deployments.map(item => item.driver_id));
+    return driverList.map(driver => ({
+      ...driver,
+      status: driverAssignments.has(driver.id) ? 'assigned' : 'available'
+    }));
+  }, [driverList, deployments]);
+
   const availableVehicles = vehicles.filter(v => v.status === 'available').length;
   const availableDrivers = drivers.filter(d => d.status === 'available').length;
   const bookedTrips = trips.filter(t => ((t.booking_status_percentage || 0) > 0)).length;
@@ -1,6 +1,12 @@
 import React, { useState, useEffect } from 'react';
 import axios from 'axios';
 import { ENDPOINTS } from '../config';
+import { applyDelta, fetchChangeCursor, subscribeToChanges } from '../changeFeed';
+
+const sortPathStops = path => ({
+  ...path,
+  stops: (path.stops || []).slice().sort((a, b) => (a.order || 0) - (b.order || 0))
+});
 
 const ManageRoute = () => {
   const [stops, setStops] = useState([]);
@@ -11,34 +17,54 @@ const ManageRoute = () => {
   const [expandedActionRoute, setExpandedActionRoute] = useState(null);
 
   useEffect(() => {
+    let cancelled = false;
+    let unsubscribe = () => {};
+
     const fetchData = async () => {
       setLoading(true);
       try {
+        const cursor = await fetchChangeCursor();
         const [stopsRes, pathsRes, routesRes] = await Promise.all([
           axios.get(ENDPOINTS.STOPS),
           axios.get(ENDPOINTS.PATHS),
           axios.get(ENDPOINTS.ROUTES)
         ]);
-        const stopsData = stopsRes.data.stops || [];
-        const pathsData = (pathsRes.data.paths || []).map(path => ({
-          ...path,
-          stops: (path.stops || []).slice().sort((a, b) => (a.order || 0) - (b.order || 0))
-        }));
-        const routesData = routesRes.data.routes || [];
-
-        setStops(stopsData);
-        setPaths(pathsData);
-        setRoutes(routesData);
+
+        setStops(stopsRes.data.stops || []);
+        setPaths((pathsRes.data.paths || []).map(sortPathStops));
+        setRoutes(routesRes.data.routes || []);
         setError('');
+        return cursor;
       } catch (err) {
         console.error('Error fetching route data:', err);
         setError('Unable to load route data. Please try again later.');
+        return null;
       } finally {
         setLoading(false);
       }
     };
 
-    fetchData();
+    // After the first load only the rows that changed are pushed and merged.
+    const start = async () => {
+      const cursor = await fetchData();
+      if (cancelled || cursor === null) {
+        return;
+      }
+      unsubscribe = subscribeToChanges(cursor, changes => {
+        setStops(items => applyDelta(items, changes.stops));
+        setPaths(items => (changes.paths ? applyDelta(items, changes.paths).map(sortPathStops) : items));
+        setRoutes(items => applyDelta(items, changes.routes));
+      }, () => {
+        unsubscribe();
+        start();
+      });
+    };
+
+    start();
+    return () => {
+      cancelled = true;
+      unsubscribe();
+    };
   }, []);
 
   const handleActionClick = (routeId) => {